@@ -7,19 +7,87 @@ class Settings(BaseSettings):
     supabase_url: str
     supabase_key: str
     supabase_service_key: str
+
+    # Supabase HTTP connection pool (shared by all clients of a worker)
+    supabase_pool_max_connections: int = 50
+    supabase_pool_max_keepalive: int = 20
+    supabase_pool_keepalive_expiry: float = 30.0
+    supabase_timeout: float = 10.0
+    supabase_http2: bool = True
+
+    # Auth: verify access tokens locally (JWT secret or JWKS) instead of calling GoTrue
+    auth_local_verification: bool = True
+    supabase_jwt_secret: str = ""
+    supabase_jwt_audience: str = "authenticated"
+    auth_jwks_ttl: int = 600
+    # Roles are changed in the database, outside the API: a worker keeps serving a
+    # user's previous role for up to this many seconds (or until "users" is
+    # published on the cache invalidation bus)
+    auth_user_cache_ttl: int = 60
+    auth_user_cache_size: int = 10000
+
+    # Doctor catalog cache
+    doctor_cache_ttl: int = 300
+    doctor_cache_max_size: int = 1000  # larger catalogs are read from the database
+    cache_invalidation_broadcast: bool = False  # invalidate other workers via Supabase Realtime
+
+    # Single-flight coalescing of hot reads (availability, doctors)
+    read_coalescing_enabled: bool = True
+    read_coalescing_ttl: float = 1.0  # micro-TTL of shared results; 0 = share in-flight queries only
+    read_coalescing_cache_size: int = 10000
+
+    # HTTP caching of public reads (browsers and CDN)
+    cache_control_doctors: str = "public, max-age=60, stale-while-revalidate=600"
+    cache_control_specializations: str = "public, max-age=300, stale-while-revalidate=3600"
+    cache_control_availability: str = "public, max-age=10, stale-while-revalidate=30"
     
     # Application
     app_name: str = "Clinica Orchidea API"
     app_version: str = "1.0.0"
-    debug: bool = True
+    debug: bool = True  # also adds a Server-Timing header to every response
+
+    # Instrumentation (Prometheus text format on /metrics)
+    metrics_enabled: bool = True
     
+    # Pagination
+    appointments_page_size: int = 50
+    appointments_max_page_size: int = 200
+    export_batch_size: int = 500
+    slot_batch_size: int = 1000  # rows per read/insert when generating schedules
+
+    # Booking
+    slot_hold_seconds: int = 300  # how long a slot stays held while the booking form is open
+
+    # Idempotency-Key replay of booking requests
+    idempotency_ttl: int = 86400
+    idempotency_cache_size: int = 10000
+    idempotency_backend: str = "memory"  # memory | supabase (idempotency_keys table, shared by workers)
+
     # CORS
     cors_origins: str = "http://localhost:5173,http://localhost:3000"
     
+    # Live updates (Server-Sent Events)
+    live_events_broadcast: bool = False  # relay events between workers via Supabase Realtime
+    live_events_queue_size: int = 100  # per subscriber; overflow sends a "resync" event
+    live_events_heartbeat: float = 15.0
+
     # Resend
     resend_api_key: str = ""
     from_email: str = "noreply@clinicaorchidea.app"
     from_name: str = "Clinica Orchidea"
+    email_max_concurrency: int = 4
+    email_default_locale: str = "it"  # templates in app/templates/email/<locale>
+
+    # Email outbox worker
+    email_transport: str = "resend"  # resend | fake
+    email_outbox_embedded_worker: bool = False  # run the worker inside the API process
+    email_outbox_batch_size: int = 50
+    email_outbox_poll_interval: float = 5.0
+    email_outbox_rate_limit: float = 2.0  # transport calls per second
+    email_outbox_max_attempts: int = 5
+    email_outbox_backoff_base: float = 30.0
+    email_outbox_backoff_max: float = 3600.0
+    email_outbox_lease_seconds: int = 300
     
     # URLs
     frontend_url: str = "http://localhost:5173"
@@ -1,33 +1,131 @@
-from typing import Generator
-from supabase import create_client, Client
+import asyncio
+from typing import AsyncGenerator, Optional, Dict, Any
+import httpx
+from supabase import acreate_client, AsyncClient, AsyncClientOptions
 from app.core.config import settings
+from app.core.metrics import TimingTransport
 
 
-def get_supabase_client() -> Client:
-    return create_client(
-        supabase_url=settings.supabase_url,
-        supabase_key=settings.supabase_key
-    )
+class SupabaseClientRegistry:
+    """
+    Process-wide async Supabase clients.
+
+    Clients are created once per worker (eagerly at startup or lazily on first use)
+    and share a single keep-alive HTTP connection pool, so requests reuse open
+    connections to PostgREST/GoTrue instead of repeating the TLS handshake.
+    """
+
+    def __init__(self, transport: Optional[httpx.AsyncBaseTransport] = None):
+        # transport is only overridden by benchmarks (fake upstream)
+        self._transport = transport
+        self._lock = asyncio.Lock()
+        self._http_client: Optional[httpx.AsyncClient] = None
+        self._pool_transport: Optional[httpx.AsyncBaseTransport] = None
+        self._client: Optional[AsyncClient] = None
+        self._admin_client: Optional[AsyncClient] = None
+
+    async def get_client(self) -> AsyncClient:
+        if self._client is None:
+            async with self._lock:
+                if self._client is None:
+                    self._client = await self._create(settings.supabase_key)
+        return self._client
+
+    async def get_admin_client(self) -> AsyncClient:
+        if self._admin_client is None:
+            async with self._lock:
+                if self._admin_client is None:
+                    self._admin_client = await self._create(settings.supabase_service_key)
+        return self._admin_client
+
+    async def get_http_client(self) -> httpx.AsyncClient:
+        """The pooled HTTP client, for direct calls to Supabase endpoints (e.g. JWKS)."""
+        await self.get_client()
+        return self._http_client
+
+    async def open(self) -> None:
+        """Create both clients up front (called on application startup)."""
+        await self.get_client()
+        await self.get_admin_client()
+
+    async def close(self) -> None:
+        """Drop the clients and close the pooled connections (called on shutdown)."""
+        async with self._lock:
+            if self._http_client is not None:
+                await self._http_client.aclose()
+            self._http_client = None
+            self._pool_transport = None
+            self._client = None
+            self._admin_client = None
+
+    def pool_stats(self) -> Dict[str, Any]:
+        """Connection pool usage, for monitoring."""
+        connections = []
+        if self._pool_transport is not None:
+            pool = getattr(self._pool_transport, "_pool", None)
+            connections = list(getattr(pool, "connections", []))
+
+        idle = sum(1 for conn in connections if conn.is_idle())
+        return {
+            "max_connections": settings.supabase_pool_max_connections,
+            "max_keepalive": settings.supabase_pool_max_keepalive,
+            "connections": len(connections),
+            "active": len(connections) - idle,
+            "idle": idle,
+        }
+
+    async def _create(self, key: str) -> AsyncClient:
+        # Server-side clients: no user session to persist or refresh
+        options = AsyncClientOptions(
+            httpx_client=self._get_http_client(),
+            auto_refresh_token=False,
+            persist_session=False,
+        )
+        return await acreate_client(
+            supabase_url=settings.supabase_url,
+            supabase_key=key,
+            options=options
+        )
+
+    def _get_http_client(self) -> httpx.AsyncClient:
+        # Called with self._lock held
+        if self._http_client is None:
+            # The transport owns the pool, so limits and HTTP/2 are set on it
+            self._pool_transport = self._transport or httpx.AsyncHTTPTransport(
+                limits=httpx.Limits(
+                    max_connections=settings.supabase_pool_max_connections,
+                    max_keepalive_connections=settings.supabase_pool_max_keepalive,
+                    keepalive_expiry=settings.supabase_pool_keepalive_expiry,
+                ),
+                http2=settings.supabase_http2,
+            )
+            self._http_client = httpx.AsyncClient(
+                timeout=settings.supabase_timeout,
+                follow_redirects=True,
+                # Every call is timed for /metrics and Server-Timing
+                transport=TimingTransport(self._pool_transport),
+            )
+        return self._http_client
+
+
+# Global registry instance (one per worker process)
+supabase_clients = SupabaseClientRegistry()
+
+
+async def get_supabase_client() -> AsyncClient:
+    return await supabase_clients.get_client()
 
 
-def get_supabase_admin_client() -> Client:
-    return create_client(
-        supabase_url=settings.supabase_url,
-        supabase_key=settings.supabase_service_key
-    )
+async def get_supabase_admin_client() -> AsyncClient:
+    return await supabase_clients.get_admin_client()
 
 
 # Dependency for route handlers
-def get_db() -> Generator[Client, None, None]:
+async def get_db() -> AsyncGenerator[AsyncClient, None]:
     """
     FastAPI dependency that provides a Supabase client.
 
     Yields:
-        Client: Supabase client instance
+        AsyncClient: Shared Supabase client instance
     """
-    client = get_supabase_client()
-    try:
-        yield client
-    finally:
-        # Cleanup if needed
-        pass
+    yield await get_supabase_client()
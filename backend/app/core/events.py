@@ -0,0 +1,92 @@
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Optional, Set
+from realtime import AsyncRealtimeChannel
+from app.core.config import settings
+from app.core.database import get_supabase_admin_client
+
+CHANNEL = "live-events"
+EVENT = "event"
+
+# Sent instead of the dropped events when a subscriber falls behind
+RESYNC = {"event": "resync", "data": {}}
+
+
+class EventHub:
+    """
+    In-process pub/sub for live updates (Server-Sent Events).
+
+    Every subscriber of a topic gets its own bounded queue; a subscriber that
+    falls behind has its queue replaced by a single "resync" event (the client
+    refetches). With LIVE_EVENTS_BROADCAST on, events are also relayed to the
+    other workers over one Supabase Realtime broadcast channel per worker.
+    """
+
+    def __init__(self):
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = {}
+        self._channel: Optional[AsyncRealtimeChannel] = None
+
+    @asynccontextmanager
+    async def subscribe(self, topic: str) -> AsyncIterator[asyncio.Queue]:
+        queue: asyncio.Queue = asyncio.Queue(maxsize=settings.live_events_queue_size)
+        self._subscribers.setdefault(topic, set()).add(queue)
+        try:
+            yield queue
+        finally:
+            subscribers = self._subscribers.get(topic)
+            if subscribers is not None:
+                subscribers.discard(queue)
+                if not subscribers:
+                    del self._subscribers[topic]
+
+    async def publish(self, topic: str, event: str, data: Dict[str, Any]) -> None:
+        """Deliver an event to local subscribers and, if enabled, to other workers."""
+        self._deliver(topic, {"event": event, "data": data})
+
+        if self._channel is None:
+            return
+        try:
+            await self._channel.send_broadcast(EVENT, {"topic": topic, "event": event, "data": data})
+        except Exception as e:
+            print(f"Error broadcasting live event: {e}")
+
+    def subscriber_count(self) -> int:
+        return sum(len(subscribers) for subscribers in self._subscribers.values())
+
+    async def start(self) -> None:
+        if not settings.live_events_broadcast or self._channel is not None:
+            return
+        try:
+            client = await get_supabase_admin_client()
+            # Broadcasts are not echoed back to the sender, which already delivered locally
+            channel = client.channel(CHANNEL)
+            channel.on_broadcast(EVENT, self._on_broadcast)
+            self._channel = await channel.subscribe()
+        except Exception as e:
+            print(f"Error subscribing to live events channel: {e}")
+
+    async def stop(self) -> None:
+        if self._channel is None:
+            return
+        channel, self._channel = self._channel, None
+        try:
+            client = await get_supabase_admin_client()
+            await client.remove_channel(channel)
+        except Exception as e:
+            print(f"Error closing live events channel: {e}")
+
+    def _on_broadcast(self, message: Dict[str, Any]) -> None:
+        payload = message["payload"]
+        self._deliver(payload["topic"], {"event": payload["event"], "data": payload["data"]})
+
+    def _deliver(self, topic: str, message: Dict[str, Any]) -> None:
+        for queue in self._subscribers.get(topic, ()):
+            try:
+                queue.put_nowait(message)
+            except asyncio.QueueFull:
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(RESYNC)
+
+
+event_hub = EventHub()
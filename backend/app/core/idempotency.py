@@ -0,0 +1,165 @@
+import asyncio
+import hashlib
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, Optional
+from fastapi import HTTPException, status
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.core.database import get_supabase_admin_client
+
+# Replayed responses carry this header, so clients and logs can tell them apart
+REPLAYED_HEADER = "Idempotency-Replayed"
+
+
+@dataclass(frozen=True)
+class StoredResponse:
+    fingerprint: str  # hash of the request body the key was first used with
+    status_code: int
+    body: Any
+
+
+class IdempotencyBackend(ABC):
+    """Shared storage of idempotent responses, seen by every worker."""
+
+    @abstractmethod
+    async def get(self, key: str) -> Optional[StoredResponse]:
+        """The unexpired response stored under `key`, if any."""
+
+    @abstractmethod
+    async def set(self, key: str, response: StoredResponse, ttl: int) -> None:
+        """Store a response under `key` for `ttl` seconds."""
+
+
+class SupabaseIdempotencyBackend(IdempotencyBackend):
+    """The idempotency_keys table: one primary key lookup per local cache miss."""
+
+    async def get(self, key: str) -> Optional[StoredResponse]:
+        client = await get_supabase_admin_client()
+        result = await client.table("idempotency_keys") \
+            .select("fingerprint, status_code, body") \
+            .eq("key", key) \
+            .gt("expires_at", datetime.now(timezone.utc).isoformat()) \
+            .execute()
+        if not result.data:
+            return None
+        return StoredResponse(**result.data[0])
+
+    async def set(self, key: str, response: StoredResponse, ttl: int) -> None:
+        client = await get_supabase_admin_client()
+        await client.table("idempotency_keys").upsert({
+            "key": key,
+            "fingerprint": response.fingerprint,
+            "status_code": response.status_code,
+            "body": response.body,
+            "expires_at": (datetime.now(timezone.utc) + timedelta(seconds=ttl)).isoformat()
+        }).execute()
+
+
+def get_idempotency_backend() -> Optional[IdempotencyBackend]:
+    if settings.idempotency_backend == "supabase":
+        return SupabaseIdempotencyBackend()
+    return None
+
+
+class IdempotencyStore:
+    """
+    Idempotency-Key support for POST endpoints.
+
+    The first successful response for a key is stored for IDEMPOTENCY_TTL seconds;
+    repeats with the same key and body get it back without running the handler
+    (so without touching PostgREST or queueing emails again). The same key with a
+    different body is rejected. Requests in flight with the same key on this worker
+    wait for the first one. Responses live in an in-process cache, in front of an
+    optional shared backend (IDEMPOTENCY_BACKEND=supabase) for multi-worker setups.
+    Errors are not stored: the client may retry them.
+    """
+
+    def __init__(self, backend: Optional[IdempotencyBackend] = None):
+        self.backend = backend
+        self._cache = TTLCache(settings.idempotency_cache_size, settings.idempotency_ttl)
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._waiting: Dict[str, int] = {}
+
+    async def run(
+        self,
+        scope: str,
+        key: Optional[str],
+        request: BaseModel,
+        handler: Callable[[], Awaitable[BaseModel]]
+    ) -> Any:
+        """Run handler once per (scope, key); scope should include the user and the endpoint."""
+        if not key:
+            return await handler()
+
+        cache_key = f"{scope}:{key}"
+        fingerprint = hashlib.sha256(request.model_dump_json().encode()).hexdigest()
+
+        lock = self._locks.setdefault(cache_key, asyncio.Lock())
+        self._waiting[cache_key] = self._waiting.get(cache_key, 0) + 1
+        try:
+            async with lock:
+                stored = await self._get(cache_key)
+                if stored is not None:
+                    return self._replay(stored, fingerprint)
+
+                response = await handler()
+                await self._set(cache_key, StoredResponse(
+                    fingerprint=fingerprint,
+                    status_code=status.HTTP_200_OK,
+                    body=response.model_dump(mode="json")
+                ))
+                return response
+        finally:
+            self._waiting[cache_key] -= 1
+            if not self._waiting[cache_key]:
+                del self._waiting[cache_key]
+                del self._locks[cache_key]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self._cache.stats(),
+            "in_flight": len(self._locks),
+            "backend": settings.idempotency_backend
+        }
+
+    async def _get(self, cache_key: str) -> Optional[StoredResponse]:
+        stored = self._cache.get(cache_key)
+        if stored is not None or self.backend is None:
+            return stored
+        try:
+            stored = await self.backend.get(cache_key)
+        except Exception as e:
+            print(f"Error reading idempotency key: {e}")
+            return None
+        if stored is not None:
+            self._cache.set(cache_key, stored)
+        return stored
+
+    async def _set(self, cache_key: str, stored: StoredResponse) -> None:
+        self._cache.set(cache_key, stored)
+        if self.backend is None:
+            return
+        try:
+            await self.backend.set(cache_key, stored, settings.idempotency_ttl)
+        except Exception as e:
+            # The operation already succeeded: a lost key only weakens retries on other workers
+            print(f"Error storing idempotency key: {e}")
+
+    def _replay(self, stored: StoredResponse, fingerprint: str) -> JSONResponse:
+        if stored.fingerprint != fingerprint:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Idempotency-Key già usata per una richiesta diversa"
+            )
+        return JSONResponse(
+            content=stored.body,
+            status_code=stored.status_code,
+            headers={REPLAYED_HEADER: "true"}
+        )
+
+
+idempotency_store = IdempotencyStore(get_idempotency_backend())
@@ -0,0 +1,64 @@
+from typing import Callable, Dict, List, Optional
+from realtime import AsyncRealtimeChannel
+from app.core.config import settings
+from app.core.database import get_supabase_admin_client
+
+CHANNEL = "cache-invalidation"
+EVENT = "invalidate"
+
+
+class CacheInvalidationBus:
+    """
+    Cross-worker cache invalidation over a Supabase Realtime broadcast channel.
+
+    In-process caches register a handler per cache name; `publish(name)` runs the
+    local handlers and, when CACHE_INVALIDATION_BROADCAST is on, tells the other
+    workers to run theirs. Broadcasts are best effort: a worker that misses one
+    still drops the entry when its TTL expires.
+    """
+
+    def __init__(self):
+        self._handlers: Dict[str, List[Callable[[], None]]] = {}
+        self._channel: Optional[AsyncRealtimeChannel] = None
+
+    def register(self, name: str, handler: Callable[[], None]) -> None:
+        self._handlers.setdefault(name, []).append(handler)
+
+    async def publish(self, name: str) -> None:
+        self._run(name)
+
+        if self._channel is None:
+            return
+        try:
+            await self._channel.send_broadcast(EVENT, {"cache": name})
+        except Exception as e:
+            print(f"Error broadcasting cache invalidation: {e}")
+
+    async def start(self) -> None:
+        if not settings.cache_invalidation_broadcast or self._channel is not None:
+            return
+        try:
+            client = await get_supabase_admin_client()
+            # Broadcasts are not echoed back to the sender, which already ran its handlers
+            channel = client.channel(CHANNEL)
+            channel.on_broadcast(EVENT, lambda message: self._run(message["payload"].get("cache")))
+            self._channel = await channel.subscribe()
+        except Exception as e:
+            print(f"Error subscribing to cache invalidation channel: {e}")
+
+    async def stop(self) -> None:
+        if self._channel is None:
+            return
+        channel, self._channel = self._channel, None
+        try:
+            client = await get_supabase_admin_client()
+            await client.remove_channel(channel)
+        except Exception as e:
+            print(f"Error closing cache invalidation channel: {e}")
+
+    def _run(self, name: Optional[str]) -> None:
+        for handler in self._handlers.get(name, []):
+            handler()
+
+
+invalidation_bus = CacheInvalidationBus()
@@ -0,0 +1,323 @@
+"""
+Request instrumentation, exposed in the Prometheus text format on /metrics.
+
+Per request, MetricsMiddleware records the total latency (up to the start of the
+response, so streams count until their headers), the number and duration of
+upstream calls made through the pooled Supabase HTTP client (TimingTransport),
+and the time spent validating and serializing the endpoint result (TimedRoute,
+FastJSONResponse), labelled by route template. With DEBUG on, the same figures
+are returned in a Server-Timing header.
+"""
+import functools
+import inspect
+import math
+from contextvars import ContextVar
+from dataclasses import dataclass
+from time import perf_counter
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+import httpx
+from fastapi.routing import APIRoute
+from starlette.routing import replace_params
+from app.core.config import settings
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SERIALIZATION_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+CALL_COUNT_BUCKETS = (0, 1, 2, 3, 4, 5, 8, 13, 21)
+
+# Route label of requests that matched no route (keeps the label set bounded)
+UNMATCHED_ROUTE = "<unmatched>"
+
+
+class Histogram:
+    """Cumulative histogram with labels, rendered in the Prometheus text format."""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str], buckets: Sequence[float]):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets) + (math.inf,)
+        # labels -> [bucket counts..., sum]
+        self._series: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = [0] * len(self.buckets) + [0.0]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                series[i] += 1
+        series[-1] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for key, series in sorted(self._series.items()):
+            labels = [f'{name}="{_escape(value)}"' for name, value in zip(self.labelnames, key)]
+            for bound, count in zip(self.buckets, series):
+                le = 'le="%s"' % ("+Inf" if bound == math.inf else repr(float(bound)))
+                lines.append(f"{self.name}_bucket{{{','.join(labels + [le])}}} {count}")
+            suffix = f"{{{','.join(labels)}}}" if labels else ""
+            lines.append(f"{self.name}_sum{suffix} {series[-1]}")
+            lines.append(f"{self.name}_count{suffix} {series[-2]}")
+        return lines
+
+    def clear(self) -> None:
+        self._series.clear()
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class MetricsRegistry:
+
+    def __init__(self):
+        self._metrics: List[Histogram] = []
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str], buckets: Sequence[float]) -> Histogram:
+        metric = Histogram(name, documentation, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        return "\n".join(line for metric in self._metrics for line in metric.render()) + "\n"
+
+    def clear(self) -> None:
+        for metric in self._metrics:
+            metric.clear()
+
+
+metrics = MetricsRegistry()
+
+request_duration = metrics.histogram(
+    "http_request_duration_seconds",
+    "Time from request received to response start.",
+    ("method", "route", "status"),
+    LATENCY_BUCKETS
+)
+request_upstream_calls = metrics.histogram(
+    "http_request_upstream_calls",
+    "Supabase HTTP calls made while handling a request.",
+    ("route",),
+    CALL_COUNT_BUCKETS
+)
+request_upstream_duration = metrics.histogram(
+    "http_request_upstream_duration_seconds",
+    "Total time a request spent in Supabase HTTP calls.",
+    ("route",),
+    LATENCY_BUCKETS
+)
+request_serialization_duration = metrics.histogram(
+    "http_request_serialization_duration_seconds",
+    "Time spent validating and encoding the response body.",
+    ("route",),
+    SERIALIZATION_BUCKETS
+)
+upstream_duration = metrics.histogram(
+    "supabase_request_duration_seconds",
+    "Duration of each Supabase HTTP call, body included.",
+    ("service", "method", "status"),
+    LATENCY_BUCKETS
+)
+email_send_duration = metrics.histogram(
+    "email_send_duration_seconds",
+    "Duration of each email batch sent by the outbox worker.",
+    ("transport", "outcome"),
+    LATENCY_BUCKETS
+)
+
+
+@dataclass
+class RequestTimings:
+    upstream_calls: int = 0
+    upstream_seconds: float = 0.0
+    serialization_seconds: float = 0.0
+    endpoint_returned_at: Optional[float] = None
+
+
+# Timings of the request being handled (None outside requests: workers, listeners)
+_request_timings: ContextVar[Optional[RequestTimings]] = ContextVar("request_timings", default=None)
+
+
+def record_serialization(seconds: float) -> None:
+    timings = _request_timings.get()
+    if timings is not None:
+        timings.serialization_seconds += seconds
+
+
+class _TimedStream(httpx.AsyncByteStream):
+    """Response body of an upstream call; the call is recorded when it is closed."""
+
+    def __init__(self, stream: httpx.AsyncByteStream, on_close: Callable[[], None]):
+        self._stream = stream
+        self._on_close = on_close
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self) -> None:
+        try:
+            await self._stream.aclose()
+        finally:
+            self._on_close()
+
+
+class TimingTransport(httpx.AsyncBaseTransport):
+    """
+    Wraps the transport of the pooled Supabase HTTP client to time every call.
+
+    Calls made by a single-flight read are charged to the request that ran it,
+    not to the ones that joined it.
+    """
+
+    def __init__(self, transport: httpx.AsyncBaseTransport):
+        self.transport = transport
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        timings = _request_timings.get()
+        start = perf_counter()
+
+        def record(status: str) -> None:
+            elapsed = perf_counter() - start
+            upstream_duration.observe(
+                elapsed,
+                service=_service(request.url.path),
+                method=request.method,
+                status=status
+            )
+            if timings is not None:
+                timings.upstream_calls += 1
+                timings.upstream_seconds += elapsed
+
+        try:
+            response = await self.transport.handle_async_request(request)
+        except Exception:
+            record("error")
+            raise
+
+        if isinstance(response.stream, httpx.ByteStream):
+            # Body already in memory (never closed by the client)
+            record(str(response.status_code))
+        else:
+            response.stream = _TimedStream(response.stream, lambda: record(str(response.status_code)))
+        return response
+
+    async def aclose(self) -> None:
+        await self.transport.aclose()
+
+
+def _service(path: str) -> str:
+    # /rest/v1/..., /auth/v1/..., /storage/v1/...
+    return path.strip("/").split("/", 1)[0] or "root"
+
+
+def _timed_endpoint(endpoint: Callable[..., Any]) -> Callable[..., Any]:
+    if not inspect.iscoroutinefunction(endpoint):
+        return endpoint
+
+    @functools.wraps(endpoint)
+    async def timed(*args, **kwargs):
+        try:
+            return await endpoint(*args, **kwargs)
+        finally:
+            timings = _request_timings.get()
+            if timings is not None:
+                timings.endpoint_returned_at = perf_counter()
+
+    return timed
+
+
+class TimedRoute(APIRoute):
+    """
+    Route class of the API routers: charges the time between the endpoint
+    returning and the response being built (response_model validation and JSON
+    encoding) to the request's serialization time.
+    """
+
+    def __init__(self, path: str, endpoint: Callable[..., Any], **kwargs: Any):
+        super().__init__(path, _timed_endpoint(endpoint), **kwargs)
+
+    def get_route_handler(self) -> Callable:
+        handler = super().get_route_handler()
+
+        async def timed_handler(request):
+            response = await handler(request)
+            timings = _request_timings.get()
+            if timings is not None and timings.endpoint_returned_at is not None:
+                timings.serialization_seconds += perf_counter() - timings.endpoint_returned_at
+                timings.endpoint_returned_at = None
+            return response
+
+        return timed_handler
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware (does not buffer streaming responses)."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timings = RequestTimings()
+        token = _request_timings.set(timings)
+        start = perf_counter()
+        started = False
+
+        async def send_with_timing(message):
+            nonlocal started
+            if message["type"] == "http.response.start" and not started:
+                started = True
+                elapsed = perf_counter() - start
+                self._record(scope, message["status"], timings, elapsed)
+                if settings.debug:
+                    message = {**message, "headers": [
+                        *message.get("headers", []),
+                        (b"server-timing", _server_timing(timings, elapsed).encode()),
+                        (b"timing-allow-origin", b"*"),
+                    ]}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        except Exception:
+            if not started:
+                self._record(scope, 500, timings, perf_counter() - start)
+            raise
+        finally:
+            _request_timings.reset(token)
+
+    @staticmethod
+    def _record(scope, status_code: int, timings: RequestTimings, elapsed: float) -> None:
+        template = _route_template(scope)
+        request_duration.observe(elapsed, method=scope["method"], route=template, status=str(status_code))
+        request_upstream_calls.observe(timings.upstream_calls, route=template)
+        request_upstream_duration.observe(timings.upstream_seconds, route=template)
+        request_serialization_duration.observe(timings.serialization_seconds, route=template)
+
+
+def _route_template(scope) -> str:
+    route = scope.get("route")
+    path_format = getattr(route, "path_format", None)
+    if path_format is None:
+        return UNMATCHED_ROUTE
+    # Recent FastAPI versions match included routes by their own path, without the
+    # router prefix: take the prefix back from the part of the path they did not match
+    matched, _ = replace_params(path_format, route.param_convertors, dict(scope.get("path_params", {})))
+    path = scope["path"]
+    prefix = path[:len(path) - len(matched)] if path.endswith(matched) else ""
+    return prefix + path_format
+
+
+def _server_timing(timings: RequestTimings, elapsed: float) -> str:
+    return ", ".join([
+        f'upstream;dur={timings.upstream_seconds * 1000:.1f};desc="{timings.upstream_calls} calls"',
+        f"serialize;dur={timings.serialization_seconds * 1000:.1f}",
+        f"total;dur={elapsed * 1000:.1f}",
+    ])
@@ -0,0 +1,112 @@
+import asyncio
+import time
+from typing import Any, Dict, Optional
+import jwt
+from app.core.config import settings
+from app.core.database import supabase_clients
+
+
+class SigningKeyCache:
+    """
+    Supabase Auth signing keys (JWKS), cached per worker.
+
+    Keys are fetched on first use and refreshed after `ttl` seconds, or earlier when
+    a token carries an unknown key id (rotation) - at most once every
+    `min_refresh_interval` seconds so bogus key ids cannot hammer GoTrue.
+    """
+
+    def __init__(self, ttl: float, min_refresh_interval: float = 30.0):
+        self.ttl = ttl
+        self.min_refresh_interval = min_refresh_interval
+        self._keys: Dict[str, jwt.PyJWK] = {}
+        self._fetched_at: Optional[float] = None
+        self._lock = asyncio.Lock()
+
+    async def get(self, kid: str) -> Optional[jwt.PyJWK]:
+        if not self._needs_refresh(kid):
+            return self._keys.get(kid)
+
+        async with self._lock:
+            # Another request may have refreshed while we were waiting
+            if self._needs_refresh(kid):
+                await self._refresh()
+
+        return self._keys.get(kid)
+
+    def clear(self) -> None:
+        self._keys = {}
+        self._fetched_at = None
+
+    def _needs_refresh(self, kid: str) -> bool:
+        if self._fetched_at is None:
+            return True
+        age = time.monotonic() - self._fetched_at
+        if age > self.ttl:
+            return True
+        return kid not in self._keys and age > self.min_refresh_interval
+
+    async def _refresh(self) -> None:
+        try:
+            http_client = await supabase_clients.get_http_client()
+            response = await http_client.get(
+                f"{settings.supabase_url.rstrip('/')}/auth/v1/.well-known/jwks.json",
+                headers={"apikey": settings.supabase_key}
+            )
+            response.raise_for_status()
+            keys = {}
+            for key_data in response.json().get("keys", []):
+                try:
+                    key = jwt.PyJWK.from_dict(key_data)
+                except jwt.PyJWTError:
+                    # Unsupported key type; skip it
+                    continue
+                if key.key_id:
+                    keys[key.key_id] = key
+            self._keys = keys
+        except Exception as e:
+            # Keep the previous keys; unknown tokens fall back to network verification
+            print(f"Error fetching JWKS: {e}")
+        self._fetched_at = time.monotonic()
+
+
+signing_keys = SigningKeyCache(ttl=settings.auth_jwks_ttl)
+
+
+async def decode_access_token(token: str) -> Optional[Dict[str, Any]]:
+    """
+    Verify a Supabase access token locally (signature, expiry, audience).
+
+    Returns:
+        The token claims, or None when no local key can verify this token
+        (local verification disabled, no JWT secret, unknown key id) - the caller
+        should then fall back to verifying it against GoTrue.
+
+    Raises:
+        jwt.PyJWTError: If the token is malformed, forged or expired
+    """
+    if not settings.auth_local_verification:
+        return None
+
+    header = jwt.get_unverified_header(token)
+    algorithm = header.get("alg")
+
+    if algorithm == "HS256":
+        if not settings.supabase_jwt_secret:
+            return None
+        key = settings.supabase_jwt_secret
+    elif algorithm in ("RS256", "ES256"):
+        kid = header.get("kid")
+        jwk = await signing_keys.get(kid) if kid else None
+        if jwk is None:
+            return None
+        key = jwk.key
+    else:
+        return None
+
+    return jwt.decode(
+        token,
+        key,
+        algorithms=[algorithm],
+        audience=settings.supabase_jwt_audience,
+        options={"require": ["exp", "sub"]}
+    )
@@ -0,0 +1,53 @@
+from time import perf_counter
+from typing import Any, Dict, Optional, Tuple, Type
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+from app.core.metrics import record_serialization
+
+try:
+    import orjson
+except ImportError:  # optional: falls back to the standard library encoder
+    orjson = None
+
+
+class Projection:
+    """
+    Shapes a database row like a response model, without validation.
+
+    Only for rows of our own tables, whose columns the schema already types:
+    copies the model's fields (the model default when a key is missing) and,
+    for each entry of `nested`, the embedded relation shaped by its own
+    projection. Values stay as PostgREST returned them (ISO strings, UUID strings).
+    """
+
+    def __init__(self, model: Type[BaseModel], nested: Optional[Dict[str, Tuple[str, "Projection"]]] = None):
+        self.nested = nested or {}
+        self.fields = tuple(
+            (name, None if field.is_required() else field.default)
+            for name, field in model.model_fields.items()
+            if name not in self.nested
+        )
+
+    def __call__(self, row: Dict[str, Any]) -> Dict[str, Any]:
+        shaped = {name: row.get(name, default) for name, default in self.fields}
+        for name, (key, projection) in self.nested.items():
+            value = row.get(key)
+            shaped[name] = projection(value) if value else None
+        return shaped
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSON response encoded with orjson when installed.
+
+    A route returning it skips response_model validation and serialization, so
+    it is meant for content already shaped like the response model (Projection).
+    Keep response_model on the route for the OpenAPI schema.
+    """
+
+    def render(self, content: Any) -> bytes:
+        # Rendered inside the endpoint, so timed here rather than by TimedRoute
+        start = perf_counter()
+        body = super().render(content) if orjson is None else orjson.dumps(content)
+        record_serialization(perf_counter() - start)
+        return body
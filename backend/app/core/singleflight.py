@@ -0,0 +1,82 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, TypeVar
+from app.core.cache import TTLCache
+from app.core.config import settings
+
+T = TypeVar("T")
+
+_MISSING = object()
+
+
+class SingleFlight:
+    """
+    Coalescing of identical concurrent reads, plus a micro-TTL on their results.
+
+    Callers of `do` with the same key while a call is in flight share that call
+    and its result (or exception) instead of querying again; for `ttl` seconds
+    afterwards the result is served from memory. Results are shared between
+    requests, so callers must not mutate them. `clear()` drops cached results,
+    and calls in flight at that moment are not cached when they finish.
+    """
+
+    def __init__(self, name: str, ttl: float, maxsize: int = settings.read_coalescing_cache_size):
+        self.name = name
+        self.ttl = ttl
+        self.calls = 0
+        self.executions = 0  # calls that actually ran the query
+        self.coalesced = 0  # calls that joined one in flight
+        self.cache_hits = 0  # calls served by the micro-TTL cache
+        self._cache = TTLCache(maxsize, ttl)
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        self._generation = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        if not settings.read_coalescing_enabled:
+            return await fn()
+
+        self.calls += 1
+
+        value = self._cache.get(key, _MISSING)
+        if value is not _MISSING:
+            self.cache_hits += 1
+            return value
+
+        task = self._inflight.get(key)
+        if task is None:
+            self.executions += 1
+            task = asyncio.ensure_future(self._run(key, fn, self._generation))
+            # Retrieve the exception even if every caller went away
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+            self._inflight[key] = task
+        else:
+            self.coalesced += 1
+
+        # A caller that disconnects must not cancel the query the others wait for
+        return await asyncio.shield(task)
+
+    def clear(self) -> None:
+        self._generation += 1
+        self._cache.clear()
+        self._inflight.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        saved = self.calls - self.executions
+        return {
+            "calls": self.calls,
+            "executions": self.executions,
+            "coalesced": self.coalesced,
+            "cache_hits": self.cache_hits,
+            "coalescing_ratio": round(saved / self.calls, 4) if self.calls else 0.0,
+            "in_flight": len(self._inflight),
+            "cached": len(self._cache),
+        }
+
+    async def _run(self, key: Hashable, fn: Callable[[], Awaitable[T]], generation: int) -> T:
+        try:
+            value = await fn()
+        finally:
+            if self._inflight.get(key) is asyncio.current_task():
+                del self._inflight[key]
+        if generation == self._generation and self.ttl > 0:
+            self._cache.set(key, value)
+        return value
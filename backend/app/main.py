@@ -1,7 +1,40 @@
-from fastapi import FastAPI
+import asyncio
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
 from app.core.config import settings
+from app.core.database import supabase_clients
+from app.core.events import event_hub
+from app.core.idempotency import idempotency_store
+from app.core.invalidation import invalidation_bus
+from app.core.metrics import CONTENT_TYPE, MetricsMiddleware, metrics
 from app.routes import auth, doctors, availability, appointments
+from app.services.availability import availability_reads
+from app.services.doctors import doctor_cache_stats, doctor_reads
+from app.workers.email_outbox import create_worker
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # One set of pooled Supabase clients per worker, closed on shutdown
+    await supabase_clients.open()
+    await invalidation_bus.start()
+    await event_hub.start()
+
+    stop_outbox = asyncio.Event()
+    outbox_task = None
+    if settings.email_outbox_embedded_worker:
+        worker = await create_worker()
+        outbox_task = asyncio.create_task(worker.run(stop_outbox))
+
+    yield
+
+    stop_outbox.set()
+    if outbox_task is not None:
+        await outbox_task
+    await event_hub.stop()
+    await invalidation_bus.stop()
+    await supabase_clients.close()
 
 # Create FastAPI app instance
 app = FastAPI(
@@ -10,6 +43,7 @@ app = FastAPI(
     description="API for Clinica Orchidea appointment booking system",
     docs_url="/docs",
     redoc_url="/redoc",
+    lifespan=lifespan,
 )
 
 # Configure CORS - Must be added BEFORE routes
@@ -22,6 +56,10 @@ app.add_middleware(
     expose_headers=["*"],
 )
 
+# Added last so it is outermost: latency includes CORS and error handling
+if settings.metrics_enabled:
+    app.add_middleware(MetricsMiddleware)
+
 # Include routers
 app.include_router(auth.router, prefix="/api/auth", tags=["Authentication"])
 app.include_router(doctors.router, prefix="/api/doctors", tags=["Doctors"])
@@ -45,10 +83,25 @@ async def health_check():
     return {
         "status": "healthy",
         "service": settings.app_name,
-        "version": settings.app_version
+        "version": settings.app_version,
+        "supabase_pool": supabase_clients.pool_stats(),
+        "doctor_cache": doctor_cache_stats(),
+        "idempotency": idempotency_store.stats(),
+        "read_coalescing": {
+            "availability": availability_reads.stats(),
+            "doctors": doctor_reads.stats()
+        },
+        "live_subscribers": event_hub.subscriber_count()
     }
 
 
+if settings.metrics_enabled:
+    @app.get("/metrics", include_in_schema=False)
+    async def metrics_endpoint():
+        """Request, upstream and email histograms in the Prometheus text format."""
+        return Response(content=metrics.render(), media_type=CONTENT_TYPE)
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, EmailStr, Field, validator
-from typing import Optional, List
+from typing import Literal, Optional, List
 from datetime import datetime
 from uuid import UUID
 
@@ -121,6 +121,85 @@ class AvailabilitySlotCreate(BaseModel):
             raise ValueError("Time must be in HH:MM format")
 
 
+class TimeWindow(BaseModel):
+    start_time: str = Field(..., description="Start time in HH:MM format")
+    end_time: str = Field(..., description="End time in HH:MM format")
+
+    @validator('start_time', 'end_time')
+    def validate_time_format(cls, v):
+        """Ensure time is in HH:MM format."""
+        try:
+            datetime.strptime(v, "%H:%M")
+            return v
+        except ValueError:
+            raise ValueError("Time must be in HH:MM format")
+
+    @validator('end_time')
+    def validate_window(cls, v, values):
+        # Compare times, not strings: "9:00" is a valid start before "10:00"
+        if 'start_time' in values:
+            start = datetime.strptime(values['start_time'], "%H:%M").time()
+            if datetime.strptime(v, "%H:%M").time() <= start:
+                raise ValueError("End time must be after start time")
+        return v
+
+
+class AvailabilityScheduleCreate(BaseModel):
+    """
+    Model for generating slots from a weekly schedule.
+    Every date in [start_date, end_date] whose weekday is listed, except
+    exclude_dates, gets 30-minute slots for each time window.
+    """
+    doctor_id: UUID
+    start_date: str = Field(..., description="First date in YYYY-MM-DD format")
+    end_date: str = Field(..., description="Last date (inclusive) in YYYY-MM-DD format")
+    weekdays: List[int] = Field(..., min_length=1, description="Weekdays, 0 = Monday ... 6 = Sunday")
+    windows: List[TimeWindow] = Field(..., min_length=1, description="Daily time windows")
+    exclude_dates: List[str] = Field(default_factory=list, description="Dates to skip (YYYY-MM-DD)")
+
+    @validator('start_date')
+    def validate_start_date(cls, v):
+        """Ensure date is in correct format and not in the past."""
+        try:
+            date_obj = datetime.strptime(v, "%Y-%m-%d").date()
+            today = datetime.now().date()
+            if date_obj <= today:
+                raise ValueError("Date must be at least tomorrow (no same-day slots)")
+            return v
+        except ValueError as e:
+            raise ValueError(f"Invalid date format or value: {str(e)}")
+
+    @validator('end_date')
+    def validate_end_date(cls, v, values):
+        """Ensure end_date is a valid date, not before start_date, within a year."""
+        try:
+            date_obj = datetime.strptime(v, "%Y-%m-%d").date()
+        except ValueError as e:
+            raise ValueError(f"Invalid date format: {str(e)}")
+        if 'start_date' in values:
+            start_obj = datetime.strptime(values['start_date'], "%Y-%m-%d").date()
+            if date_obj < start_obj:
+                raise ValueError("End date must not be before start date")
+            if (date_obj - start_obj).days > 366:
+                raise ValueError("Schedule range cannot exceed one year")
+        return v
+
+    @validator('weekdays')
+    def validate_weekdays(cls, v):
+        if any(day < 0 or day > 6 for day in v):
+            raise ValueError("Weekdays must be between 0 (Monday) and 6 (Sunday)")
+        return sorted(set(v))
+
+    @validator('exclude_dates')
+    def validate_exclude_dates(cls, v):
+        try:
+            for date in v:
+                datetime.strptime(date, "%Y-%m-%d")
+        except ValueError as e:
+            raise ValueError(f"Invalid date format: {str(e)}")
+        return v
+
+
 class AvailabilitySlotResponse(BaseModel):
     id: UUID
     doctor_id: UUID
@@ -139,6 +218,71 @@ class AvailabilitySlotsCreatedResponse(BaseModel):
     slots: List[AvailabilitySlotResponse]
 
 
+class AvailabilityScheduleResponse(BaseModel):
+    message: str
+    slots_created: int
+    slots_skipped: int = Field(..., description="Slots that already existed")
+
+
+class SlotBulkAction(BaseModel):
+    """
+    Enable, disable or delete many slots at once: the slots in slot_ids, or
+    those of doctor_id starting in [range_start, range_end), or both filters.
+    """
+    action: Literal["enable", "disable", "delete"]
+    slot_ids: Optional[List[UUID]] = Field(None, min_length=1, description="Slots to change")
+    doctor_id: Optional[UUID] = None
+    range_start: Optional[datetime] = Field(None, description="Slots starting at or after this time")
+    range_end: Optional[datetime] = Field(None, description="Slots starting before this time")
+
+    @validator('range_end', always=True)
+    def validate_selection(cls, v, values):
+        range_start = values.get('range_start')
+        if values.get('slot_ids') is None and (values.get('doctor_id') is None or range_start is None or v is None):
+            raise ValueError("Provide slot_ids, or doctor_id with range_start and range_end")
+        if (range_start is None) != (v is None):
+            raise ValueError("range_start and range_end go together")
+        if v is not None and (v.tzinfo is None) != (range_start.tzinfo is None):
+            raise ValueError("range_start and range_end must both have a timezone or neither")
+        if v is not None and v <= range_start:
+            raise ValueError("range_end must be after range_start")
+        return v
+
+
+class SlotConflict(BaseModel):
+    slot_id: UUID
+    start_time: datetime
+    appointment_id: UUID = Field(..., description="Confirmed appointment on the slot")
+
+
+class SlotBulkResponse(BaseModel):
+    message: str
+    slots: List[AvailabilitySlotResponse] = Field(..., description="Changed slots (deleted ones as they were)")
+    conflicts: List[SlotConflict] = Field(..., description="Slots left unchanged because they are booked")
+
+
+class SlotHoldResponse(BaseModel):
+    slot_id: UUID
+    held_until: datetime
+
+
+class AvailableSlotResponse(AvailabilitySlotResponse):
+    doctor: DoctorResponse
+
+
+class DoctorDetailResponse(BaseModel):
+    """Everything the doctor page needs on first load, in one response."""
+    doctor: DoctorResponse
+    available_dates: List[str]
+    selected_date: Optional[str] = Field(None, description="Date of `slots`: the requested one, else the first available")
+    slots: List[AvailabilitySlotResponse]
+
+
+class CalendarDay(BaseModel):
+    date: str = Field(..., description="Date in YYYY-MM-DD format")
+    free_slots: int
+
+
 # APPOINTMENT MODELS
 
 class AppointmentCreate(BaseModel):
@@ -160,6 +304,36 @@ class AppointmentManualCreate(AppointmentCreate):
     )
 
 
+class AppointmentSeriesCreate(BaseModel):
+    """
+    Model for booking a treatment series for one patient (admin only), all or nothing.
+    Either slot_ids, or first_slot_id repeated `count` times every interval_days
+    (same doctor and time). All slots must belong to the same doctor.
+    """
+    slot_ids: Optional[List[UUID]] = Field(None, min_length=2, max_length=52)
+    first_slot_id: Optional[UUID] = None
+    count: Optional[int] = Field(None, ge=2, le=52, description="Appointments in the recurrence")
+    interval_days: int = Field(7, ge=1, le=365, description="Days between appointments of the recurrence")
+    patient_first_name: str = Field(..., min_length=1, max_length=100)
+    patient_last_name: str = Field(..., min_length=1, max_length=100)
+    patient_phone: str = Field(..., min_length=10, max_length=20)
+    patient_email: EmailStr
+    patient_id: Optional[UUID] = Field(
+        None,
+        description="Optional: link to existing patient account"
+    )
+
+    @validator('count', always=True)
+    def validate_selection(cls, v, values):
+        has_slot_ids = values.get('slot_ids') is not None
+        has_recurrence = values.get('first_slot_id') is not None
+        if has_slot_ids == has_recurrence:
+            raise ValueError("Provide either slot_ids or first_slot_id with count")
+        if has_recurrence and v is None:
+            raise ValueError("count is required with first_slot_id")
+        return v
+
+
 class AppointmentUpdate(BaseModel):
     patient_first_name: Optional[str] = Field(None, min_length=1, max_length=100)
     patient_last_name: Optional[str] = Field(None, min_length=1, max_length=100)
@@ -167,6 +341,10 @@ class AppointmentUpdate(BaseModel):
     patient_email: Optional[EmailStr] = None
 
 
+class AppointmentReschedule(BaseModel):
+    slot_id: UUID = Field(..., description="Slot to move the appointment to")
+
+
 class AppointmentResponse(BaseModel):
     id: UUID
     doctor_id: UUID
@@ -188,10 +366,19 @@ class AppointmentResponse(BaseModel):
 
 
 class AppointmentListResponse(BaseModel):
+    """
+    One page of appointments, ordered by slot time.
+    Pass next_cursor back as `cursor` to get the following page.
+    """
     appointments: List[AppointmentResponse]
-    total: int
-    page: int
+    next_cursor: Optional[str] = Field(None, description="Cursor of the next page, null on the last page")
     page_size: int
+    total: Optional[int] = Field(None, description="Matching appointments, only when count is requested")
+
+
+class AppointmentSeriesResponse(BaseModel):
+    message: str
+    appointments: List[AppointmentResponse] = Field(..., description="Booked appointments, in slot order")
 
 
 # ADMIN MODELS
@@ -1,52 +1,59 @@
-from fastapi import APIRouter, Depends, Query
-from typing import List, Optional
+import time
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, status
+from fastapi.responses import StreamingResponse
+from typing import Literal, Optional
 from uuid import UUID
+from app.core.config import settings
 from app.core.database import get_supabase_admin_client
-from app.services.appointments import AppointmentService
-from app.services.email import EmailService, get_email_service
+from app.core.idempotency import idempotency_store
+from app.core.metrics import TimedRoute
+from app.core.serialization import FastJSONResponse
+from app.services.appointments import AppointmentService, EXPORT_COLUMNS
+from app.services.events import ADMIN_TOPIC, sse_stream
+from app.services.export import csv_stream, ndjson_stream
+from app.services.email_templates import email_templates
+from app.services.outbox import EmailOutboxService, get_email_outbox
 from app.models import (
     AppointmentCreate,
     AppointmentManualCreate,
+    AppointmentSeriesCreate,
+    AppointmentSeriesResponse,
     AppointmentUpdate,
+    AppointmentReschedule,
     AppointmentResponse,
+    AppointmentListResponse,
     SuccessResponse,
     UserResponse
 )
-from app.routes.auth import get_current_user
+from app.routes.auth import get_current_user, get_stream_user
 from app.routes.doctors import require_admin
 
 
-router = APIRouter()
+router = APIRouter(route_class=TimedRoute)
 
+CountMode = Literal["exact", "estimated"]
 
-def get_appointment_service() -> AppointmentService:
-    admin_client = get_supabase_admin_client()
-    return AppointmentService(admin_client)
-
-
-def format_date_for_email(iso_string: str) -> str:
-    from datetime import datetime
-    date_part = iso_string[:10]
-    date_obj = datetime.strptime(date_part, "%Y-%m-%d")
-    return date_obj.strftime("%d/%m/%Y")
-
-
-def format_time_for_email(iso_string: str) -> str:
-    return iso_string[11:16] if len(iso_string) > 16 else ""
-
+PAGE_SIZE_QUERY = Query(
+    settings.appointments_page_size,
+    ge=1,
+    le=settings.appointments_max_page_size,
+    description="Page size"
+)
+COUNT_QUERY = Query(
+    None,
+    description="Also return the total on the first page: exact, or estimated (cheaper on large tables)"
+)
+IDEMPOTENCY_KEY_HEADER = Header(
+    None,
+    alias="Idempotency-Key",
+    max_length=255,
+    description="Client-generated key: retries with the same key replay the first response"
+)
 
-def send_confirmation_email(appointment: AppointmentResponse, email_service: EmailService):
-    if not appointment.doctor or not appointment.slot:
-        return
 
-    email_service.send_confirmation(
-        to_email=appointment.patient_email,
-        patient_name=f"{appointment.patient_first_name} {appointment.patient_last_name}",
-        doctor_name=f"{appointment.doctor.first_name} {appointment.doctor.last_name}",
-        specialization=appointment.doctor.specialization,
-        date=format_date_for_email(str(appointment.slot.start_time)),
-        time=format_time_for_email(str(appointment.slot.start_time))
-    )
+async def get_appointment_service() -> AppointmentService:
+    admin_client = await get_supabase_admin_client()
+    return AppointmentService(admin_client)
 
 
 # PATIENT ENDPOINTS
@@ -59,26 +66,35 @@ def send_confirmation_email(appointment: AppointmentResponse, email_service: Ema
 )
 async def create_appointment(
     data: AppointmentCreate,
+    idempotency_key: Optional[str] = IDEMPOTENCY_KEY_HEADER,
+    accept_language: Optional[str] = Header(None, description="Language of the patient's emails"),
     current_user: UserResponse = Depends(get_current_user),
-    service: AppointmentService = Depends(get_appointment_service),
-    email_service: EmailService = Depends(get_email_service)
+    service: AppointmentService = Depends(get_appointment_service)
 ):
-    appointment = service.create(data, current_user.id)
-    send_confirmation_email(appointment, email_service)
-    return appointment
+    # book_appointment queues the confirmation email in the same transaction; the
+    # appointment keeps the patient's language for the emails that follow
+    locale = email_templates.negotiate(accept_language)
+
+    async def book() -> AppointmentResponse:
+        return await service.create(data, current_user.id, locale)
+
+    return await idempotency_store.run(f"appointments:{current_user.id}", idempotency_key, data, book)
 
 
 @router.get(
     "/me",
-    response_model=List[AppointmentResponse],
+    response_model=AppointmentListResponse,
     summary="My Appointments",
-    description="Get all appointments for the current user"
+    description="Get the current user's appointments, latest first, one page at a time"
 )
 async def get_my_appointments(
+    cursor: Optional[str] = Query(None, description="next_cursor of the previous page"),
+    limit: int = PAGE_SIZE_QUERY,
+    count: Optional[CountMode] = COUNT_QUERY,
     current_user: UserResponse = Depends(get_current_user),
     service: AppointmentService = Depends(get_appointment_service)
 ):
-    return service.get_my_appointments(current_user.id)
+    return FastJSONResponse(await service.get_my_appointments(current_user.id, cursor, limit, count))
 
 
 @router.patch(
@@ -94,7 +110,25 @@ async def update_appointment(
     service: AppointmentService = Depends(get_appointment_service)
 ):
     is_admin = current_user.role == "admin"
-    return service.update(appointment_id, data, current_user.id, is_admin)
+    return await service.update(appointment_id, data, current_user.id, is_admin)
+
+
+@router.post(
+    "/{appointment_id}/reschedule",
+    response_model=AppointmentResponse,
+    summary="Reschedule Appointment",
+    description="Move an appointment to another free slot, keeping the same appointment"
+)
+async def reschedule_appointment(
+    appointment_id: UUID,
+    data: AppointmentReschedule,
+    current_user: UserResponse = Depends(get_current_user),
+    service: AppointmentService = Depends(get_appointment_service)
+):
+    # reschedule_appointment queues the rescheduled email in the same transaction
+    is_admin = current_user.role == "admin"
+    appointment, _ = await service.reschedule(appointment_id, data, current_user.id, is_admin)
+    return appointment
 
 
 @router.delete(
@@ -106,48 +140,85 @@ async def update_appointment(
 async def cancel_appointment(
     appointment_id: UUID,
     current_user: UserResponse = Depends(get_current_user),
-    service: AppointmentService = Depends(get_appointment_service),
-    email_service: EmailService = Depends(get_email_service)
+    service: AppointmentService = Depends(get_appointment_service)
 ):
+    # cancel_appointment queues the cancellation email in the same transaction
     is_admin = current_user.role == "admin"
-    appointment = service.cancel(appointment_id, current_user.id, is_admin)
-
-    # Send cancellation email
-    if appointment.doctor and appointment.slot:
-        patient_name = f"{appointment.patient_first_name} {appointment.patient_last_name}"
-        doctor_name = f"{appointment.doctor.first_name} {appointment.doctor.last_name}"
-        date = format_date_for_email(str(appointment.slot.start_time))
-        time = format_time_for_email(str(appointment.slot.start_time))
-
-        if is_admin:
-            email_service.send_cancellation_by_clinic(
-                appointment.patient_email, patient_name, doctor_name, date, time
-            )
-        else:
-            email_service.send_cancellation_by_patient(
-                appointment.patient_email, patient_name, doctor_name, date, time
-            )
-
-    return appointment
+    return await service.cancel(appointment_id, current_user.id, is_admin)
 
 
 # ADMIN ENDPOINTS
 
 @router.get(
     "/admin/all",
-    response_model=List[AppointmentResponse],
+    response_model=AppointmentListResponse,
     summary="All Appointments",
-    description="Get all appointments (admin only)"
+    description="Get all appointments ordered by slot time, one page at a time (admin only)"
 )
 async def get_all_appointments(
     doctor_id: Optional[UUID] = Query(None, description="Filter by doctor"),
     date: Optional[str] = Query(None, description="Filter by date (YYYY-MM-DD)"),
     date_end: Optional[str] = Query(None, description="End date for range filter (YYYY-MM-DD)"),
     status: Optional[str] = Query(None, description="Filter by status"),
+    cursor: Optional[str] = Query(None, description="next_cursor of the previous page"),
+    limit: int = PAGE_SIZE_QUERY,
+    count: Optional[CountMode] = COUNT_QUERY,
     service: AppointmentService = Depends(get_appointment_service),
     _: UserResponse = Depends(require_admin)
 ):
-    return service.get_all(doctor_id, date, date_end, status)
+    return FastJSONResponse(await service.get_all(doctor_id, date, date_end, status, cursor, limit, count))
+
+
+@router.get(
+    "/admin/events",
+    summary="Clinic Events",
+    description="Server-Sent Events stream of bookings, cancellations and slot changes (admin only)",
+    response_class=StreamingResponse
+)
+async def admin_events(
+    current_user: UserResponse = Depends(get_stream_user)
+):
+    if current_user.role != "admin":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Accesso riservato agli amministratori"
+        )
+    return StreamingResponse(
+        sse_stream(ADMIN_TOPIC),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.get(
+    "/admin/export",
+    summary="Export Appointments",
+    description="Stream appointments as CSV or NDJSON for reporting, same filters as /admin/all (admin only)",
+    response_class=StreamingResponse
+)
+async def export_appointments(
+    format: Literal["csv", "ndjson"] = Query("csv", description="Output format"),
+    doctor_id: Optional[UUID] = Query(None, description="Filter by doctor"),
+    date: Optional[str] = Query(None, description="Filter by date (YYYY-MM-DD)"),
+    date_end: Optional[str] = Query(None, description="End date for range filter (YYYY-MM-DD)"),
+    status: Optional[str] = Query(None, description="Filter by status"),
+    service: AppointmentService = Depends(get_appointment_service),
+    _: UserResponse = Depends(require_admin)
+):
+    rows = service.export(doctor_id, date, date_end, status)
+
+    if format == "ndjson":
+        return StreamingResponse(
+            ndjson_stream(rows),
+            media_type="application/x-ndjson",
+            headers={"Content-Disposition": 'attachment; filename="appointments.ndjson"'}
+        )
+
+    return StreamingResponse(
+        csv_stream(rows, EXPORT_COLUMNS),
+        media_type="text/csv; charset=utf-8",
+        headers={"Content-Disposition": 'attachment; filename="appointments.csv"'}
+    )
 
 
 @router.post(
@@ -158,13 +229,38 @@ async def get_all_appointments(
 )
 async def create_manual_appointment(
     data: AppointmentManualCreate,
+    idempotency_key: Optional[str] = IDEMPOTENCY_KEY_HEADER,
     service: AppointmentService = Depends(get_appointment_service),
-    email_service: EmailService = Depends(get_email_service),
-    _: UserResponse = Depends(require_admin)
+    current_user: UserResponse = Depends(require_admin)
 ):
-    appointment = service.create_manual(data)
-    send_confirmation_email(appointment, email_service)
-    return appointment
+    # book_appointment queues the confirmation email in the same transaction
+    async def book() -> AppointmentResponse:
+        return await service.create_manual(data)
+
+    return await idempotency_store.run(f"appointments/manual:{current_user.id}", idempotency_key, data, book)
+
+
+@router.post(
+    "/admin/series",
+    response_model=AppointmentSeriesResponse,
+    summary="Book Treatment Series",
+    description="Admin books a series of slots (list or weekly recurrence) for one patient, all or nothing, with one summary email"
+)
+async def create_appointment_series(
+    data: AppointmentSeriesCreate,
+    idempotency_key: Optional[str] = IDEMPOTENCY_KEY_HEADER,
+    service: AppointmentService = Depends(get_appointment_service),
+    current_user: UserResponse = Depends(require_admin)
+):
+    # book_appointment_series queues the summary email in the same transaction
+    async def book() -> AppointmentSeriesResponse:
+        appointments = await service.create_series(data)
+        return AppointmentSeriesResponse(
+            message=f"Prenotati {len(appointments)} appuntamenti",
+            appointments=appointments
+        )
+
+    return await idempotency_store.run(f"appointments/series:{current_user.id}", idempotency_key, data, book)
 
 
 @router.post(
@@ -177,9 +273,11 @@ async def resend_confirmation_email(
     appointment_id: UUID,
     current_user: UserResponse = Depends(get_current_user),
     service: AppointmentService = Depends(get_appointment_service),
-    email_service: EmailService = Depends(get_email_service)
+    outbox: EmailOutboxService = Depends(get_email_outbox)
 ):
     is_admin = current_user.role == "admin"
-    appointment = service.get_by_id(appointment_id, current_user.id, is_admin)
-    send_confirmation_email(appointment, email_service)
+    appointment = await service.get_by_id(appointment_id, current_user.id, is_admin)
+    # Repeated clicks within the same minute queue a single email
+    dedupe_key = f"{appointment.id}:confirmation:{int(time.time()) // 60}"
+    await outbox.enqueue(appointment.id, "confirmation", dedupe_key)
     return SuccessResponse(message="Email inviata")
\ No newline at end of file
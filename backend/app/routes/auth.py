@@ -1,21 +1,22 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Header
+from fastapi import APIRouter, Depends, HTTPException, status, Header, Query
 from typing import Optional
-from supabase import Client
+from supabase import AsyncClient
 from app.core.database import get_db, get_supabase_admin_client
+from app.core.metrics import TimedRoute
 from app.services.auth import AuthService
 from app.models import MagicLinkRequest, MagicLinkResponse, UserResponse
 
 
 # Create router
-router = APIRouter()
+router = APIRouter(route_class=TimedRoute)
 
 
-def get_auth_service(db: Client = Depends(get_db)) -> AuthService:
-    admin_client = get_supabase_admin_client()
+async def get_auth_service(db: AsyncClient = Depends(get_db)) -> AuthService:
+    admin_client = await get_supabase_admin_client()
     return AuthService(db, admin_client)
 
 
-def get_token_from_header(authorization: Optional[str] = Header(None)) -> str:
+async def get_token_from_header(authorization: Optional[str] = Header(None)) -> str:
     """
     Extract and validate JWT token from Authorization header.
 
@@ -47,12 +48,22 @@ def get_token_from_header(authorization: Optional[str] = Header(None)) -> str:
     return parts[1]
 
 
-def get_current_user(
+async def get_current_user(
     token: str = Depends(get_token_from_header),
     auth_service: AuthService = Depends(get_auth_service)
 ) -> UserResponse:
 
-    return auth_service.get_current_user(token)
+    return await auth_service.get_current_user(token)
+
+
+async def get_stream_user(
+    authorization: Optional[str] = Header(None),
+    access_token: Optional[str] = Query(None, description="Access token, for EventSource clients that cannot send headers"),
+    auth_service: AuthService = Depends(get_auth_service)
+) -> UserResponse:
+    """Current user for event streams: Authorization header or ?access_token=."""
+    token = access_token or await get_token_from_header(authorization)
+    return await auth_service.get_current_user(token)
 
 
 # AUTH ENDPOINTS
@@ -67,7 +78,7 @@ async def request_magic_link(
     request: MagicLinkRequest,
     auth_service: AuthService = Depends(get_auth_service)
 ):
-    return auth_service.send_magic_link(request)
+    return await auth_service.send_magic_link(request)
 
 
 @router.get(
@@ -91,7 +102,7 @@ async def verify_token(
     auth_service: AuthService = Depends(get_auth_service),
     token: str = Depends(get_token_from_header)
 ):
-    is_valid = auth_service.verify_token(token)
+    is_valid = await auth_service.verify_token(token)
 
     if not is_valid:
         raise HTTPException(
@@ -1,26 +1,51 @@
-from fastapi import APIRouter, Depends, Query
+import asyncio
+import time
+from fastapi import APIRouter, Depends, Query, Request, Response
+from fastapi.responses import StreamingResponse
 from typing import List, Optional
 from uuid import UUID
+from app.core.config import settings
 from app.core.database import get_supabase_admin_client
+from app.core.http_cache import etag_matches, make_etag, not_modified, set_cache_headers
+from app.core.metrics import TimedRoute
 from app.services.availability import AvailabilityService
+from app.services.doctors import DoctorService
+from app.services.events import doctor_topic, sse_stream
 from app.models import (
+    AvailabilityScheduleCreate,
+    AvailabilityScheduleResponse,
     AvailabilitySlotCreate,
     AvailabilitySlotResponse,
     AvailabilitySlotsCreatedResponse,
+    AvailableSlotResponse,
+    CalendarDay,
+    DoctorDetailResponse,
+    SlotBulkAction,
+    SlotBulkResponse,
+    SlotHoldResponse,
     SuccessResponse,
     UserResponse
 )
-from app.routes.doctors import require_admin
+from app.routes.auth import get_current_user
+from app.routes.doctors import get_doctor_service, require_admin
 
 
-router = APIRouter()
+router = APIRouter(route_class=TimedRoute)
 
 
-def get_availability_service() -> AvailabilityService:
-    admin_client = get_supabase_admin_client()
+async def get_availability_service() -> AvailabilityService:
+    admin_client = await get_supabase_admin_client()
     return AvailabilityService(admin_client)
 
 
+def availability_period() -> int:
+    """
+    Part of the availability ETags: slot lists also change without a write,
+    when holds expire or slots start, so validators roll over every minute.
+    """
+    return int(time.time() // 60)
+
+
 # PUBLIC ENDPOINTS
 
 @router.get(
@@ -31,11 +56,19 @@ def get_availability_service() -> AvailabilityService:
 )
 async def get_doctor_slots(
     doctor_id: UUID,
+    request: Request,
+    response: Response,
     date: Optional[str] = Query(None, description="Filter by date (YYYY-MM-DD)"),
     available_only: bool = Query(True, description="Only return available slots"),
     service: AvailabilityService = Depends(get_availability_service)
 ):
-    return service.get_by_doctor(doctor_id, date, available_only)
+    cache_control = settings.cache_control_availability
+    version = await service.get_version(doctor_id)
+    etag = make_etag("slots", doctor_id, version, date, available_only, availability_period())
+    if etag_matches(request, etag):
+        return not_modified(etag, cache_control)
+    set_cache_headers(response, etag, cache_control)
+    return await service.get_by_doctor(doctor_id, date, available_only)
 
 
 @router.get(
@@ -46,9 +79,151 @@ async def get_doctor_slots(
 )
 async def get_available_dates(
     doctor_id: UUID,
+    request: Request,
+    response: Response,
+    service: AvailabilityService = Depends(get_availability_service)
+):
+    cache_control = settings.cache_control_availability
+    version = await service.get_version(doctor_id)
+    etag = make_etag("dates", doctor_id, version, availability_period())
+    if etag_matches(request, etag):
+        return not_modified(etag, cache_control)
+    set_cache_headers(response, etag, cache_control)
+    return await service.get_available_dates(doctor_id)
+
+
+@router.get(
+    "/doctors/{doctor_id}/detail",
+    response_model=DoctorDetailResponse,
+    summary="Get Doctor Detail",
+    description="Get a doctor, their available dates and the available slots of one date (the first available by default)"
+)
+async def get_doctor_detail(
+    doctor_id: UUID,
+    request: Request,
+    response: Response,
+    date: Optional[str] = Query(None, description="Date of the slots (YYYY-MM-DD), defaults to the first available"),
+    service: AvailabilityService = Depends(get_availability_service),
+    doctor_service: DoctorService = Depends(get_doctor_service)
+):
+    cache_control = settings.cache_control_availability
+    catalog_version, version = await asyncio.gather(
+        doctor_service.get_catalog_version(),
+        service.get_version(doctor_id)
+    )
+    etag = None
+    if catalog_version is not None:
+        etag = make_etag("detail", doctor_id, catalog_version, version, date, availability_period())
+        if etag_matches(request, etag):
+            return not_modified(etag, cache_control)
+
+    if date:
+        doctor, available_dates, slots = await asyncio.gather(
+            doctor_service.get_by_id(doctor_id),
+            service.get_available_dates(doctor_id),
+            service.get_by_doctor(doctor_id, date, available_only=True)
+        )
+    else:
+        # The slots depend on the first available date
+        doctor, available_dates = await asyncio.gather(
+            doctor_service.get_by_id(doctor_id),
+            service.get_available_dates(doctor_id)
+        )
+        date = available_dates[0] if available_dates else None
+        slots = await service.get_by_doctor(doctor_id, date, available_only=True) if date else []
+
+    if etag is not None:
+        set_cache_headers(response, etag, cache_control)
+    return DoctorDetailResponse(
+        doctor=doctor,
+        available_dates=available_dates,
+        selected_date=date,
+        slots=slots
+    )
+
+
+@router.get(
+    "/doctors/{doctor_id}/calendar",
+    response_model=List[CalendarDay],
+    summary="Get Availability Calendar",
+    description="Get the number of available slots per day for a doctor"
+)
+async def get_calendar(
+    doctor_id: UUID,
+    request: Request,
+    response: Response,
+    service: AvailabilityService = Depends(get_availability_service)
+):
+    cache_control = settings.cache_control_availability
+    version = await service.get_version(doctor_id)
+    etag = make_etag("calendar", doctor_id, version, availability_period())
+    if etag_matches(request, etag):
+        return not_modified(etag, cache_control)
+    set_cache_headers(response, etag, cache_control)
+    return await service.get_calendar(doctor_id)
+
+
+@router.get(
+    "/slots/first-available",
+    response_model=List[AvailableSlotResponse],
+    summary="Search First Available Slots",
+    description="Get the earliest available slots for a specialization, across all its doctors"
+)
+async def search_first_available(
+    specialization: str = Query(..., description="Specialization"),
+    date_from: Optional[str] = Query(None, pattern=r"^\d{4}-\d{2}-\d{2}$", description="From date (YYYY-MM-DD)"),
+    date_to: Optional[str] = Query(None, pattern=r"^\d{4}-\d{2}-\d{2}$", description="To date, inclusive (YYYY-MM-DD)"),
+    time_from: Optional[str] = Query(None, pattern=r"^\d{2}:\d{2}$", description="Earliest start time of day (HH:MM)"),
+    time_to: Optional[str] = Query(None, pattern=r"^\d{2}:\d{2}$", description="Latest end time of day (HH:MM)"),
+    limit: int = Query(10, ge=1, le=50, description="Number of slots"),
+    service: AvailabilityService = Depends(get_availability_service)
+):
+    return await service.search_first_available(specialization, date_from, date_to, time_from, time_to, limit)
+
+
+@router.get(
+    "/doctors/{doctor_id}/events",
+    summary="Doctor Availability Events",
+    description="Server-Sent Events stream of slot changes for a doctor",
+    response_class=StreamingResponse
+)
+async def doctor_events(doctor_id: UUID):
+    return StreamingResponse(
+        sse_stream(doctor_topic(doctor_id)),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+# PATIENT ENDPOINTS
+
+@router.post(
+    "/slots/{slot_id}/hold",
+    response_model=SlotHoldResponse,
+    summary="Hold Slot",
+    description="Hold a slot for the current user while the booking form is open"
+)
+async def hold_slot(
+    slot_id: UUID,
+    current_user: UserResponse = Depends(get_current_user),
+    service: AvailabilityService = Depends(get_availability_service)
+):
+    return await service.hold(slot_id, current_user.id)
+
+
+@router.delete(
+    "/slots/{slot_id}/hold",
+    response_model=SuccessResponse,
+    summary="Release Slot Hold",
+    description="Release the current user's hold on a slot"
+)
+async def release_slot_hold(
+    slot_id: UUID,
+    current_user: UserResponse = Depends(get_current_user),
     service: AvailabilityService = Depends(get_availability_service)
 ):
-    return service.get_available_dates(doctor_id)
+    await service.release_hold(slot_id, current_user.id)
+    return SuccessResponse(message="Slot rilasciato")
 
 
 # ADMIN ENDPOINTS
@@ -64,7 +239,7 @@ async def create_slots(
     service: AvailabilityService = Depends(get_availability_service),
     _: UserResponse = Depends(require_admin)
 ):
-    slots = service.create_slots(data)
+    slots = await service.create_slots(data)
     return AvailabilitySlotsCreatedResponse(
         message=f"Creati {len(slots)} slot",
         slots_created=len(slots),
@@ -72,6 +247,44 @@ async def create_slots(
     )
 
 
+@router.post(
+    "/admin/availability/schedule",
+    response_model=AvailabilityScheduleResponse,
+    summary="Create Availability From Schedule",
+    description="Generate slots for a weekly schedule over a date range (admin only)"
+)
+async def create_schedule(
+    data: AvailabilityScheduleCreate,
+    service: AvailabilityService = Depends(get_availability_service),
+    _: UserResponse = Depends(require_admin)
+):
+    created, skipped = await service.create_schedule(data)
+    return AvailabilityScheduleResponse(
+        message=f"Creati {created} slot, {skipped} già esistenti",
+        slots_created=created,
+        slots_skipped=skipped
+    )
+
+
+@router.post(
+    "/admin/availability/bulk",
+    response_model=SlotBulkResponse,
+    summary="Bulk Update Slots",
+    description="Enable, disable or delete many slots by id or by doctor and time range; booked slots are reported as conflicts (admin only)"
+)
+async def bulk_update_slots(
+    data: SlotBulkAction,
+    service: AvailabilityService = Depends(get_availability_service),
+    _: UserResponse = Depends(require_admin)
+):
+    slots, conflicts = await service.bulk_update(data)
+    return SlotBulkResponse(
+        message=f"Aggiornati {len(slots)} slot, {len(conflicts)} con appuntamenti attivi",
+        slots=slots,
+        conflicts=conflicts
+    )
+
+
 @router.patch(
     "/admin/availability/{slot_id}",
     response_model=AvailabilitySlotResponse,
@@ -84,7 +297,7 @@ async def toggle_slot(
     service: AvailabilityService = Depends(get_availability_service),
     _: UserResponse = Depends(require_admin)
 ):
-    return service.toggle_availability(slot_id, is_available)
+    return await service.toggle_availability(slot_id, is_available)
 
 
 @router.delete(
@@ -98,5 +311,5 @@ async def delete_slot(
     service: AvailabilityService = Depends(get_availability_service),
     _: UserResponse = Depends(require_admin)
 ):
-    service.delete(slot_id)
+    await service.delete(slot_id)
     return SuccessResponse(message="Slot eliminato con successo")
\ No newline at end of file
@@ -1,21 +1,24 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request, Response
 from typing import List, Optional
 from uuid import UUID
+from app.core.config import settings
 from app.core.database import get_supabase_admin_client
+from app.core.http_cache import etag_matches, make_etag, not_modified, set_cache_headers
+from app.core.metrics import TimedRoute
 from app.services.doctors import DoctorService
 from app.models import DoctorCreate, DoctorUpdate, DoctorResponse, SuccessResponse, UserResponse
 from app.routes.auth import get_current_user
 
 
-router = APIRouter()
+router = APIRouter(route_class=TimedRoute)
 
 
-def get_doctor_service() -> DoctorService:
-    admin_client = get_supabase_admin_client()
+async def get_doctor_service() -> DoctorService:
+    admin_client = await get_supabase_admin_client()
     return DoctorService(admin_client)
 
 
-def require_admin(current_user: UserResponse = Depends(get_current_user)) -> UserResponse:
+async def require_admin(current_user: UserResponse = Depends(get_current_user)) -> UserResponse:
     if current_user.role != "admin":
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
@@ -33,10 +36,19 @@ def require_admin(current_user: UserResponse = Depends(get_current_user)) -> Use
     description="Get all doctors, optionally filtered by specialization"
 )
 async def list_doctors(
+    request: Request,
+    response: Response,
     specialization: Optional[str] = Query(None, description="Filter by specialization"),
     service: DoctorService = Depends(get_doctor_service)
 ):
-    return service.get_all(specialization)
+    cache_control = settings.cache_control_doctors
+    version = await service.get_catalog_version()
+    if version is not None:
+        etag = make_etag("doctors", version, specialization)
+        if etag_matches(request, etag):
+            return not_modified(etag, cache_control)
+        set_cache_headers(response, etag, cache_control)
+    return await service.get_all(specialization)
 
 
 @router.get(
@@ -46,9 +58,18 @@ async def list_doctors(
     description="Get all unique specializations"
 )
 async def list_specializations(
+    request: Request,
+    response: Response,
     service: DoctorService = Depends(get_doctor_service)
 ):
-    return service.get_specializations()
+    cache_control = settings.cache_control_specializations
+    version = await service.get_catalog_version()
+    if version is not None:
+        etag = make_etag("specializations", version)
+        if etag_matches(request, etag):
+            return not_modified(etag, cache_control)
+        set_cache_headers(response, etag, cache_control)
+    return await service.get_specializations()
 
 
 @router.get(
@@ -59,9 +80,19 @@ async def list_specializations(
 )
 async def get_doctor(
     doctor_id: UUID,
+    request: Request,
+    response: Response,
     service: DoctorService = Depends(get_doctor_service)
 ):
-    return service.get_by_id(doctor_id)
+    cache_control = settings.cache_control_doctors
+    version = await service.get_catalog_version()
+    doctor = await service.get_by_id(doctor_id)
+    if version is not None:
+        etag = make_etag("doctor", version, doctor_id)
+        if etag_matches(request, etag):
+            return not_modified(etag, cache_control)
+        set_cache_headers(response, etag, cache_control)
+    return doctor
 
 
 # ADMIN ENDPOINTS
@@ -78,7 +109,7 @@ async def create_doctor(
     service: DoctorService = Depends(get_doctor_service),
     _: UserResponse = Depends(require_admin)
 ):
-    return service.create(data)
+    return await service.create(data)
 
 
 @router.put(
@@ -93,7 +124,7 @@ async def update_doctor(
     service: DoctorService = Depends(get_doctor_service),
     _: UserResponse = Depends(require_admin)
 ):
-    return service.update(doctor_id, data)
+    return await service.update(doctor_id, data)
 
 
 @router.delete(
@@ -107,5 +138,5 @@ async def delete_doctor(
     service: DoctorService = Depends(get_doctor_service),
     _: UserResponse = Depends(require_admin)
 ):
-    service.delete(doctor_id)
+    await service.delete(doctor_id)
     return SuccessResponse(message="Dottore eliminato con successo")
\ No newline at end of file
@@ -1,71 +1,139 @@
-from typing import List, Optional
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
 from uuid import UUID
 from datetime import datetime
+import base64
 from fastapi import HTTPException, status
-from supabase import Client
+from postgrest import APIError
+from supabase import AsyncClient
+from app.core.config import settings
+from app.core.serialization import Projection
+from app.services.events import publish_appointment, publish_slot
 from app.models import (
     AppointmentCreate,
     AppointmentManualCreate,
+    AppointmentSeriesCreate,
     AppointmentUpdate,
+    AppointmentReschedule,
     AppointmentResponse,
     DoctorResponse,
     AvailabilitySlotResponse
 )
 
 
+# SQLSTATEs raised by the booking functions in schema-setup.sql (and unique violations)
+BOOKING_ERRORS = {
+    "OR404": (status.HTTP_404_NOT_FOUND, "Slot non trovato"),
+    "OR409": (status.HTTP_409_CONFLICT, "Slot non disponibile"),
+    "OR400": (status.HTTP_400_BAD_REQUEST, "Non puoi prenotare slot nel passato"),
+    "OR423": (status.HTTP_409_CONFLICT, "Slot temporaneamente riservato da un altro utente"),
+    "OR403": (status.HTTP_403_FORBIDDEN, "Non puoi modificare appuntamenti di altri utenti"),
+    "23505": (status.HTTP_409_CONFLICT, "Slot non più disponibile"),
+}
+
+
+def booking_error(error: APIError, detail: str) -> HTTPException:
+    """Map a database error from a booking function to an HTTPException."""
+    if error.code in BOOKING_ERRORS:
+        status_code, message = BOOKING_ERRORS[error.code]
+        # Our own SQLSTATEs carry the exact (Italian) message, e.g. appointment vs slot not found
+        if error.code.startswith("OR") and error.message:
+            message = error.message
+        return HTTPException(status_code=status_code, detail=message)
+    return HTTPException(
+        status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+        detail=f"{detail}: {error.message}"
+    )
+
+# List pages are shaped straight from the rows (see Projection): for hundreds of
+# appointments, building and validating models was most of the request CPU
+APPOINTMENT_PROJECTION = Projection(AppointmentResponse, nested={
+    "slot": ("availability_slots", Projection(AvailabilitySlotResponse)),
+    "doctor": ("doctors", Projection(DoctorResponse)),
+})
+
+# Columns of the rows yielded by AppointmentService.export
+EXPORT_COLUMNS = [
+    "id",
+    "status",
+    "start_time",
+    "end_time",
+    "doctor_id",
+    "doctor_first_name",
+    "doctor_last_name",
+    "specialization",
+    "patient_first_name",
+    "patient_last_name",
+    "patient_phone",
+    "patient_email",
+    "created_at",
+]
+
+
+def encode_cursor(slot_start_time: str, appointment_id: str) -> str:
+    raw = f"{slot_start_time}|{appointment_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[str, str]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        slot_start_time, appointment_id = raw.split("|")
+        datetime.fromisoformat(slot_start_time)
+        return slot_start_time, str(UUID(appointment_id))
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Cursore non valido"
+        )
+
+
 class AppointmentService:
 
-    def __init__(self, admin_client: Client):
+    def __init__(self, admin_client: AsyncClient):
         self.client = admin_client
 
-    def create(
+    async def create(
         self,
         data: AppointmentCreate,
-        user_id: UUID
+        user_id: UUID,
+        locale: Optional[str] = None
     ) -> AppointmentResponse:
+        """Book a slot for a patient; `locale` is the language of their emails."""
+        return await self._book(data, user_id, require_future=True, locale=locale)
 
-        try:
-            # Check slot exists and is available
-            slot_result = self.client.table("availability_slots") \
-                .select("*, doctors(*)") \
-                .eq("id", str(data.slot_id)) \
-                .execute()
-
-            if not slot_result.data:
-                raise HTTPException(
-                    status_code=status.HTTP_404_NOT_FOUND,
-                    detail="Slot non trovato"
-                )
-
-            slot = slot_result.data[0]
-
-            if not slot["is_available"]:
-                raise HTTPException(
-                    status_code=status.HTTP_409_CONFLICT,
-                    detail="Slot non disponibile"
-                )
-
-            # Check slot is in the future
-            slot_time = datetime.fromisoformat(slot["start_time"])
-            if slot_time <= datetime.now():
-                raise HTTPException(
-                    status_code=status.HTTP_400_BAD_REQUEST,
-                    detail="Non puoi prenotare slot nel passato"
-                )
-
-            # Create appointment data
-            appointment_data = {
-                "slot_id": str(data.slot_id),
-                "doctor_id": slot["doctor_id"],
-                "user_id": str(user_id),
-                "patient_first_name": data.patient_first_name,
-                "patient_last_name": data.patient_last_name,
-                "patient_phone": data.patient_phone,
-                "patient_email": data.patient_email,
-                "status": "confirmed"
-            }
+    async def create_manual(
+        self,
+        data: AppointmentManualCreate
+    ) -> AppointmentResponse:
+        """
+        Admin creates appointment manually ( phone/in person booking ) without user_id requirement.
+        patient_id, when given, links the appointment to that patient's user account.
+        """
+        return await self._book(data, data.patient_id, require_future=False)
 
-            result = self.client.table("appointments").insert(appointment_data).execute()
+    async def _book(
+        self,
+        data: AppointmentCreate,
+        user_id: Optional[UUID],
+        require_future: bool,
+        locale: Optional[str] = None
+    ) -> AppointmentResponse:
+        """
+        Book a slot with a single call to the book_appointment database function,
+        which locks and checks the slot, inserts the appointment and queues the
+        confirmation email in one transaction.
+        """
+        try:
+            result = await self.client.rpc("book_appointment", {
+                "p_slot_id": str(data.slot_id),
+                "p_user_id": str(user_id) if user_id else None,
+                "p_patient_first_name": data.patient_first_name,
+                "p_patient_last_name": data.patient_last_name,
+                "p_patient_phone": data.patient_phone,
+                "p_patient_email": data.patient_email,
+                "p_require_future": require_future,
+                "p_locale": locale
+            }).execute()
 
             if not result.data:
                 raise HTTPException(
@@ -73,123 +141,100 @@ class AppointmentService:
                     detail="Errore nella creazione dell'appuntamento"
                 )
 
-            # Mark slot as unavailable
-            self.client.table("availability_slots") \
-                .update({"is_available": False}) \
-                .eq("id", str(data.slot_id)) \
-                .execute()
-
-            return self._build_response(result.data[0], slot, slot.get("doctors"))
+            appointment = result.data
+            response = self._build_response(
+                appointment,
+                appointment.get("availability_slots"),
+                appointment.get("doctors")
+            )
+            await publish_appointment("created", response)
+            return response
 
         except HTTPException:
             raise
+        except APIError as e:
+            raise booking_error(e, "Errore nella creazione dell'appuntamento")
         except Exception as e:
-            # Catch unique constraint violation (PostgreSQL code 23505)
-            if "duplicate key" in str(e) or "23505" in str(e):
-                raise HTTPException(
-                    status_code=status.HTTP_409_CONFLICT,
-                    detail="Slot non più disponibile"
-                )
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=f"Errore nella creazione dell'appuntamento: {str(e)}"
             )
 
-    def create_manual(
-        self,
-        data: AppointmentManualCreate
-    ) -> AppointmentResponse:
+    async def create_series(self, data: AppointmentSeriesCreate) -> List[AppointmentResponse]:
         """
-        Admin creates appointment manually ( phone/in person booking ) without user_id requirement.
+        Book a treatment series with one call to the book_appointment_series database
+        function: every slot is checked, every appointment inserted and the summary
+        email queued in one transaction, so either the whole series is booked or
+        nothing is.
         """
         try:
-            # Check slot exists and is available
-            slot_result = self.client.table("availability_slots") \
-                .select("*, doctors(*)") \
-                .eq("id", str(data.slot_id)) \
-                .execute()
-
-            if not slot_result.data:
-                raise HTTPException(
-                    status_code=status.HTTP_404_NOT_FOUND,
-                    detail="Slot non trovato"
-                )
-
-            slot = slot_result.data[0]
-
-            if not slot["is_available"]:
-                raise HTTPException(
-                    status_code=status.HTTP_409_CONFLICT,
-                    detail="Slot non più disponibile"
-                )
-
-            # Create appointment
-            appointment_data = {
-                "slot_id": str(data.slot_id),
-                "doctor_id": slot["doctor_id"],
-                "patient_id": str(data.patient_id) if data.patient_id else None,
-                "patient_first_name": data.patient_first_name,
-                "patient_last_name": data.patient_last_name,
-                "patient_phone": data.patient_phone,
-                "patient_email": data.patient_email,
-                "status": "confirmed"
-            }
-
-            result = self.client.table("appointments").insert(appointment_data).execute()
+            result = await self.client.rpc("book_appointment_series", {
+                "p_user_id": str(data.patient_id) if data.patient_id else None,
+                "p_patient_first_name": data.patient_first_name,
+                "p_patient_last_name": data.patient_last_name,
+                "p_patient_phone": data.patient_phone,
+                "p_patient_email": data.patient_email,
+                "p_slot_ids": [str(slot_id) for slot_id in data.slot_ids] if data.slot_ids else None,
+                "p_first_slot_id": str(data.first_slot_id) if data.first_slot_id else None,
+                "p_count": data.count,
+                "p_interval_days": data.interval_days,
+                "p_require_future": False
+            }).execute()
 
             if not result.data:
                 raise HTTPException(
                     status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                    detail="Errore nella creazione dell'appuntamento"
+                    detail="Errore nella creazione della serie di appuntamenti"
                 )
 
-            # Mark slot as unavailable
-            self.client.table("availability_slots") \
-                .update({"is_available": False}) \
-                .eq("id", str(data.slot_id)) \
-                .execute()
-
-            return self._build_response(result.data[0], slot, slot.get("doctors"))
+            responses = [
+                self._build_response(
+                    appointment,
+                    appointment.get("availability_slots"),
+                    appointment.get("doctors")
+                )
+                for appointment in result.data
+            ]
+            for response in responses:
+                await publish_appointment("created", response)
+            return responses
 
         except HTTPException:
             raise
+        except APIError as e:
+            raise booking_error(e, "Errore nella creazione della serie di appuntamenti")
         except Exception as e:
-            # Catch unique constraint violation (PostgreSQL code 23505)
-            if "duplicate key" in str(e) or "23505" in str(e):
-                raise HTTPException(
-                    status_code=status.HTTP_409_CONFLICT,
-                    detail="Slot non più disponibile"
-                )
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail=f"Errore nella creazione dell'appuntamento: {str(e)}"
+                detail=f"Errore nella creazione della serie di appuntamenti: {str(e)}"
             )
 
-    def get_my_appointments(self, user_id: UUID) -> List[AppointmentResponse]:
-        """User get all their appointments"""
+    async def get_my_appointments(
+        self,
+        user_id: UUID,
+        cursor: Optional[str] = None,
+        limit: int = settings.appointments_page_size,
+        count: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """User get their appointments, latest slot first, one page at a time (see _build_page)"""
         try:
-            result = self.client.table("appointments") \
-                .select("*, availability_slots(*), doctors(*)") \
-                .eq("user_id", str(user_id)) \
-                .order("created_at", desc=True) \
-                .execute()
+            query = self.client.table("appointments") \
+                .select("*, availability_slots(*), doctors(*)", count=count) \
+                .eq("user_id", str(user_id))
 
-            return [
-                self._build_response(
-                    apt,
-                    apt.get("availability_slots"),
-                    apt.get("doctors")
-                )
-                for apt in result.data
-            ]
+            result, rows, next_cursor = await self._fetch_page(query, cursor, limit, descending=True)
+
+            return self._build_page(result, rows, next_cursor, limit, first_page=not cursor)
 
+        except HTTPException:
+            raise
         except Exception as e:
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=f"Errore nel recupero degli appuntamenti: {str(e)}"
             )
 
-    def get_by_id(
+    async def get_by_id(
         self,
         appointment_id: UUID,
         user_id: UUID,
@@ -197,7 +242,7 @@ class AppointmentService:
     ) -> AppointmentResponse:
         """Get a single appointment by id. Patient can only get theirs, admin can get any."""
         try:
-            result = self.client.table("appointments") \
+            result = await self.client.table("appointments") \
                 .select("*, availability_slots(*), doctors(*)") \
                 .eq("id", str(appointment_id)) \
                 .execute()
@@ -230,56 +275,147 @@ class AppointmentService:
                 detail=f"Errore nel recupero dell'appuntamento: {str(e)}"
             )
 
-    def get_all(
+    async def get_all(
         self,
         doctor_id: Optional[UUID] = None,
         date: Optional[str] = None,
         date_end: Optional[str] = None,
-        status_filter: Optional[str] = None
-    ) -> List[AppointmentResponse]:
-        """Get all appointments (admin only)."""
+        status_filter: Optional[str] = None,
+        cursor: Optional[str] = None,
+        limit: int = settings.appointments_page_size,
+        count: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Get all appointments (admin only), ordered by slot time, one page at a time.
+        Date filters apply to the slot start time. See _build_page.
+        """
         try:
-            query = self.client.table("appointments") \
-                .select("*, availability_slots(*), doctors(*)")
+            query = self._filtered_query(
+                self.client.table("appointments")
+                    .select("*, availability_slots(*), doctors(*)", count=count),
+                doctor_id, date, date_end, status_filter
+            )
 
-            if doctor_id:
-                query = query.eq("doctor_id", str(doctor_id))
+            result, rows, next_cursor = await self._fetch_page(query, cursor, limit, descending=False)
 
-            if status_filter:
-                query = query.eq("status", status_filter)
+            return self._build_page(result, rows, next_cursor, limit, first_page=not cursor)
 
-            result = query.order("created_at", desc=True).execute()
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Errore nel recupero degli appuntamenti: {str(e)}"
+            )
 
-            appointments = []
-            for apt in result.data:
-                slot = apt.get("availability_slots")
+    async def export(
+        self,
+        doctor_id: Optional[UUID] = None,
+        date: Optional[str] = None,
+        date_end: Optional[str] = None,
+        status_filter: Optional[str] = None,
+        batch_size: int = settings.export_batch_size
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Stream appointments (admin only) as flat rows for reporting, ordered by slot time.
+        Reads the database one keyset page at a time, so memory stays bounded by batch_size.
+        """
+        cursor = None
+        while True:
+            query = self._filtered_query(
+                self.client.table("appointments").select(
+                    "id, status, slot_start_time, doctor_id, patient_first_name, "
+                    "patient_last_name, patient_phone, patient_email, created_at, "
+                    "availability_slots(end_time), doctors(first_name, last_name, specialization)"
+                ),
+                doctor_id, date, date_end, status_filter
+            )
 
-                # Filter by date or date range
-                if slot:
-                    slot_date = slot["start_time"][:10]
-                    if date and date_end:
-                        if slot_date < date or slot_date > date_end:
-                            continue
-                    elif date:
-                        if slot_date != date:
-                            continue
+            _, rows, cursor = await self._fetch_page(query, cursor, batch_size, descending=False)
+
+            for apt in rows:
+                slot = apt.get("availability_slots") or {}
+                doctor = apt.get("doctors") or {}
+                yield {
+                    "id": apt["id"],
+                    "status": apt["status"],
+                    "start_time": apt["slot_start_time"],
+                    "end_time": slot.get("end_time"),
+                    "doctor_id": apt["doctor_id"],
+                    "doctor_first_name": doctor.get("first_name"),
+                    "doctor_last_name": doctor.get("last_name"),
+                    "specialization": doctor.get("specialization"),
+                    "patient_first_name": apt["patient_first_name"],
+                    "patient_last_name": apt["patient_last_name"],
+                    "patient_phone": apt["patient_phone"],
+                    "patient_email": apt["patient_email"],
+                    "created_at": apt["created_at"],
+                }
+
+            if not cursor:
+                break
+
+    def _filtered_query(
+        self,
+        query,
+        doctor_id: Optional[UUID],
+        date: Optional[str],
+        date_end: Optional[str],
+        status_filter: Optional[str]
+    ):
+        """Apply the admin list filters (doctor, slot date or date range, status)."""
+        if doctor_id:
+            query = query.eq("doctor_id", str(doctor_id))
+
+        if status_filter:
+            query = query.eq("status", status_filter)
+
+        # Filter by date or date range
+        if date:
+            query = query \
+                .gte("slot_start_time", f"{date}T00:00:00") \
+                .lte("slot_start_time", f"{date_end or date}T23:59:59")
+
+        return query
+
+    async def _fetch_page(
+        self,
+        query,
+        cursor: Optional[str],
+        limit: int,
+        descending: bool
+    ) -> Tuple[Any, List[dict], Optional[str]]:
+        """
+        Keyset pagination on (slot_start_time, id): the next page starts right after
+        the last row of the previous one, so each page is an index range scan and rows
+        inserted meanwhile never shift or duplicate entries across pages.
 
-                appointments.append(
-                    self._build_response(apt, slot, apt.get("doctors"))
-                )
+        Returns the raw result (for the count), the page rows and the next cursor.
+        """
+        if cursor:
+            start_time, appointment_id = decode_cursor(cursor)
+            op = "lt" if descending else "gt"
+            query = query.or_(
+                f'slot_start_time.{op}."{start_time}",'
+                f'and(slot_start_time.eq."{start_time}",id.{op}.{appointment_id})'
+            )
 
-            # Sort by slot time ascending
-            appointments.sort(key=lambda x: x.slot.start_time if x.slot else "", reverse=False)
+        # One extra row tells whether there is a next page
+        result = await query \
+            .order("slot_start_time", desc=descending) \
+            .order("id", desc=descending) \
+            .limit(limit + 1) \
+            .execute()
 
-            return appointments
+        rows = result.data[:limit]
+        next_cursor = None
+        if len(result.data) > limit:
+            last = rows[-1]
+            next_cursor = encode_cursor(last["slot_start_time"], last["id"])
 
-        except Exception as e:
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail=f"Errore nel recupero degli appuntamenti: {str(e)}"
-            )
+        return result, rows, next_cursor
 
-    def update(
+    async def update(
         self,
         appointment_id: UUID,
         data: AppointmentUpdate,
@@ -288,7 +424,7 @@ class AppointmentService:
     ) -> AppointmentResponse:
         """Update appointment patient data. Patient can update only theirs, admin can update any."""
         try:
-            result = self.client.table("appointments") \
+            result = await self.client.table("appointments") \
                 .select("*, availability_slots(*), doctors(*)") \
                 .eq("id", str(appointment_id)) \
                 .execute()
@@ -314,7 +450,7 @@ class AppointmentService:
                     detail="Nessun dato da aggiornare"
                 )
 
-            update_result = self.client.table("appointments") \
+            update_result = await self.client.table("appointments") \
                 .update(update_data) \
                 .eq("id", str(appointment_id)) \
                 .execute()
@@ -339,7 +475,7 @@ class AppointmentService:
                 detail=f"Errore nell'aggiornamento: {str(e)}"
             )
 
-    def cancel(
+    async def cancel(
         self,
         appointment_id: UUID,
         user_id: UUID,
@@ -347,78 +483,112 @@ class AppointmentService:
     ) -> AppointmentResponse:
         """
         Cancel an appointment. Admin can cancel any, patient can only cancel their future appointments.
+        The cancel_appointment database function marks it cancelled, frees the slot and
+        queues the cancellation email in one transaction.
         """
         try:
-
-            result = self.client.table("appointments") \
-                .select("*, availability_slots(*), doctors(*)") \
-                .eq("id", str(appointment_id)) \
-                .execute()
+            result = await self.client.rpc("cancel_appointment", {
+                "p_appointment_id": str(appointment_id),
+                "p_user_id": str(user_id),
+                "p_is_admin": is_admin
+            }).execute()
 
             if not result.data:
                 raise HTTPException(
-                    status_code=status.HTTP_404_NOT_FOUND,
-                    detail="Appuntamento non trovato"
+                    status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                    detail="Errore nella cancellazione"
                 )
 
-            appointment = result.data[0]
-            slot = appointment.get("availability_slots")
-
-            # Check permissions
-            if not is_admin:
-                if appointment.get("user_id") != str(user_id):
-                    raise HTTPException(
-                        status_code=status.HTTP_403_FORBIDDEN,
-                        detail="Non puoi cancellare appuntamenti di altri utenti"
-                    )
-
-                # Check if appointment is in the future
-                if slot:
-                    slot_time = datetime.fromisoformat(slot["start_time"])
-                    if slot_time <= datetime.now():
-                        raise HTTPException(
-                            status_code=status.HTTP_400_BAD_REQUEST,
-                            detail="Non puoi cancellare appuntamenti passati"
-                        )
-
-            # Check if already cancelled
-            if appointment["status"] == "cancelled":
-                raise HTTPException(
-                    status_code=status.HTTP_400_BAD_REQUEST,
-                    detail="Appuntamento già cancellato"
-                )
+            appointment = result.data
+            response = self._build_response(
+                appointment,
+                appointment.get("availability_slots"),
+                appointment.get("doctors")
+            )
+            await publish_appointment("cancelled", response)
+            return response
 
-            # Cancel appointment
-            update_result = self.client.table("appointments") \
-                .update({"status": "cancelled"}) \
-                .eq("id", str(appointment_id)) \
-                .execute()
+        except HTTPException:
+            raise
+        except APIError as e:
+            raise booking_error(e, "Errore nella cancellazione")
+        except Exception as e:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Errore nella cancellazione: {str(e)}"
+            )
 
-            # Mark the slot as free
-            if slot:
-                self.client.table("availability_slots") \
-                    .update({"is_available": True}) \
-                    .eq("id", slot["id"]) \
-                    .execute()
+    async def reschedule(
+        self,
+        appointment_id: UUID,
+        data: AppointmentReschedule,
+        user_id: UUID,
+        is_admin: bool
+    ) -> Tuple[AppointmentResponse, AvailabilitySlotResponse]:
+        """
+        Move an appointment to another slot, keeping its id. The reschedule_appointment
+        database function claims the new slot, frees the old one and queues the
+        rescheduled email in one transaction.
+        Returns the updated appointment and the slot it was moved from.
+        """
+        try:
+            result = await self.client.rpc("reschedule_appointment", {
+                "p_appointment_id": str(appointment_id),
+                "p_new_slot_id": str(data.slot_id),
+                "p_user_id": str(user_id),
+                "p_is_admin": is_admin
+            }).execute()
 
-            updated_appointment = update_result.data[0]
-            updated_appointment["availability_slots"] = slot
-            updated_appointment["doctors"] = appointment.get("doctors")
+            if not result.data:
+                raise HTTPException(
+                    status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                    detail="Errore nello spostamento dell'appuntamento"
+                )
 
-            return self._build_response(
-                updated_appointment,
-                slot,
+            appointment = result.data
+            response = self._build_response(
+                appointment,
+                appointment.get("availability_slots"),
                 appointment.get("doctors")
             )
+            previous_slot = AvailabilitySlotResponse(**appointment["previous_slot"])
+
+            await publish_appointment("rescheduled", response)
+            await publish_slot(
+                previous_slot.id,
+                previous_slot.doctor_id,
+                previous_slot.start_time,
+                is_available=True
+            )
+            return response, previous_slot
 
         except HTTPException:
             raise
+        except APIError as e:
+            raise booking_error(e, "Errore nello spostamento dell'appuntamento")
         except Exception as e:
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail=f"Errore nella cancellazione: {str(e)}"
+                detail=f"Errore nello spostamento dell'appuntamento: {str(e)}"
             )
 
+    def _build_page(
+        self,
+        result,
+        rows: List[dict],
+        next_cursor: Optional[str],
+        limit: int,
+        first_page: bool
+    ) -> Dict[str, Any]:
+        """A page shaped like AppointmentListResponse, built without validation."""
+        return {
+            "appointments": [APPOINTMENT_PROJECTION(apt) for apt in rows],
+            "next_cursor": next_cursor,
+            "page_size": limit,
+            # count is only requested/meaningful without a cursor
+            "total": result.count if first_page else None
+        }
+
     def _build_response(
         self,
         appointment: dict,
@@ -438,10 +608,11 @@ class AppointmentService:
             "created_at": appointment["created_at"],
         }
 
+        # Nested rows are validated with the appointment, in one pass
         if slot:
-            response_data["slot"] = AvailabilitySlotResponse(**slot)
+            response_data["slot"] = slot
 
         if doctor:
-            response_data["doctor"] = DoctorResponse(**doctor)
+            response_data["doctor"] = doctor
 
         return AppointmentResponse(**response_data)
\ No newline at end of file
@@ -1,22 +1,42 @@
 from typing import Optional, Dict, Any
 from uuid import UUID
+from datetime import datetime, timezone
+import jwt
 from fastapi import HTTPException, status
-from supabase import Client
+from supabase import AsyncClient
 from app.models import MagicLinkRequest, MagicLinkResponse, UserResponse
+from app.core.cache import TTLCache
 from app.core.config import settings
+from app.core.invalidation import invalidation_bus
+from app.core.security import decode_access_token
+
+
+# users rows (role) by user id, shared by all requests of the worker
+_user_cache = TTLCache(maxsize=settings.auth_user_cache_size, ttl=settings.auth_user_cache_ttl)
+
+
+def invalidate_user_cache(user_id: Optional[str] = None) -> None:
+    """Drop a cached user row (e.g. after a role change), or all of them."""
+    if user_id is None:
+        _user_cache.clear()
+    else:
+        _user_cache.invalidate(str(user_id))
+
+
+invalidation_bus.register("users", invalidate_user_cache)
 
 
 class AuthService:
 
-    def __init__(self, supabase_client: Client, admin_client: Client = None):
+    def __init__(self, supabase_client: AsyncClient, admin_client: AsyncClient = None):
         self.client = supabase_client
         # admin_client uses service_role key to bypass RLS for server-side operations
         self.admin_client = admin_client or supabase_client
 
-    def send_magic_link(self, request: MagicLinkRequest) -> MagicLinkResponse:
+    async def send_magic_link(self, request: MagicLinkRequest) -> MagicLinkResponse:
         try:
             # Request magic link from Supabase Auth
-            result = self.client.auth.sign_in_with_otp(
+            result = await self.client.auth.sign_in_with_otp(
                 email=request.email,
                 options={
                     "email_redirect_to": settings.frontend_url,
@@ -35,29 +55,29 @@ class AuthService:
                 detail=f"Errore nell'invio del magic link: {str(e)}"
             )
 
-    def get_current_user(self, token: str) -> UserResponse:
+    async def get_current_user(self, token: str) -> UserResponse:
         try:
-            # Get user from token
-            user_response = self.client.auth.get_user(token)
-
-            if not user_response or not user_response.user:
-                raise HTTPException(
-                    status_code=status.HTTP_401_UNAUTHORIZED,
-                    detail="Token non valido o scaduto"
-                )
+            # Fast path: verify signature and expiry locally
+            claims = await decode_access_token(token)
 
-            user = user_response.user
+            if claims is None:
+                return await self._get_current_user_remote(token)
 
-            # Get user role from custom table (creates user if not exists)
-            user_data = self._get_user_data(user.id, user.email)
+            user_data = await self._get_user_data(claims["sub"], claims.get("email"))
 
             return UserResponse(
-                id=user.id,
-                email=user.email,
+                id=claims["sub"],
+                email=claims.get("email") or user_data.get("email"),
                 role=user_data.get("role", "patient"),
-                created_at=user.created_at
+                created_at=user_data.get("created_at")
+                or datetime.fromtimestamp(claims.get("iat", 0), tz=timezone.utc)
             )
 
+        except jwt.PyJWTError:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Token non valido o scaduto"
+            )
         except HTTPException:
             raise
         except Exception as e:
@@ -66,12 +86,40 @@ class AuthService:
                 detail=f"Errore nell'autenticazione: {str(e)}"
             )
 
-    def _get_user_data(self, user_id: str, email: str = None) -> Dict[str, Any]:
+    async def _get_current_user_remote(self, token: str) -> UserResponse:
+        """Verify the token against Supabase Auth (used when it can't be verified locally)."""
+        user_response = await self.client.auth.get_user(token)
+
+        if not user_response or not user_response.user:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Token non valido o scaduto"
+            )
+
+        user = user_response.user
+
+        # Get user role from custom table (creates user if not exists)
+        user_data = await self._get_user_data(user.id, user.email)
+
+        return UserResponse(
+            id=user.id,
+            email=user.email,
+            role=user_data.get("role", "patient"),
+            created_at=user.created_at
+        )
+
+    async def _get_user_data(self, user_id: str, email: str = None) -> Dict[str, Any]:
+        user_id = str(user_id)
+        cached = _user_cache.get(user_id)
+        if cached is not None:
+            return cached
+
         try:
             # Try to get existing user
-            result = self.admin_client.table("users").select("*").eq("id", user_id).execute()
+            result = await self.admin_client.table("users").select("*").eq("id", user_id).execute()
 
             if result.data and len(result.data) > 0:
+                _user_cache.set(user_id, result.data[0])
                 return result.data[0]
 
             # User doesn't exist - create with default role 'patient'
@@ -82,9 +130,10 @@ class AuthService:
                 "role": "patient"
             }
 
-            insert_result = self.admin_client.table("users").insert(new_user).execute()
+            insert_result = await self.admin_client.table("users").insert(new_user).execute()
 
             if insert_result.data and len(insert_result.data) > 0:
+                _user_cache.set(user_id, insert_result.data[0])
                 return insert_result.data[0]
 
             # Fallback
@@ -94,18 +143,22 @@ class AuthService:
             # If table query fails, return default
             return {"role": "patient"}
 
-    def verify_token(self, token: str) -> bool:
+    async def verify_token(self, token: str) -> bool:
         try:
-            user_response = self.client.auth.get_user(token)
+            claims = await decode_access_token(token)
+            if claims is not None:
+                return True
+
+            user_response = await self.client.auth.get_user(token)
             return user_response and user_response.user is not None
         except:
             return False
 
-    def get_user_role(self, user_id: str) -> str:
-        user_data = self._get_user_data(user_id)
+    async def get_user_role(self, user_id: str) -> str:
+        user_data = await self._get_user_data(user_id)
         return user_data.get("role", "patient")
 
-    def create_patient_profile(self, user_id: UUID, first_name: str, last_name: str, phone: str) -> Dict[str, Any]:
+    async def create_patient_profile(self, user_id: UUID, first_name: str, last_name: str, phone: str) -> Dict[str, Any]:
         try:
             patient_data = {
                 "user_id": str(user_id),
@@ -114,7 +167,7 @@ class AuthService:
                 "phone": phone
             }
 
-            result = self.admin_client.table("patients").insert(patient_data).execute()
+            result = await self.admin_client.table("patients").insert(patient_data).execute()
 
             if result.data and len(result.data) > 0:
                 return result.data[0]
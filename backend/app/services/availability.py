@@ -1,18 +1,42 @@
-from typing import List, Optional
+from collections import Counter
+from typing import List, Optional, Set, Tuple
 from uuid import UUID
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from fastapi import HTTPException, status
-from supabase import Client
-from app.models import AvailabilitySlotCreate, AvailabilitySlotResponse
+from postgrest import APIError
+from postgrest.types import ReturnMethod
+from supabase import AsyncClient
+from app.core.config import settings
+from app.core.invalidation import invalidation_bus
+from app.core.singleflight import SingleFlight
+from app.services.appointments import booking_error
+from app.services.events import publish_slot, publish_slots_changed
+from app.models import (
+    AvailabilityScheduleCreate,
+    AvailabilitySlotCreate,
+    AvailabilitySlotResponse,
+    AvailableSlotResponse,
+    CalendarDay,
+    SlotBulkAction,
+    SlotConflict,
+    SlotHoldResponse
+)
+
+
+# Public availability reads are hot and identical during bursts (a new schedule
+# announced, a doctor page shared): concurrent callers share one query and its
+# result is kept for READ_COALESCING_TTL. Every slot change clears it.
+availability_reads = SingleFlight("availability", settings.read_coalescing_ttl)
+invalidation_bus.register("availability", availability_reads.clear)
 
 
 class AvailabilityService:
 
-    def __init__(self, admin_client: Client):
+    def __init__(self, admin_client: AsyncClient):
         # Uses service_role key to bypass RLS
         self.client = admin_client
 
-    def create_slots(self, data: AvailabilitySlotCreate) -> List[AvailabilitySlotResponse]:
+    async def create_slots(self, data: AvailabilitySlotCreate) -> List[AvailabilitySlotResponse]:
         """
         Generate 30-minute slots for a given time range.
         Admin provides date, start_time, end_time and system generates individual slots.
@@ -31,7 +55,7 @@ class AvailabilityService:
                 )
 
             # Get existing slots for this doctor on this date
-            existing = self.client.table("availability_slots") \
+            existing = await self.client.table("availability_slots") \
                 .select("start_time") \
                 .eq("doctor_id", str(data.doctor_id)) \
                 .gte("start_time", f"{date_str}T00:00:00") \
@@ -64,7 +88,7 @@ class AvailabilityService:
                 )
 
             # Insert only new slots
-            result = self.client.table("availability_slots").insert(slots_to_create).execute()
+            result = await self.client.table("availability_slots").insert(slots_to_create).execute()
 
             if not result.data:
                 raise HTTPException(
@@ -72,6 +96,7 @@ class AvailabilityService:
                     detail="Errore nella creazione degli slot"
                 )
 
+            await publish_slots_changed(data.doctor_id)
             return [AvailabilitySlotResponse(**slot) for slot in result.data]
 
         except HTTPException:
@@ -82,13 +107,106 @@ class AvailabilityService:
                 detail=f"Errore nella creazione degli slot: {str(e)}"
             )
 
-    def get_by_doctor(
+    async def create_schedule(self, data: AvailabilityScheduleCreate) -> Tuple[int, int]:
+        """
+        Generate 30-minute slots from a weekly schedule over a date range.
+        Existing slots are read with one range query for the whole span and
+        skipped; new slots are inserted in chunks.
+
+        Returns:
+            (created, skipped) slot counts
+        """
+        try:
+            first_day = datetime.strptime(data.start_date, "%Y-%m-%d").date()
+            last_day = datetime.strptime(data.end_date, "%Y-%m-%d").date()
+            excluded = set(data.exclude_dates)
+            weekdays = set(data.weekdays)
+
+            # Expand the schedule into slot start times (windows may overlap)
+            starts = set()
+            day = first_day
+            while day <= last_day:
+                if day.weekday() in weekdays and day.isoformat() not in excluded:
+                    for window in data.windows:
+                        current = datetime.strptime(f"{day} {window.start_time}", "%Y-%m-%d %H:%M")
+                        end_dt = datetime.strptime(f"{day} {window.end_time}", "%Y-%m-%d %H:%M")
+                        while current + timedelta(minutes=30) <= end_dt:
+                            starts.add(current)
+                            current += timedelta(minutes=30)
+                day += timedelta(days=1)
+
+            if not starts:
+                return 0, 0
+
+            existing_times = await self._existing_start_times(data.doctor_id, min(starts), max(starts))
+
+            slots_to_create = [
+                {
+                    "doctor_id": str(data.doctor_id),
+                    "start_time": start.isoformat(),
+                    "end_time": (start + timedelta(minutes=30)).isoformat(),
+                    "is_available": True
+                }
+                for start in sorted(starts)
+                if start.isoformat() not in existing_times
+            ]
+
+            batch_size = settings.slot_batch_size
+            for i in range(0, len(slots_to_create), batch_size):
+                await self.client.table("availability_slots") \
+                    .insert(slots_to_create[i:i + batch_size], returning=ReturnMethod.minimal) \
+                    .execute()
+
+            if slots_to_create:
+                await publish_slots_changed(data.doctor_id)
+            return len(slots_to_create), len(starts) - len(slots_to_create)
+
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Errore nella creazione degli slot: {str(e)}"
+            )
+
+    async def _existing_start_times(self, doctor_id: UUID, first: datetime, last: datetime) -> Set[str]:
+        """Start times of a doctor's slots in [first, last], read in keyset pages."""
+        existing_times = set()
+        after = None
+
+        while True:
+            # postgrest builders are mutable: build a fresh query per page
+            query = self.client.table("availability_slots") \
+                .select("start_time") \
+                .eq("doctor_id", str(doctor_id)) \
+                .lte("start_time", last.isoformat())
+            query = query.gt("start_time", after) if after else query.gte("start_time", first.isoformat())
+
+            result = await query.order("start_time").limit(settings.slot_batch_size).execute()
+            existing_times.update(slot["start_time"] for slot in result.data)
+
+            if len(result.data) < settings.slot_batch_size:
+                return existing_times
+            after = result.data[-1]["start_time"]
+
+    async def get_by_doctor(
         self,
         doctor_id: UUID,
         date: Optional[str] = None,
         available_only: bool = False
     ) -> List[AvailabilitySlotResponse]:
         """Get slots for a doctor, optionally filtered by date and availability."""
+        return await availability_reads.do(
+            ("slots", str(doctor_id), date, available_only),
+            lambda: self._get_by_doctor(doctor_id, date, available_only)
+        )
+
+    async def _get_by_doctor(
+        self,
+        doctor_id: UUID,
+        date: Optional[str] = None,
+        available_only: bool = False
+    ) -> List[AvailabilitySlotResponse]:
         try:
             query = self.client.table("availability_slots") \
                 .select("*") \
@@ -101,9 +219,11 @@ class AvailabilityService:
                 query = query.gte("start_time", date_start).lte("start_time", date_end)
 
             if available_only:
-                query = query.eq("is_available", True)
+                # Slots held by someone filling the booking form are not offered
+                query = query.eq("is_available", True) \
+                    .or_(f'held_until.is.null,held_until.lte."{datetime.now(timezone.utc).isoformat()}"')
 
-            result = query.order("start_time").execute()
+            result = await query.order("start_time").execute()
 
             return [AvailabilitySlotResponse(**slot) for slot in result.data]
 
@@ -113,10 +233,106 @@ class AvailabilityService:
                 detail=f"Errore nel recupero degli slot: {str(e)}"
             )
 
-    def get_by_id(self, slot_id: UUID) -> AvailabilitySlotResponse:
+    async def search_first_available(
+        self,
+        specialization: str,
+        date_from: Optional[str] = None,
+        date_to: Optional[str] = None,
+        time_from: Optional[str] = None,
+        time_to: Optional[str] = None,
+        limit: int = 10
+    ) -> List[AvailableSlotResponse]:
+        """
+        Earliest free slots across all doctors of a specialization, optionally
+        within a date range (inclusive) and a daily time window.
+        """
+        return await availability_reads.do(
+            ("first_available", specialization, date_from, date_to, time_from, time_to, limit),
+            lambda: self._search_first_available(specialization, date_from, date_to, time_from, time_to, limit)
+        )
+
+    async def _search_first_available(
+        self,
+        specialization: str,
+        date_from: Optional[str] = None,
+        date_to: Optional[str] = None,
+        time_from: Optional[str] = None,
+        time_to: Optional[str] = None,
+        limit: int = 10
+    ) -> List[AvailableSlotResponse]:
+        try:
+            params = {
+                "p_specialization": specialization,
+                "p_from": f"{date_from}T00:00:00" if date_from else None,
+                "p_to": None,
+                "p_time_from": time_from,
+                "p_time_to": time_to,
+                "p_limit": limit
+            }
+            if date_to:
+                day_after = datetime.strptime(date_to, "%Y-%m-%d") + timedelta(days=1)
+                params["p_to"] = day_after.isoformat()
+
+            result = await self.client.rpc("search_available_slots", params).execute()
+
+            return [
+                AvailableSlotResponse(**slot, doctor=slot["doctors"])
+                for slot in result.data or []
+            ]
+
+        except Exception as e:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Errore nella ricerca degli slot: {str(e)}"
+            )
+
+    async def hold(self, slot_id: UUID, user_id: UUID) -> SlotHoldResponse:
+        """
+        Hold a free slot for a user while they fill the booking form. Held slots
+        are hidden from other users and only the holder can book them until the
+        hold expires (SLOT_HOLD_SECONDS). A user holds one slot at a time.
+        """
+        try:
+            result = await self.client.rpc("hold_slot", {
+                "p_slot_id": str(slot_id),
+                "p_user_id": str(user_id),
+                "p_seconds": settings.slot_hold_seconds
+            }).execute()
+
+            slot = result.data
+            await publish_slot(slot_id, slot["doctor_id"], slot["start_time"], is_available=False)
+            return SlotHoldResponse(slot_id=slot_id, held_until=slot["held_until"])
+
+        except APIError as e:
+            raise booking_error(e, "Errore nella prenotazione temporanea dello slot")
+        except Exception as e:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Errore nella prenotazione temporanea dello slot: {str(e)}"
+            )
+
+    async def release_hold(self, slot_id: UUID, user_id: UUID) -> None:
+        """Release a user's hold on a slot (booking form closed without booking)."""
+        try:
+            result = await self.client.table("availability_slots") \
+                .update({"held_by": None, "held_until": None}) \
+                .eq("id", str(slot_id)) \
+                .eq("held_by", str(user_id)) \
+                .execute()
+
+            for slot in result.data:
+                await publish_slot(slot_id, slot["doctor_id"], slot["start_time"], slot["is_available"])
+
+        except Exception as e:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Errore nel rilascio dello slot: {str(e)}"
+            )
+
+    async def get_by_id(self, slot_id: UUID) -> AvailabilitySlotResponse:
         """Get a single slot by ID."""
         try:
-            result = self.client.table("availability_slots") \
+            result = await self.client.table("availability_slots") \
                 .select("*") \
                 .eq("id", str(slot_id)) \
                 .execute()
@@ -137,15 +353,15 @@ class AvailabilityService:
                 detail=f"Errore nel recupero dello slot: {str(e)}"
             )
 
-    def toggle_availability(self, slot_id: UUID, is_available: bool) -> AvailabilitySlotResponse:
+    async def toggle_availability(self, slot_id: UUID, is_available: bool) -> AvailabilitySlotResponse:
         """Enable or disable a slot."""
         try:
             # Check if slot exists
-            self.get_by_id(slot_id)
+            await self.get_by_id(slot_id)
 
             # If trying to re-enable, check if slot has an active appointment
             if is_available:
-                appointments = self.client.table("appointments") \
+                appointments = await self.client.table("appointments") \
                     .select("id") \
                     .eq("slot_id", str(slot_id)) \
                     .eq("status", "confirmed") \
@@ -157,7 +373,7 @@ class AvailabilityService:
                         detail="Impossibile abilitare: questo slot ha un appuntamento attivo. Cancella prima l'appuntamento associato."
                     )
 
-            result = self.client.table("availability_slots") \
+            result = await self.client.table("availability_slots") \
                 .update({"is_available": is_available}) \
                 .eq("id", str(slot_id)) \
                 .execute()
@@ -168,7 +384,9 @@ class AvailabilityService:
                     detail="Errore nell'aggiornamento dello slot"
                 )
 
-            return AvailabilitySlotResponse(**result.data[0])
+            slot = AvailabilitySlotResponse(**result.data[0])
+            await publish_slot(slot.id, slot.doctor_id, slot.start_time, slot.is_available)
+            return slot
 
         except HTTPException:
             raise
@@ -178,14 +396,14 @@ class AvailabilityService:
                 detail=f"Errore nell'aggiornamento dello slot: {str(e)}"
             )
 
-    def delete(self, slot_id: UUID) -> None:
+    async def delete(self, slot_id: UUID) -> None:
         """Delete a slot."""
         try:
             # Check if slot exists
-            self.get_by_id(slot_id)
+            slot = await self.get_by_id(slot_id)
 
             # Check if slot has an active appointment
-            appointments = self.client.table("appointments") \
+            appointments = await self.client.table("appointments") \
                 .select("id") \
                 .eq("slot_id", str(slot_id)) \
                 .eq("status", "confirmed") \
@@ -197,11 +415,13 @@ class AvailabilityService:
                     detail="Impossibile eliminare: questo slot ha un appuntamento attivo. Cancella prima l'appuntamento."
                 )
 
-            self.client.table("availability_slots") \
+            await self.client.table("availability_slots") \
                 .delete() \
                 .eq("id", str(slot_id)) \
                 .execute()
 
+            await publish_slot(slot.id, slot.doctor_id, slot.start_time, is_available=None)
+
         except HTTPException:
             raise
         except Exception as e:
@@ -210,30 +430,126 @@ class AvailabilityService:
                 detail=f"Errore nell'eliminazione dello slot: {str(e)}"
             )
 
-    def get_available_dates(self, doctor_id: UUID) -> List[str]:
+    async def bulk_update(
+        self,
+        data: SlotBulkAction
+    ) -> Tuple[List[AvailabilitySlotResponse], List[SlotConflict]]:
+        """
+        Enable, disable or delete a set of slots with one call to the bulk_update_slots
+        database function (one conflict query, one set-based write, one transaction).
+        Booked slots are not re-enabled or deleted; they come back as conflicts.
+        """
+        try:
+            result = await self.client.rpc("bulk_update_slots", {
+                "p_action": data.action,
+                "p_slot_ids": [str(slot_id) for slot_id in data.slot_ids] if data.slot_ids else None,
+                "p_doctor_id": str(data.doctor_id) if data.doctor_id else None,
+                "p_from": data.range_start.isoformat() if data.range_start else None,
+                "p_to": data.range_end.isoformat() if data.range_end else None
+            }).execute()
+
+            slots = [AvailabilitySlotResponse(**slot) for slot in result.data["slots"]]
+            conflicts = [SlotConflict(**conflict) for conflict in result.data["conflicts"]]
+
+            # One refetch hint per doctor instead of an event per slot
+            for doctor_id in {slot.doctor_id for slot in slots}:
+                await publish_slots_changed(doctor_id)
+
+            return slots, conflicts
+
+        except APIError as e:
+            raise booking_error(e, "Errore nell'aggiornamento degli slot")
+        except Exception as e:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Errore nell'aggiornamento degli slot: {str(e)}"
+            )
+
+    async def get_version(self, doctor_id: UUID) -> int:
+        """Availability version of a doctor, bumped by triggers on every slot change."""
+        return await availability_reads.do(
+            ("version", str(doctor_id)),
+            lambda: self._get_version(doctor_id)
+        )
+
+    async def _get_version(self, doctor_id: UUID) -> int:
+        try:
+            result = await self.client.table("availability_versions") \
+                .select("version") \
+                .eq("doctor_id", str(doctor_id)) \
+                .execute()
+
+            return result.data[0]["version"] if result.data else 0
+
+        except Exception as e:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Errore nel recupero degli slot: {str(e)}"
+            )
+
+    async def get_available_dates(self, doctor_id: UUID) -> List[str]:
         """Get list of dates that have available slots for a doctor."""
+        calendar = await self.get_calendar(doctor_id)
+        return [day.date for day in calendar]
+
+    async def get_calendar(self, doctor_id: UUID) -> List[CalendarDay]:
+        """
+        Free slots per day from today on, read from the availability_calendar
+        index (one row per day, kept by triggers) instead of the slots.
+        Today only counts slots that have not started yet.
+        """
+        return await availability_reads.do(
+            ("calendar", str(doctor_id)),
+            lambda: self._get_calendar(doctor_id)
+        )
+
+    async def _get_calendar(self, doctor_id: UUID) -> List[CalendarDay]:
         try:
-            # Get future slots that are available
-            now = datetime.now().isoformat()
+            now = datetime.now()
+            today = now.date().isoformat()
+
+            result = await self.client.table("availability_calendar") \
+                .select("day, free_slots") \
+                .eq("doctor_id", str(doctor_id)) \
+                .gte("day", today) \
+                .gt("free_slots", 0) \
+                .order("day") \
+                .execute()
 
-            result = self.client.table("availability_slots") \
+            # Free slots currently held are not offered (a handful at most)
+            holds = await self.client.table("availability_slots") \
                 .select("start_time") \
                 .eq("doctor_id", str(doctor_id)) \
                 .eq("is_available", True) \
-                .gte("start_time", now) \
-                .order("start_time") \
+                .gt("held_until", datetime.now(timezone.utc).isoformat()) \
                 .execute()
 
-            # Extract unique dates
-            dates = set()
-            for slot in result.data:
-                date = slot["start_time"][:10]  # Extract YYYY-MM-DD
-                dates.add(date)
+            held_per_day = Counter(slot["start_time"][:10] for slot in holds.data)
+            calendar = [
+                CalendarDay(date=row["day"], free_slots=row["free_slots"] - held_per_day[row["day"]])
+                for row in result.data
+                if row["free_slots"] > held_per_day[row["day"]]
+            ]
+
+            if calendar and calendar[0].date == today:
+                remaining = await self.client.table("availability_slots") \
+                    .select("id", count="exact", head=True) \
+                    .eq("doctor_id", str(doctor_id)) \
+                    .eq("is_available", True) \
+                    .gte("start_time", now.isoformat()) \
+                    .lte("start_time", f"{today}T23:59:59") \
+                    .or_(f'held_until.is.null,held_until.lte."{datetime.now(timezone.utc).isoformat()}"') \
+                    .execute()
+
+                if remaining.count:
+                    calendar[0] = CalendarDay(date=today, free_slots=remaining.count)
+                else:
+                    calendar.pop(0)
 
-            return sorted(list(dates))
+            return calendar
 
         except Exception as e:
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=f"Errore nel recupero delle date: {str(e)}"
-            )
\ No newline at end of file
+            )
@@ -1,24 +1,83 @@
-from typing import List, Optional
+import hashlib
+import json
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
 from uuid import UUID
 from fastapi import HTTPException, status
-from supabase import Client
+from supabase import AsyncClient
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.core.invalidation import invalidation_bus
+from app.core.singleflight import SingleFlight
 from app.models import DoctorCreate, DoctorUpdate, DoctorResponse
 
 
+@dataclass(frozen=True)
+class DoctorCatalog:
+    version: str  # content hash of the rows, used for ETags
+    doctors: List[DoctorResponse]  # ordered by last_name
+    by_id: Dict[str, DoctorResponse]
+    specializations: List[str]
+
+
+# The whole catalog is cached as one entry: doctors change a few times a month
+# and every public read (list, detail, specializations) can be served from it.
+_catalog_cache = TTLCache(maxsize=1, ttl=settings.doctor_cache_ttl)
+CATALOG_KEY = "catalog"
+
+# Cached instead of the catalog when it has more than DOCTOR_CACHE_MAX_SIZE rows,
+# so reads go straight to the database until the next invalidation or expiry
+# instead of repeating the over-sized catalog query every time
+CATALOG_TOO_LARGE = object()
+
+# Concurrent catalog loads on a miss, and direct reads when the catalog is too
+# large to cache, share one query (see SingleFlight)
+doctor_reads = SingleFlight("doctors", settings.read_coalescing_ttl)
+
+
+# Bumped by every invalidation: a load that started before one must not cache
+# the rows it read
+_catalog_generation = 0
+
+
+def invalidate_doctor_cache() -> None:
+    """Drop this worker's cached catalog (other workers: see invalidation_bus)."""
+    global _catalog_generation
+    _catalog_generation += 1
+    _catalog_cache.clear()
+    doctor_reads.clear()
+
+
+def doctor_cache_stats() -> Dict[str, Any]:
+    return _catalog_cache.stats()
+
+
+invalidation_bus.register("doctors", invalidate_doctor_cache)
+
+
 class DoctorService:
 
-    def __init__(self, admin_client: Client):
+    def __init__(self, admin_client: AsyncClient):
         # Uses service_role key to bypass RLS
         self.client = admin_client
 
-    def get_all(self, specialization: Optional[str] = None) -> List[DoctorResponse]:
+    async def get_all(self, specialization: Optional[str] = None) -> List[DoctorResponse]:
+        catalog = await self._get_catalog()
+        if catalog is not None:
+            if specialization:
+                return [d for d in catalog.doctors if d.specialization == specialization]
+            return list(catalog.doctors)
+
+        return await doctor_reads.do(("all", specialization), lambda: self._fetch_all(specialization))
+
+    async def _fetch_all(self, specialization: Optional[str]) -> List[DoctorResponse]:
         try:
             query = self.client.table("doctors").select("*")
 
             if specialization:
                 query = query.eq("specialization", specialization)
 
-            result = query.order("last_name").execute()
+            result = await query.order("last_name").execute()
 
             return [DoctorResponse(**doctor) for doctor in result.data]
 
@@ -28,9 +87,22 @@ class DoctorService:
                 detail=f"Errore nel recupero dei dottori: {str(e)}"
             )
 
-    def get_by_id(self, doctor_id: UUID) -> DoctorResponse:
+    async def get_by_id(self, doctor_id: UUID) -> DoctorResponse:
+        catalog = await self._get_catalog()
+        if catalog is not None:
+            doctor = catalog.by_id.get(str(doctor_id))
+            if doctor is None:
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail="Dottore non trovato"
+                )
+            return doctor
+
+        return await doctor_reads.do(("by_id", str(doctor_id)), lambda: self._fetch_by_id(doctor_id))
+
+    async def _fetch_by_id(self, doctor_id: UUID) -> DoctorResponse:
         try:
-            result = self.client.table("doctors").select("*").eq("id", str(doctor_id)).execute()
+            result = await self.client.table("doctors").select("*").eq("id", str(doctor_id)).execute()
 
             if not result.data or len(result.data) == 0:
                 raise HTTPException(
@@ -48,7 +120,7 @@ class DoctorService:
                 detail=f"Errore nel recupero del dottore: {str(e)}"
             )
 
-    def create(self, data: DoctorCreate) -> DoctorResponse:
+    async def create(self, data: DoctorCreate) -> DoctorResponse:
         try:
             doctor_data = {
                 "first_name": data.first_name,
@@ -57,7 +129,7 @@ class DoctorService:
                 "profile_photo_url": data.profile_photo_url
             }
 
-            result = self.client.table("doctors").insert(doctor_data).execute()
+            result = await self.client.table("doctors").insert(doctor_data).execute()
 
             if not result.data or len(result.data) == 0:
                 raise HTTPException(
@@ -65,6 +137,8 @@ class DoctorService:
                     detail="Errore nella creazione del dottore"
                 )
 
+            await invalidation_bus.publish("doctors")
+
             return DoctorResponse(**result.data[0])
 
         except HTTPException:
@@ -75,10 +149,10 @@ class DoctorService:
                 detail=f"Errore nella creazione del dottore: {str(e)}"
             )
 
-    def update(self, doctor_id: UUID, data: DoctorUpdate) -> DoctorResponse:
+    async def update(self, doctor_id: UUID, data: DoctorUpdate) -> DoctorResponse:
         try:
-            # Check if doctor exists
-            self.get_by_id(doctor_id)
+            # Check if doctor exists (in the database, not the cache)
+            await self._fetch_by_id(doctor_id)
 
             # Build update dict with only provided fields
             update_data = {}
@@ -98,7 +172,7 @@ class DoctorService:
                     detail="Nessun dato da aggiornare"
                 )
 
-            result = self.client.table("doctors").update(update_data).eq("id", str(doctor_id)).execute()
+            result = await self.client.table("doctors").update(update_data).eq("id", str(doctor_id)).execute()
 
             if not result.data or len(result.data) == 0:
                 raise HTTPException(
@@ -106,6 +180,8 @@ class DoctorService:
                     detail="Errore nell'aggiornamento del dottore"
                 )
 
+            await invalidation_bus.publish("doctors")
+
             return DoctorResponse(**result.data[0])
 
         except HTTPException:
@@ -116,12 +192,13 @@ class DoctorService:
                 detail=f"Errore nell'aggiornamento del dottore: {str(e)}"
             )
 
-    def delete(self, doctor_id: UUID) -> None:
+    async def delete(self, doctor_id: UUID) -> None:
         try:
-            # Check if doctor exists
-            self.get_by_id(doctor_id)
+            # Check if doctor exists (in the database, not the cache)
+            await self._fetch_by_id(doctor_id)
 
-            self.client.table("doctors").delete().eq("id", str(doctor_id)).execute()
+            await self.client.table("doctors").delete().eq("id", str(doctor_id)).execute()
+            await invalidation_bus.publish("doctors")
 
         except HTTPException:
             raise
@@ -131,9 +208,16 @@ class DoctorService:
                 detail=f"Errore nell'eliminazione del dottore: {str(e)}"
             )
 
-    def get_specializations(self) -> List[str]:
+    async def get_specializations(self) -> List[str]:
+        catalog = await self._get_catalog()
+        if catalog is not None:
+            return list(catalog.specializations)
+
+        return await doctor_reads.do("specializations", self._fetch_specializations)
+
+    async def _fetch_specializations(self) -> List[str]:
         try:
-            result = self.client.table("doctors").select("specialization").execute()
+            result = await self.client.table("doctors").select("specialization").execute()
 
             specializations = list(set(d["specialization"] for d in result.data))
             return sorted(specializations)
@@ -142,4 +226,53 @@ class DoctorService:
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=f"Errore nel recupero delle specializzazioni: {str(e)}"
-            )
\ No newline at end of file
+            )
+
+    async def get_catalog_version(self) -> Optional[str]:
+        """Version of the cached catalog, None when the catalog is not cacheable."""
+        catalog = await self._get_catalog()
+        return catalog.version if catalog is not None else None
+
+    async def _get_catalog(self) -> Optional[DoctorCatalog]:
+        """
+        The cached doctor catalog, loaded with one query on a miss.
+        Returns None when the catalog is larger than DOCTOR_CACHE_MAX_SIZE
+        (callers then query the database directly).
+        """
+        catalog = _catalog_cache.get(CATALOG_KEY)
+        if catalog is CATALOG_TOO_LARGE:
+            return None
+        if catalog is not None:
+            return catalog
+
+        return await doctor_reads.do(CATALOG_KEY, self._load_catalog)
+
+    async def _load_catalog(self) -> Optional[DoctorCatalog]:
+        generation = _catalog_generation
+        try:
+            result = await self.client.table("doctors") \
+                .select("*") \
+                .order("last_name") \
+                .limit(settings.doctor_cache_max_size + 1) \
+                .execute()
+        except Exception as e:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Errore nel recupero dei dottori: {str(e)}"
+            )
+
+        if len(result.data) > settings.doctor_cache_max_size:
+            if generation == _catalog_generation:
+                _catalog_cache.set(CATALOG_KEY, CATALOG_TOO_LARGE)
+            return None
+
+        doctors = [DoctorResponse(**doctor) for doctor in result.data]
+        catalog = DoctorCatalog(
+            version=hashlib.sha256(json.dumps(result.data, sort_keys=True).encode()).hexdigest(),
+            doctors=doctors,
+            by_id={str(doctor.id): doctor for doctor in doctors},
+            specializations=sorted({doctor.specialization for doctor in doctors})
+        )
+        if generation == _catalog_generation:
+            _catalog_cache.set(CATALOG_KEY, catalog)
+        return catalog
@@ -1,129 +1,101 @@
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+import anyio
 import resend
 from app.core.config import settings
+from app.services.email_templates import EmailTemplates, email_templates
 
 resend.api_key = settings.resend_api_key
 
+# resend is a blocking client: sends run in worker threads, bounded by this limiter
+_send_limiter = anyio.CapacityLimiter(settings.email_max_concurrency)
+
+
+@dataclass
+class EmailMessage:
+    to_email: str
+    subject: str
+    html: str
+
 
 class EmailService:
+    """
+    Renders the clinic's emails. Messages are not sent from here: they are queued in
+    the outbox (EmailOutboxService), in the patient's locale, and the email worker
+    delivers them.
+    """
 
-    def __init__(self):
-        self.from_email = f"{settings.from_name} <{settings.from_email}>"
+    def __init__(self, templates: EmailTemplates = email_templates):
+        self.templates = templates
 
-    def send_confirmation(
-        self,
-        to_email: str,
-        patient_name: str,
-        doctor_name: str,
-        specialization: str,
-        date: str,
-        time: str
-    ) -> bool:
-
-        subject = "Prenotazione Clinica Orchidea"
-
-        html = f"""
-        <div style="font-family: Arial, sans-serif; max-width: 600px; margin: 0 auto;">
-            <h2 style="color: #0891b2;">Clinica Orchidea</h2>
-            <p>Gentile <strong>{patient_name}</strong>,</p>
-            <p>Le confermiamo il suo appuntamento:</p>
-            <div style="background: #f0f9ff; padding: 20px; border-radius: 8px; margin: 20px 0;">
-                <p style="margin: 5px 0;"><strong>Dottore:</strong> Dr. {doctor_name}</p>
-                <p style="margin: 5px 0;"><strong>Specializzazione:</strong> {specialization}</p>
-                <p style="margin: 5px 0;"><strong>Data:</strong> {date}</p>
-                <p style="margin: 5px 0;"><strong>Ora:</strong> {time}</p>
-            </div>
-            <p>Per modifiche o cancellazioni, acceda al portale o contatti la clinica.</p>
-            <hr style="border: none; border-top: 1px solid #e5e7eb; margin: 20px 0;">
-            <p style="color: #6b7280; font-size: 12px;">
-                Clinica Orchidea - Questo messaggio è stato inviato automaticamente.
-            </p>
-        </div>
-        """
-
-        return self._send(to_email, subject, html)
-
-    def send_cancellation_by_patient(
-        self,
-        to_email: str,
-        patient_name: str,
-        doctor_name: str,
-        date: str,
-        time: str
-    ) -> bool:
-
-        subject = "Cancellazione Appuntamento - Clinica Orchidea"
-
-        html = f"""
-        <div style="font-family: Arial, sans-serif; max-width: 600px; margin: 0 auto;">
-            <h2 style="color: #0891b2;">Clinica Orchidea</h2>
-            <p>Gentile <strong>{patient_name}</strong>,</p>
-            <p>Confermiamo la cancellazione del suo appuntamento:</p>
-            <div style="background: #fef2f2; padding: 20px; border-radius: 8px; margin: 20px 0;">
-                <p style="margin: 5px 0;"><strong>Dottore:</strong> Dr. {doctor_name}</p>
-                <p style="margin: 5px 0;"><strong>Data:</strong> {date}</p>
-                <p style="margin: 5px 0;"><strong>Ora:</strong> {time}</p>
-                <p style="margin: 5px 0; color: #dc2626;"><strong>Stato:</strong> Cancellato</p>
-            </div>
-            <p>Per prenotare un nuovo appuntamento, acceda al portale.</p>
-            <hr style="border: none; border-top: 1px solid #e5e7eb; margin: 20px 0;">
-            <p style="color: #6b7280; font-size: 12px;">
-                Clinica Orchidea - Questo messaggio è stato inviato automaticamente.
-            </p>
-        </div>
-        """
-
-        return self._send(to_email, subject, html)
-
-    def send_cancellation_by_clinic(
+    def render(self, event: str, payload: Dict[str, Any]) -> Tuple[str, str]:
+        """Render the (subject, html) of an outbox event from its payload."""
+        return self.templates.render(event, payload, payload.get("locale"))
+
+    def render_many(
         self,
-        to_email: str,
-        patient_name: str,
-        doctor_name: str,
-        date: str,
-        time: str
-    ) -> bool:
-
-        subject = "Cancellazione Appuntamento - Clinica Orchidea"
-
-        html = f"""
-        <div style="font-family: Arial, sans-serif; max-width: 600px; margin: 0 auto;">
-            <h2 style="color: #0891b2;">Clinica Orchidea</h2>
-            <p>Gentile <strong>{patient_name}</strong>,</p>
-            <p>La informiamo che il seguente appuntamento è stato cancellato dalla clinica:</p>
-            <div style="background: #fef2f2; padding: 20px; border-radius: 8px; margin: 20px 0;">
-                <p style="margin: 5px 0;"><strong>Dottore:</strong> Dr. {doctor_name}</p>
-                <p style="margin: 5px 0;"><strong>Data:</strong> {date}</p>
-                <p style="margin: 5px 0;"><strong>Ora:</strong> {time}</p>
-                <p style="margin: 5px 0; color: #dc2626;"><strong>Stato:</strong> Cancellato</p>
-            </div>
-            <p>Per ulteriori informazioni, La preghiamo di contattare la clinica.</p>
-            <hr style="border: none; border-top: 1px solid #e5e7eb; margin: 20px 0;">
-            <p style="color: #6b7280; font-size: 12px;">
-                Clinica Orchidea - Questo messaggio è stato inviato automaticamente.
-            </p>
-        </div>
-        """
-
-        return self._send(to_email, subject, html)
-
-    def _send(self, to_email: str, subject: str, html: str) -> bool:
+        event: str,
+        payloads: List[Dict[str, Any]],
+        locale: Optional[str] = None
+    ) -> List[Tuple[str, str]]:
+        """Render one event for many recipients, e.g. a batch of reminders."""
+        return self.templates.render_many(event, payloads, locale)
+
+
+class EmailTransport(ABC):
+    """Delivers rendered messages."""
 
+    @abstractmethod
+    async def send_batch(self, messages: List[EmailMessage]) -> List[Optional[str]]:
+        """Send messages; returns one entry per message: None if sent, else the error."""
+
+
+class ResendTransport(EmailTransport):
+
+    def __init__(self):
+        self.from_email = f"{settings.from_name} <{settings.from_email}>"
+
+    async def send_batch(self, messages: List[EmailMessage]) -> List[Optional[str]]:
         if not settings.resend_api_key:
-            print("api key not configured")
-            return False
+            return ["api key not configured"] * len(messages)
 
         try:
-            resend.Emails.send({
-                "from": self.from_email,
-                "to": [to_email],
-                "subject": subject,
-                "html": html
-            })
-            return True
+            # One API call for the whole batch (all-or-nothing on Resend's side)
+            await anyio.to_thread.run_sync(
+                resend.Batch.send,
+                [
+                    {
+                        "from": self.from_email,
+                        "to": [message.to_email],
+                        "subject": message.subject,
+                        "html": message.html
+                    }
+                    for message in messages
+                ],
+                limiter=_send_limiter
+            )
+            return [None] * len(messages)
         except Exception as e:
-            print(f"Error sending email: {e}")
-            return False
+            return [f"Error sending email: {e}"] * len(messages)
+
+
+class FakeTransport(EmailTransport):
+    """Records messages instead of sending them (tests and local development)."""
+
+    def __init__(self, error: Optional[str] = None):
+        self.sent: List[EmailMessage] = []
+        # When set, every send fails with this error
+        self.error = error
+
+    async def send_batch(self, messages: List[EmailMessage]) -> List[Optional[str]]:
+        if self.error:
+            return [self.error] * len(messages)
+        self.sent.extend(messages)
+        return [None] * len(messages)
 
 
-def get_email_service() -> EmailService:
-    return EmailService()
\ No newline at end of file
+def get_email_transport() -> EmailTransport:
+    if settings.email_transport == "fake":
+        return FakeTransport()
+    return ResendTransport()
@@ -0,0 +1,152 @@
+from dataclasses import dataclass
+from html import escape
+from pathlib import Path
+from string import Template
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from app.core.config import settings
+
+TEMPLATES_DIR = Path(__file__).resolve().parent.parent / "templates" / "email"
+
+# Every event template is rendered inside the layout of its locale, at $content
+LAYOUT = "layout"
+
+
+@dataclass(frozen=True)
+class CompiledTemplate:
+    """
+    An email template compiled to a str.format pattern.
+
+    `$name` placeholders are resolved once at load time, so rendering is a single
+    format_map call. Values are HTML-escaped in the body, not in the subject
+    (plain text).
+    """
+    subject: str
+    body: str
+    fields: Tuple[str, ...]
+
+    def render(self, values: Dict[str, Any]) -> Tuple[str, str]:
+        try:
+            escaped = {field: escape(str(values[field])) for field in self.fields}
+        except KeyError:
+            missing = [field for field in self.fields if field not in values]
+            raise ValueError(f"Missing email template values: {', '.join(missing)}")
+
+        subject = self.subject
+        if "{" in subject:
+            subject = subject.format_map({field: str(values[field]) for field in self.fields})
+        return subject, self.body.format_map(escaped)
+
+
+def compile_template(source: str) -> Tuple[str, Tuple[str, ...]]:
+    """Turn a string.Template source into a str.format pattern and its field names."""
+    fields = []
+
+    def replace(match) -> str:
+        if match.group("escaped") is not None:
+            return "$"
+        name = match.group("named") or match.group("braced")
+        if name is None:
+            raise ValueError(f"Invalid placeholder in email template: {match.group(0)}")
+        if name not in fields:
+            fields.append(name)
+        return "{" + name + "}"
+
+    pattern = Template.pattern.sub(
+        replace,
+        source.replace("{", "{{").replace("}", "}}")
+    )
+    return pattern, tuple(fields)
+
+
+def _split_subject(source: str, path: Path) -> Tuple[str, str]:
+    header, separator, body = source.partition("\n\n")
+    if not separator or not header.startswith("Subject:"):
+        raise ValueError(f"{path}: email templates must start with a 'Subject:' line")
+    return header[len("Subject:"):].strip(), body
+
+
+class EmailTemplates:
+    """
+    Email templates, loaded and compiled once per process.
+
+    Layout: TEMPLATES_DIR/<locale>/layout.html plus one <event>.html per event,
+    starting with a "Subject: ..." line. Locales without a template for an event
+    fall back to the default locale.
+    """
+
+    def __init__(self, templates: Dict[Tuple[str, str], CompiledTemplate], default_locale: str):
+        self._templates = templates
+        self.default_locale = default_locale
+
+    @classmethod
+    def load(cls, directory: Path = TEMPLATES_DIR, default_locale: str = settings.email_default_locale) -> "EmailTemplates":
+        templates = {}
+
+        for locale_dir in sorted(path for path in directory.iterdir() if path.is_dir()):
+            layout = (locale_dir / f"{LAYOUT}.html").read_text(encoding="utf-8")
+
+            for path in sorted(locale_dir.glob("*.html")):
+                if path.stem == LAYOUT:
+                    continue
+                subject, content = _split_subject(path.read_text(encoding="utf-8"), path)
+                # The layout is merged in here, so renders never touch it again
+                source = Template(layout).safe_substitute(content=content.strip())
+                body, body_fields = compile_template(source)
+                subject, subject_fields = compile_template(subject)
+                fields = tuple(dict.fromkeys(body_fields + subject_fields))
+                templates[(locale_dir.name, path.stem)] = CompiledTemplate(subject, body, fields)
+
+        if not any(locale == default_locale for locale, _ in templates):
+            raise ValueError(f"No email templates for default locale '{default_locale}'")
+
+        return cls(templates, default_locale)
+
+    def get(self, event: str, locale: Optional[str] = None) -> CompiledTemplate:
+        template = self._templates.get((locale or self.default_locale, event)) \
+            or self._templates.get((self.default_locale, event))
+        if template is None:
+            raise ValueError(f"Unknown email event: {event}")
+        return template
+
+    def render(self, event: str, values: Dict[str, Any], locale: Optional[str] = None) -> Tuple[str, str]:
+        return self.get(event, locale).render(values)
+
+    def render_many(
+        self,
+        event: str,
+        values: Iterable[Dict[str, Any]],
+        locale: Optional[str] = None
+    ) -> List[Tuple[str, str]]:
+        """Render the same event for many recipients (e.g. daily reminders)."""
+        render = self.get(event, locale).render
+        return [render(item) for item in values]
+
+    def locales(self) -> List[str]:
+        return sorted({locale for locale, _ in self._templates})
+
+    def negotiate(self, accept_language: Optional[str]) -> Optional[str]:
+        """
+        The locale to email a patient in, from their Accept-Language header: the
+        preferred language with templates, or None (the default locale).
+        """
+        if not accept_language:
+            return None
+
+        available = set(self.locales())
+        ranked = []
+        for position, item in enumerate(accept_language.split(",")):
+            tag, _, params = item.strip().partition(";")
+            quality = 1.0
+            if params.strip().startswith("q="):
+                try:
+                    quality = float(params.strip()[2:])
+                except ValueError:
+                    continue
+            language = tag.strip().split("-")[0].lower()
+            if language in available and quality > 0:
+                ranked.append((-quality, position, language))
+
+        return min(ranked)[2] if ranked else None
+
+
+email_templates = EmailTemplates.load()
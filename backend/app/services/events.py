@@ -0,0 +1,76 @@
+import asyncio
+import json
+from typing import Any, AsyncIterator, Dict, Optional
+from uuid import UUID
+from app.core.config import settings
+from app.core.events import event_hub
+from app.core.invalidation import invalidation_bus
+from app.models import AppointmentResponse
+
+# Clinic-wide topic for the admin dashboard
+ADMIN_TOPIC = "admin"
+
+
+def doctor_topic(doctor_id: UUID) -> str:
+    return f"doctor:{doctor_id}"
+
+
+async def publish_slot(
+    slot_id: UUID,
+    doctor_id: UUID,
+    start_time: Any,
+    is_available: Optional[bool]
+) -> None:
+    """A slot changed state; is_available None means it was deleted."""
+    # Every slot change is published here: drop coalesced availability reads first
+    await invalidation_bus.publish("availability")
+    data = {
+        "slot_id": str(slot_id),
+        "doctor_id": str(doctor_id),
+        "start_time": str(start_time),
+        "is_available": is_available
+    }
+    await event_hub.publish(doctor_topic(doctor_id), "slot", data)
+    await event_hub.publish(ADMIN_TOPIC, "slot", data)
+
+
+async def publish_slots_changed(doctor_id: UUID) -> None:
+    """Many slots of a doctor changed at once (bulk create): clients refetch."""
+    await invalidation_bus.publish("availability")
+    data = {"doctor_id": str(doctor_id)}
+    await event_hub.publish(doctor_topic(doctor_id), "slots_changed", data)
+    await event_hub.publish(ADMIN_TOPIC, "slots_changed", data)
+
+
+async def publish_appointment(action: str, appointment: AppointmentResponse) -> None:
+    """An appointment was created, rescheduled or cancelled; also updates its (new) slot's subscribers."""
+    start_time = appointment.slot.start_time if appointment.slot else None
+    await event_hub.publish(ADMIN_TOPIC, "appointment", {
+        "action": action,
+        "appointment_id": str(appointment.id),
+        "doctor_id": str(appointment.doctor_id),
+        "slot_id": str(appointment.slot_id),
+        "start_time": str(start_time) if start_time else None
+    })
+    await publish_slot(
+        appointment.slot_id,
+        appointment.doctor_id,
+        start_time,
+        is_available=action == "cancelled"
+    )
+
+
+async def sse_stream(topic: str) -> AsyncIterator[str]:
+    """Encode a topic's events as Server-Sent Events, with heartbeat comments."""
+    async with event_hub.subscribe(topic) as queue:
+        yield "retry: 5000\n\n"
+        while True:
+            try:
+                message: Dict[str, Any] = await asyncio.wait_for(
+                    queue.get(), timeout=settings.live_events_heartbeat
+                )
+            except asyncio.TimeoutError:
+                # Keeps proxies from closing an idle connection
+                yield ": ping\n\n"
+                continue
+            yield f"event: {message['event']}\ndata: {json.dumps(message['data'])}\n\n"
@@ -0,0 +1,43 @@
+import csv
+import io
+import json
+from typing import Any, AsyncIterator, Dict, List
+
+# Rows are written out in chunks of about this size
+CHUNK_SIZE = 16 * 1024
+
+
+async def csv_stream(rows: AsyncIterator[Dict[str, Any]], columns: List[str]) -> AsyncIterator[str]:
+    """Encode rows as CSV. The header is yielded right away, before any row is read."""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=columns, extrasaction="ignore")
+
+    writer.writeheader()
+    yield _drain(buffer)
+
+    async for row in rows:
+        writer.writerow(row)
+        if buffer.tell() >= CHUNK_SIZE:
+            yield _drain(buffer)
+
+    yield _drain(buffer)
+
+
+async def ndjson_stream(rows: AsyncIterator[Dict[str, Any]]) -> AsyncIterator[str]:
+    """Encode rows as newline-delimited JSON, one object per line."""
+    buffer = io.StringIO()
+
+    async for row in rows:
+        buffer.write(json.dumps(row, ensure_ascii=False))
+        buffer.write("\n")
+        if buffer.tell() >= CHUNK_SIZE:
+            yield _drain(buffer)
+
+    yield _drain(buffer)
+
+
+def _drain(buffer: io.StringIO) -> str:
+    data = buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate(0)
+    return data
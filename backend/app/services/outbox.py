@@ -0,0 +1,98 @@
+import logging
+from typing import Any, Dict, List, Optional
+from uuid import UUID
+from datetime import datetime, timedelta, timezone
+from fastapi import HTTPException, status
+from supabase import AsyncClient
+from app.core.config import settings
+from app.core.database import get_supabase_admin_client
+
+logger = logging.getLogger(__name__)
+
+
+class EmailOutboxService:
+    """
+    Persistent email queue (email_outbox table).
+
+    Messages are queued by the database functions that change appointments
+    (book_appointment, reschedule_appointment, cancel_appointment,
+    book_appointment_series), in the same transaction; other changes queue
+    theirs with `enqueue`. The email worker claims due messages in batches, sends
+    them and records the outcome, retrying failures with exponential backoff.
+    Messages are deduplicated on dedupe_key.
+    """
+
+    def __init__(self, admin_client: AsyncClient):
+        # Uses service_role key to bypass RLS
+        self.client = admin_client
+
+    async def enqueue(
+        self,
+        appointment_id: UUID,
+        event: str,
+        dedupe_key: str,
+        extra: Optional[Dict[str, Any]] = None
+    ) -> None:
+        """
+        Queue an email about an appointment (see enqueue_appointment_email); a message
+        with the same dedupe_key is only queued once.
+        """
+        try:
+            await self.client.rpc("enqueue_appointment_email", {
+                "p_appointment_id": str(appointment_id),
+                "p_event": event,
+                "p_dedupe_key": dedupe_key,
+                "p_extra": extra or {}
+            }).execute()
+        except Exception:
+            logger.exception("Error queueing email %s", dedupe_key)
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail="Errore nell'invio dell'email"
+            )
+
+    async def claim(self, limit: int, lease_seconds: int) -> List[Dict[str, Any]]:
+        """Claim up to `limit` due messages for sending (see claim_email_outbox)."""
+        result = await self.client.rpc("claim_email_outbox", {
+            "p_limit": limit,
+            "p_lease_seconds": lease_seconds,
+            "p_max_attempts": settings.email_outbox_max_attempts
+        }).execute()
+        return result.data or []
+
+    async def mark_sent(self, message_ids: List[str]) -> None:
+        await self.client.table("email_outbox") \
+            .update({
+                "status": "sent",
+                "sent_at": datetime.now(timezone.utc).isoformat(),
+                "last_error": None
+            }) \
+            .in_("id", message_ids) \
+            .execute()
+
+    async def mark_failed(self, message: Dict[str, Any], error: str) -> None:
+        """Schedule a retry with exponential backoff, or give up after the last attempt."""
+        attempts = message["attempts"]
+
+        if attempts >= settings.email_outbox_max_attempts:
+            update_data = {"status": "failed", "last_error": error}
+        else:
+            delay = min(
+                settings.email_outbox_backoff_base * 2 ** (attempts - 1),
+                settings.email_outbox_backoff_max
+            )
+            update_data = {
+                "status": "pending",
+                "last_error": error,
+                "next_attempt_at": (datetime.now(timezone.utc) + timedelta(seconds=delay)).isoformat()
+            }
+
+        await self.client.table("email_outbox") \
+            .update(update_data) \
+            .eq("id", message["id"]) \
+            .execute()
+
+
+async def get_email_outbox() -> EmailOutboxService:
+    admin_client = await get_supabase_admin_client()
+    return EmailOutboxService(admin_client)
@@ -0,0 +1,118 @@
+"""
+Email outbox worker.
+
+Drains the email_outbox table: claims due messages in batches, renders and sends
+them through the configured transport (rate limited), marks them sent, and
+reschedules failures with backoff.
+
+Run as a separate process:
+    python -m app.workers.email_outbox
+or inside the API process with EMAIL_OUTBOX_EMBEDDED_WORKER=true.
+"""
+import asyncio
+import signal
+import time
+from typing import Optional
+from app.core.config import settings
+from app.core.database import get_supabase_admin_client, supabase_clients
+from app.core.metrics import email_send_duration
+from app.services.email import EmailMessage, EmailService, EmailTransport, get_email_transport
+from app.services.outbox import EmailOutboxService
+
+
+class EmailOutboxWorker:
+
+    def __init__(
+        self,
+        outbox: EmailOutboxService,
+        transport: EmailTransport,
+        renderer: Optional[EmailService] = None
+    ):
+        self.outbox = outbox
+        self.transport = transport
+        self.renderer = renderer or EmailService()
+        self._next_send_at = 0.0
+
+    async def run_once(self) -> int:
+        """Process one batch; returns the number of messages claimed."""
+        messages = await self.outbox.claim(
+            settings.email_outbox_batch_size,
+            settings.email_outbox_lease_seconds
+        )
+        if not messages:
+            return 0
+
+        batch = []
+        for message in messages:
+            try:
+                subject, html = self.renderer.render(message["event"], message["payload"])
+            except Exception as e:
+                await self.outbox.mark_failed(message, f"Error rendering email: {e}")
+                continue
+            batch.append((message, EmailMessage(message["to_email"], subject, html)))
+
+        if not batch:
+            return len(messages)
+
+        await self._throttle()
+        start = time.perf_counter()
+        errors = await self.transport.send_batch([email for _, email in batch])
+        email_send_duration.observe(
+            time.perf_counter() - start,
+            transport=type(self.transport).__name__,
+            outcome="error" if any(errors) else "sent"
+        )
+
+        sent_ids = [message["id"] for (message, _), error in zip(batch, errors) if error is None]
+        if sent_ids:
+            await self.outbox.mark_sent(sent_ids)
+
+        for (message, _), error in zip(batch, errors):
+            if error is not None:
+                await self.outbox.mark_failed(message, error)
+
+        return len(messages)
+
+    async def run(self, stop: asyncio.Event) -> None:
+        """Process batches until `stop` is set, polling when the outbox is empty."""
+        while not stop.is_set():
+            try:
+                claimed = await self.run_once()
+            except Exception as e:
+                print(f"Email outbox worker error: {e}")
+                claimed = 0
+
+            if claimed < settings.email_outbox_batch_size:
+                try:
+                    await asyncio.wait_for(stop.wait(), timeout=settings.email_outbox_poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def _throttle(self) -> None:
+        # At most email_outbox_rate_limit transport calls per second
+        delay = self._next_send_at - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        self._next_send_at = time.monotonic() + 1 / settings.email_outbox_rate_limit
+
+
+async def create_worker() -> EmailOutboxWorker:
+    admin_client = await get_supabase_admin_client()
+    return EmailOutboxWorker(EmailOutboxService(admin_client), get_email_transport())
+
+
+async def main() -> None:
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    worker = await create_worker()
+    try:
+        await worker.run(stop)
+    finally:
+        await supabase_clients.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
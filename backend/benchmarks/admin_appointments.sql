@@ -0,0 +1,51 @@
+-- Benchmark: admin appointment list for one day vs. total table size.
+--
+-- Seeds :rows slots/appointments for one doctor (16 per day from 2021-01-01), then times the
+-- query AppointmentService.get_all sends for the first page of a single date (range
+-- on slot_start_time, keyset order). Everything is rolled back.
+-- Run it for increasing sizes; the execution time should stay flat because the
+-- plan is an index range scan on appointments(slot_start_time, id) plus primary key
+-- lookups for the embedded slot and doctor, independent of how much history the
+-- tables hold.
+--
+-- Usage:
+--   psql "$DATABASE_URL" -v rows=10000   -f benchmarks/admin_appointments.sql
+--   psql "$DATABASE_URL" -v rows=1000000 -f benchmarks/admin_appointments.sql
+
+BEGIN;
+
+INSERT INTO public.doctors (id, first_name, last_name, specialization)
+VALUES ('00000000-0000-0000-0000-00000000b001', 'Bench', 'Mark', 'Benchmark');
+
+INSERT INTO public.availability_slots (id, doctor_id, start_time, end_time, is_available)
+SELECT
+    uuid_generate_v4(),
+    '00000000-0000-0000-0000-00000000b001',
+    TIMESTAMP '2021-01-01 08:00' + (i / 16) * INTERVAL '1 day' + (i % 16) * INTERVAL '30 minutes',
+    TIMESTAMP '2021-01-01 08:30' + (i / 16) * INTERVAL '1 day' + (i % 16) * INTERVAL '30 minutes',
+    TRUE
+FROM generate_series(0, :rows - 1) AS i;
+
+INSERT INTO public.appointments (
+    doctor_id, slot_id, patient_first_name, patient_last_name, patient_phone, patient_email
+)
+SELECT doctor_id, id, 'Mario', 'Rossi', '3331234567', 'mario.rossi@example.com'
+FROM public.availability_slots
+WHERE doctor_id = '00000000-0000-0000-0000-00000000b001';
+
+ANALYZE public.availability_slots;
+ANALYZE public.appointments;
+
+\timing on
+
+EXPLAIN (ANALYZE, BUFFERS)
+SELECT a.*, to_jsonb(s) AS availability_slots, to_jsonb(d) AS doctors
+FROM public.appointments a
+LEFT JOIN public.availability_slots s ON s.id = a.slot_id
+LEFT JOIN public.doctors d ON d.id = a.doctor_id
+WHERE a.slot_start_time >= '2022-06-01T00:00:00'
+  AND a.slot_start_time <= '2022-06-01T23:59:59'
+ORDER BY a.slot_start_time, a.id
+LIMIT 51;
+
+ROLLBACK;
@@ -0,0 +1,88 @@
+"""
+Read coalescing benchmark for the public availability endpoints.
+
+Runs the API in-process against a fake PostgREST that answers every call after a
+fixed delay and counts them, then fires bursts of N concurrent requests for the
+same doctor page (slots of a date + available dates), as when a new schedule is
+announced. With coalescing on, upstream calls per burst stay constant whatever N
+is; with --no-coalescing they grow with N.
+
+Usage (from backend/):
+    python -m benchmarks.coalescing [--delay 0.05] [--levels 10,100,500] [--no-coalescing]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+import httpx
+
+os.environ.setdefault("SUPABASE_URL", "https://bench.supabase.co")
+os.environ.setdefault("SUPABASE_KEY", "bench")
+os.environ.setdefault("SUPABASE_SERVICE_KEY", "bench")
+if "--no-coalescing" in sys.argv:
+    os.environ["READ_COALESCING_ENABLED"] = "false"
+
+from app.core import database  # noqa: E402
+from app.main import app  # noqa: E402
+from app.services.availability import availability_reads  # noqa: E402
+
+DOCTOR_ID = "00000000-0000-0000-0000-000000000001"
+DATE = "2030-01-07"
+
+
+def counting_upstream(delay: float, calls: list) -> httpx.MockTransport:
+    async def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request.url.path)
+        await asyncio.sleep(delay)
+        return httpx.Response(200, json=[])
+
+    return httpx.MockTransport(handler)
+
+
+async def burst(client: httpx.AsyncClient, concurrency: int) -> list:
+    async def one(path: str) -> float:
+        start = time.perf_counter()
+        response = await client.get(path)
+        response.raise_for_status()
+        return time.perf_counter() - start
+
+    paths = [
+        f"/api/doctors/{DOCTOR_ID}/slots?date={DATE}&available_only=true",
+        f"/api/doctors/{DOCTOR_ID}/available-dates",
+    ]
+    return await asyncio.gather(*(one(paths[i % 2]) for i in range(concurrency)))
+
+
+async def main(delay: float, levels: list) -> None:
+    calls: list = []
+    database.supabase_clients = database.SupabaseClientRegistry(transport=counting_upstream(delay, calls))
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        print(f"upstream delay: {delay * 1000:.0f} ms")
+        print(f"{'concurrency':>12} {'upstream':>9} {'p50 ms':>8} {'p99 ms':>8}")
+        for level in levels:
+            availability_reads.clear()
+            calls.clear()
+            timings = await burst(client, level)
+            print(
+                f"{level:>12} "
+                f"{len(calls):>9} "
+                f"{statistics.median(timings) * 1000:>8.1f} "
+                f"{sorted(timings)[int(0.99 * (len(timings) - 1))] * 1000:>8.1f}"
+            )
+        print(f"stats: {availability_reads.stats()}")
+
+    await database.supabase_clients.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--delay", type=float, default=0.05, help="upstream delay in seconds")
+    parser.add_argument("--levels", default="10,100,500", help="comma-separated burst sizes")
+    parser.add_argument("--no-coalescing", action="store_true", help="disable read coalescing")
+    args = parser.parse_args()
+    asyncio.run(main(args.delay, [int(level) for level in args.levels.split(",")]))
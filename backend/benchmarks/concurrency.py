@@ -0,0 +1,80 @@
+"""
+Concurrency benchmark for the async request path.
+
+Runs the API in-process against a fake PostgREST that answers every call after a
+fixed delay, then fires N concurrent GET /api/doctors requests for increasing N.
+On a non-blocking path p99 stays close to the upstream delay whatever N is; with
+blocking I/O on the event loop it grows linearly with N.
+
+Usage (from backend/):
+    python -m benchmarks.concurrency [--delay 0.1] [--levels 1,10,25,50]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import time
+
+import httpx
+
+os.environ.setdefault("SUPABASE_URL", "https://bench.supabase.co")
+os.environ.setdefault("SUPABASE_KEY", "bench")
+os.environ.setdefault("SUPABASE_SERVICE_KEY", "bench")
+# Measure the upstream path, not the doctor catalog cache or read coalescing
+os.environ.setdefault("DOCTOR_CACHE_TTL", "0")
+os.environ.setdefault("READ_COALESCING_ENABLED", "false")
+
+from app.core import database  # noqa: E402
+from app.main import app  # noqa: E402
+
+
+def slow_upstream(delay: float) -> httpx.MockTransport:
+    async def handler(request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(delay)
+        return httpx.Response(200, json=[])
+
+    return httpx.MockTransport(handler)
+
+
+def percentile(values, pct: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def run_level(client: httpx.AsyncClient, concurrency: int) -> list:
+    async def one() -> float:
+        start = time.perf_counter()
+        response = await client.get("/api/doctors")
+        response.raise_for_status()
+        return time.perf_counter() - start
+
+    return await asyncio.gather(*(one() for _ in range(concurrency)))
+
+
+async def main(delay: float, levels: list) -> None:
+    database.supabase_clients = database.SupabaseClientRegistry(transport=slow_upstream(delay))
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        await run_level(client, 1)  # warm up clients
+
+        print(f"upstream delay: {delay * 1000:.0f} ms")
+        print(f"{'concurrency':>12} {'p50 ms':>8} {'p99 ms':>8}")
+        for level in levels:
+            timings = await run_level(client, level)
+            print(
+                f"{level:>12} "
+                f"{statistics.median(timings) * 1000:>8.1f} "
+                f"{percentile(timings, 99) * 1000:>8.1f}"
+            )
+
+    await database.supabase_clients.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--delay", type=float, default=0.1, help="upstream delay in seconds")
+    parser.add_argument("--levels", default="1,10,25,50", help="comma-separated concurrency levels")
+    args = parser.parse_args()
+    asyncio.run(main(args.delay, [int(level) for level in args.levels.split(",")]))
@@ -0,0 +1,78 @@
+"""
+Email render microbenchmark: precompiled templates vs. the previous inline f-strings.
+
+The f-string baseline is the old EmailService.send_confirmation body (no escaping).
+The template path escapes every value, so it does strictly more work per render;
+the bulk API additionally resolves the template once for the whole batch.
+
+Usage (from backend/):
+    python -m benchmarks.email_render [--count 10000] [--repeat 5]
+"""
+import argparse
+import os
+import timeit
+
+os.environ.setdefault("SUPABASE_URL", "https://bench.supabase.co")
+os.environ.setdefault("SUPABASE_KEY", "bench")
+os.environ.setdefault("SUPABASE_SERVICE_KEY", "bench")
+
+from app.services.email import EmailService  # noqa: E402
+
+
+def fstring_confirmation(patient_name, doctor_name, specialization, date, time):
+    subject = "Prenotazione Clinica Orchidea"
+
+    html = f"""
+        <div style="font-family: Arial, sans-serif; max-width: 600px; margin: 0 auto;">
+            <h2 style="color: #0891b2;">Clinica Orchidea</h2>
+            <p>Gentile <strong>{patient_name}</strong>,</p>
+            <p>Le confermiamo il suo appuntamento:</p>
+            <div style="background: #f0f9ff; padding: 20px; border-radius: 8px; margin: 20px 0;">
+                <p style="margin: 5px 0;"><strong>Dottore:</strong> Dr. {doctor_name}</p>
+                <p style="margin: 5px 0;"><strong>Specializzazione:</strong> {specialization}</p>
+                <p style="margin: 5px 0;"><strong>Data:</strong> {date}</p>
+                <p style="margin: 5px 0;"><strong>Ora:</strong> {time}</p>
+            </div>
+            <p>Per modifiche o cancellazioni, acceda al portale o contatti la clinica.</p>
+            <hr style="border: none; border-top: 1px solid #e5e7eb; margin: 20px 0;">
+            <p style="color: #6b7280; font-size: 12px;">
+                Clinica Orchidea - Questo messaggio è stato inviato automaticamente.
+            </p>
+        </div>
+        """
+
+    return subject, html
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--count", type=int, default=10000, help="renders per run")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    service = EmailService()
+    payloads = [
+        {
+            "patient_name": f"Mario Rossi {i}",
+            "doctor_name": "Giulia Bianchi",
+            "specialization": "Cardiologia",
+            "date": "lunedì 12 gennaio 2026",
+            "time": "10:30"
+        }
+        for i in range(args.count)
+    ]
+
+    cases = {
+        "f-string (old)": lambda: [fstring_confirmation(**p) for p in payloads],
+        "template render": lambda: [service.render("confirmation", p) for p in payloads],
+        "template render_many": lambda: service.render_many("confirmation", payloads),
+    }
+
+    print(f"{'case':>22} {'renders/s':>12} {'us/render':>10}")
+    for name, case in cases.items():
+        best = min(timeit.repeat(case, number=1, repeat=args.repeat))
+        print(f"{name:>22} {args.count / best:>12,.0f} {best / args.count * 1e6:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
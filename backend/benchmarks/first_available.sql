@@ -0,0 +1,66 @@
+-- Benchmark: first-available search by specialization.
+--
+-- Seeds 50 doctors (5 specializations x 10) with 6 months of slots (16 per day,
+-- about 146k slots), books ~90% of them at random, then times the query behind
+-- GET /api/slots/first-available (search_available_slots) for the earliest 10
+-- free slots, with and without a time-of-day window. Everything is rolled back.
+-- The plan should be one idx_slots_doctor_free_time range scan per doctor of the
+-- specialization, stopping after p_limit rows each: run it with :months=1 and
+-- :months=6 and the execution time should stay about the same.
+--
+-- Usage:
+--   psql "$DATABASE_URL" -v months=6 -f benchmarks/first_available.sql
+
+BEGIN;
+
+INSERT INTO public.doctors (id, first_name, last_name, specialization)
+SELECT
+    ('00000000-0000-0000-0000-' || lpad(to_hex(51200 + i), 12, '0'))::uuid,
+    'Bench',
+    'Doctor ' || i,
+    'Benchmark ' || (i % 5)
+FROM generate_series(0, 49) AS i;
+
+INSERT INTO public.availability_slots (doctor_id, start_time, end_time, is_available)
+SELECT
+    d.id,
+    LOCALTIMESTAMP::date + day * INTERVAL '1 day' + TIME '08:00' + slot * INTERVAL '30 minutes',
+    LOCALTIMESTAMP::date + day * INTERVAL '1 day' + TIME '08:30' + slot * INTERVAL '30 minutes',
+    random() < 0.1
+FROM public.doctors d
+CROSS JOIN generate_series(1, :months * 30) AS day
+CROSS JOIN generate_series(0, 15) AS slot
+WHERE d.specialization LIKE 'Benchmark %';
+
+ANALYZE public.doctors;
+ANALYZE public.availability_slots;
+
+\timing on
+
+-- Earliest 10 free slots for one specialization
+EXPLAIN (ANALYZE, BUFFERS)
+SELECT * FROM public.search_available_slots('Benchmark 3');
+
+SELECT * FROM public.search_available_slots('Benchmark 3');
+
+-- Same query inlined, to show the per-doctor index scans
+EXPLAIN (ANALYZE, BUFFERS)
+SELECT to_jsonb(s) || jsonb_build_object('doctors', to_jsonb(d))
+FROM public.doctors d
+CROSS JOIN LATERAL (
+    SELECT *
+    FROM public.availability_slots slot
+    WHERE slot.doctor_id = d.id
+      AND slot.is_available
+      AND slot.start_time >= LOCALTIMESTAMP
+    ORDER BY slot.start_time
+    LIMIT 10
+) s
+WHERE d.specialization = 'Benchmark 3'
+ORDER BY s.start_time, d.last_name
+LIMIT 10;
+
+-- Afternoons only
+SELECT * FROM public.search_available_slots('Benchmark 3', p_time_from => '14:00');
+
+ROLLBACK;
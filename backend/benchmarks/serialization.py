@@ -0,0 +1,115 @@
+"""
+Serialization benchmark for appointment list pages.
+
+Builds a page of N appointment rows as PostgREST returns them (appointment with
+slot and doctor embedded) and times, per row:
+  models     - the model path: AppointmentService._build_response per row,
+               AppointmentListResponse, then pydantic JSON serialization
+               (what FastAPI does with a response_model)
+  fast path  - APPOINTMENT_PROJECTION per row, then FastJSONResponse.render
+               (orjson), as GET /api/appointments/admin/all and /me do now
+
+Usage (from backend/):
+    python -m benchmarks.serialization [--rows 200] [--rounds 200]
+"""
+import argparse
+import os
+import time
+
+os.environ.setdefault("SUPABASE_URL", "https://bench.supabase.co")
+os.environ.setdefault("SUPABASE_KEY", "bench")
+os.environ.setdefault("SUPABASE_SERVICE_KEY", "bench")
+
+from app.core.serialization import FastJSONResponse, orjson  # noqa: E402
+from app.models import AppointmentListResponse  # noqa: E402
+from app.services.appointments import APPOINTMENT_PROJECTION, AppointmentService  # noqa: E402
+
+DOCTOR_ID = "00000000-0000-0000-0000-000000000001"
+
+
+def make_row(i: int) -> dict:
+    slot_id = f"00000000-0000-0000-0001-{i:012d}"
+    return {
+        "id": f"00000000-0000-0000-0002-{i:012d}",
+        "doctor_id": DOCTOR_ID,
+        "user_id": f"00000000-0000-0000-0003-{i:012d}",
+        "slot_id": slot_id,
+        "patient_first_name": "Maria",
+        "patient_last_name": "Rossi",
+        "patient_phone": "+393331234567",
+        "patient_email": "maria.rossi@example.com",
+        "status": "confirmed",
+        "slot_start_time": "2030-01-07T09:30:00",
+        "created_at": "2029-12-20T10:15:42.123456+00:00",
+        "updated_at": "2029-12-20T10:15:42.123456+00:00",
+        "availability_slots": {
+            "id": slot_id,
+            "doctor_id": DOCTOR_ID,
+            "start_time": "2030-01-07T09:30:00",
+            "end_time": "2030-01-07T10:00:00",
+            "is_available": False,
+            "held_by": None,
+            "held_until": None,
+            "created_at": "2029-12-01T08:00:00+00:00",
+        },
+        "doctors": {
+            "id": DOCTOR_ID,
+            "first_name": "Luca",
+            "last_name": "Bianchi",
+            "specialization": "Cardiologia",
+            "profile_photo_url": None,
+            "created_at": "2029-01-01T08:00:00+00:00",
+            "updated_at": "2029-01-01T08:00:00+00:00",
+        },
+    }
+
+
+def models_path(service: AppointmentService, rows: list) -> bytes:
+    page = AppointmentListResponse(
+        appointments=[
+            service._build_response(row, row.get("availability_slots"), row.get("doctors"))
+            for row in rows
+        ],
+        next_cursor=None,
+        page_size=len(rows),
+        total=None
+    )
+    return AppointmentListResponse.__pydantic_serializer__.to_json(page)
+
+
+def fast_path(rows: list) -> bytes:
+    page = {
+        "appointments": [APPOINTMENT_PROJECTION(row) for row in rows],
+        "next_cursor": None,
+        "page_size": len(rows),
+        "total": None
+    }
+    return FastJSONResponse(page).body
+
+
+def per_row_us(fn, rows: int, rounds: int) -> float:
+    fn()
+    start = time.process_time()
+    for _ in range(rounds):
+        fn()
+    return (time.process_time() - start) / rounds / rows * 1e6
+
+
+def main(rows: int, rounds: int) -> None:
+    data = [make_row(i) for i in range(rows)]
+    service = AppointmentService(None)
+
+    models = per_row_us(lambda: models_path(service, data), rows, rounds)
+    fast = per_row_us(lambda: fast_path(data), rows, rounds)
+
+    print(f"{rows} rows per page, {rounds} rounds, orjson: {'yes' if orjson else 'no'}")
+    print(f"{'models':>10} {models:8.2f} us/row")
+    print(f"{'fast path':>10} {fast:8.2f} us/row  ({models / fast:.1f}x)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=200, help="appointments per page")
+    parser.add_argument("--rounds", type=int, default=200, help="pages built per path")
+    args = parser.parse_args()
+    main(args.rows, args.rounds)
@@ -0,0 +1,116 @@
+import os
+
+# Offline settings, before the app reads them: no network, HS256 tokens verified locally
+os.environ.update(
+    SUPABASE_URL="https://test.supabase.co",
+    SUPABASE_KEY="test-anon-key",
+    SUPABASE_SERVICE_KEY="test-service-key",
+    SUPABASE_JWT_SECRET="test-jwt-secret-with-at-least-32-bytes",
+    AUTH_LOCAL_VERIFICATION="true",
+    CACHE_INVALIDATION_BROADCAST="false",
+    LIVE_EVENTS_BROADCAST="false",
+    IDEMPOTENCY_BACKEND="memory",
+    EMAIL_OUTBOX_EMBEDDED_WORKER="false",
+)
+
+import time  # noqa: E402
+from datetime import datetime, timedelta  # noqa: E402
+from typing import Any, Dict  # noqa: E402
+
+import httpx  # noqa: E402
+import jwt  # noqa: E402
+import pytest  # noqa: E402
+
+from app.core import database  # noqa: E402
+from app.core.config import settings  # noqa: E402
+from app.main import app  # noqa: E402
+from app.services.auth import invalidate_user_cache  # noqa: E402
+from app.services.availability import availability_reads  # noqa: E402
+from app.services.doctors import invalidate_doctor_cache  # noqa: E402
+from tests.fake_supabase import FakeClientRegistry, FakeSupabase  # noqa: E402
+
+# A Monday well in the future, so booking rules on past slots never apply
+DAY = "2030-01-07"
+
+
+@pytest.fixture
+def db(monkeypatch) -> FakeSupabase:
+    fake = FakeSupabase()
+    monkeypatch.setattr(database, "supabase_clients", FakeClientRegistry(fake))
+    # Process-wide caches would hide round trips from one test to the next
+    invalidate_user_cache()
+    invalidate_doctor_cache()
+    availability_reads.clear()
+    return fake
+
+
+@pytest.fixture
+async def client(db):
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as c:
+        yield c
+
+
+def auth_headers(user: Dict[str, Any]) -> Dict[str, str]:
+    now = int(time.time())
+    token = jwt.encode(
+        {
+            "sub": user["id"],
+            "email": user["email"],
+            "aud": settings.supabase_jwt_audience,
+            "role": "authenticated",
+            "iat": now,
+            "exp": now + 3600,
+        },
+        settings.supabase_jwt_secret,
+        algorithm="HS256"
+    )
+    return {"Authorization": f"Bearer {token}"}
+
+
+@pytest.fixture
+def patient(db) -> Dict[str, Any]:
+    return db.seed("users", id="11111111-1111-1111-1111-111111111111", email="paziente@example.com")
+
+
+@pytest.fixture
+def admin(db) -> Dict[str, Any]:
+    return db.seed("users", id="22222222-2222-2222-2222-222222222222", email="admin@example.com", role="admin")
+
+
+@pytest.fixture
+def doctor(db) -> Dict[str, Any]:
+    return db.seed("doctors", first_name="Anna", last_name="Bianchi", specialization="Fisioterapia")
+
+
+def seed_slot(db: FakeSupabase, doctor: Dict[str, Any], start: str, **values: Any) -> Dict[str, Any]:
+    start_time = datetime.fromisoformat(start)
+    return db.seed(
+        "availability_slots",
+        doctor_id=doctor["id"],
+        start_time=start_time.isoformat(),
+        end_time=(start_time + timedelta(minutes=30)).isoformat(),
+        **values
+    )
+
+
+def seed_appointment(db: FakeSupabase, slot: Dict[str, Any], user: Dict[str, Any], **values: Any) -> Dict[str, Any]:
+    """A confirmed appointment on `slot`, which becomes unavailable (as the booking trigger does)."""
+    db.get("availability_slots", id=slot["id"])["is_available"] = False
+    return db.seed(
+        "appointments",
+        doctor_id=slot["doctor_id"],
+        user_id=user["id"],
+        slot_id=slot["id"],
+        slot_start_time=slot["start_time"],
+        patient_first_name="Mario",
+        patient_last_name="Rossi",
+        patient_phone="+39 333 1234567",
+        patient_email=user["email"],
+        **values
+    )
+
+
+def assert_round_trips(db: FakeSupabase, budget: int) -> None:
+    """At most `budget` PostgREST calls so far (see test_round_trips)."""
+    calls = [str(call) for call in db.calls]
+    assert len(calls) <= budget, f"{len(calls)} round trips, budget {budget}: {calls}"
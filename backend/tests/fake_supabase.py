@@ -0,0 +1,464 @@
+"""
+In-memory fake of the Supabase client, for running the API offline.
+
+Implements the part of the postgrest query builder the services use (table()
+with select/insert/upsert/update/delete, the eq/neq/gt/gte/lt/lte/in_/is_/or_
+filters, order, limit, range, count and head, embedded many-to-one relations
+such as "*, availability_slots(*), doctors(*)") plus rpc() with functions
+registered by the tests. Column defaults mirror schema-setup.sql; triggers,
+RLS and constraints other than upsert conflicts are not modelled.
+
+Every execute() is one round trip to PostgREST and is recorded in
+FakeSupabase.calls, so tests can assert how many a request makes.
+"""
+import copy
+import re
+import uuid
+from dataclasses import dataclass
+from datetime import date, datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+from postgrest.exceptions import APIError
+from postgrest.types import ReturnMethod
+
+# table -> embedded table -> foreign key column (many-to-one)
+RELATIONS: Dict[str, Dict[str, str]] = {
+    "appointments": {"availability_slots": "slot_id", "doctors": "doctor_id", "users": "user_id"},
+    "availability_slots": {"doctors": "doctor_id"},
+    "availability_versions": {"doctors": "doctor_id"},
+    "availability_calendar": {"doctors": "doctor_id"},
+    "email_outbox": {"appointments": "appointment_id"},
+}
+
+PRIMARY_KEYS: Dict[str, Tuple[str, ...]] = {
+    "availability_versions": ("doctor_id",),
+    "availability_calendar": ("doctor_id", "day"),
+    "idempotency_keys": ("key",),
+}
+
+_NOW = object()
+
+DEFAULTS: Dict[str, Dict[str, Any]] = {
+    "users": {"role": "patient", "created_at": _NOW, "updated_at": _NOW},
+    "doctors": {"profile_photo_url": None, "created_at": _NOW, "updated_at": _NOW},
+    "availability_slots": {"is_available": True, "held_by": None, "held_until": None, "created_at": _NOW},
+    "availability_versions": {"version": 0},
+    "availability_calendar": {"free_slots": 0},
+    "appointments": {"user_id": None, "status": "confirmed", "created_at": _NOW, "updated_at": _NOW},
+    "email_outbox": {
+        "appointment_id": None,
+        "payload": {},
+        "status": "pending",
+        "attempts": 0,
+        "next_attempt_at": _NOW,
+        "last_error": None,
+        "created_at": _NOW,
+        "sent_at": None,
+    },
+    "idempotency_keys": {"created_at": _NOW},
+}
+
+RpcHandler = Callable[["FakeSupabase", Dict[str, Any]], Any]
+
+
+@dataclass(frozen=True)
+class Call:
+    kind: str  # select | insert | upsert | update | delete | rpc
+    target: str  # table or function name
+
+    def __str__(self) -> str:
+        return f"{self.kind} {self.target}"
+
+
+@dataclass
+class FakeResponse:
+    data: Any
+    count: Optional[int] = None
+
+
+class FakeSupabase:
+    """The database and the client at once: tables of dict rows, plus the call log."""
+
+    def __init__(self):
+        self.tables: Dict[str, List[Dict[str, Any]]] = {}
+        self.rpc_handlers: Dict[str, RpcHandler] = {}
+        self.calls: List[Call] = []
+
+    # Client API
+
+    def table(self, name: str) -> "FakeQuery":
+        return FakeQuery(self, name)
+
+    from_ = table
+
+    def rpc(self, name: str, params: Optional[Dict[str, Any]] = None) -> "FakeRPC":
+        return FakeRPC(self, name, params or {})
+
+    # Test helpers
+
+    def seed(self, table: str, **values: Any) -> Dict[str, Any]:
+        """Insert a row (with the column defaults) without recording a call."""
+        row = self._new_row(table, values)
+        self.rows(table).append(row)
+        return copy.deepcopy(row)
+
+    def rows(self, table: str) -> List[Dict[str, Any]]:
+        return self.tables.setdefault(table, [])
+
+    def get(self, table: str, **match: Any) -> Optional[Dict[str, Any]]:
+        for row in self.rows(table):
+            if all(row.get(key) == value for key, value in match.items()):
+                return row
+        return None
+
+    def embed(self, table: str, row: Dict[str, Any], relation: str) -> Optional[Dict[str, Any]]:
+        """The row of `relation` that `row` references, as PostgREST would embed it."""
+        foreign_key = RELATIONS.get(table, {}).get(relation)
+        if foreign_key is None:
+            raise APIError({
+                "code": "PGRST200",
+                "message": f"Could not find a relationship between '{table}' and '{relation}'"
+            })
+        target = self.get(relation, id=row.get(foreign_key))
+        return copy.deepcopy(target) if target is not None else None
+
+    def reset_calls(self) -> None:
+        self.calls.clear()
+
+    def _new_row(self, table: str, values: Dict[str, Any]) -> Dict[str, Any]:
+        now = datetime.now(timezone.utc).isoformat()
+        row = {
+            key: now if value is _NOW else copy.deepcopy(value)
+            for key, value in DEFAULTS.get(table, {}).items()
+        }
+        if PRIMARY_KEYS.get(table, ("id",)) == ("id",):
+            row["id"] = str(uuid.uuid4())
+        row.update(copy.deepcopy(values))
+        return row
+
+
+class FakeRPC:
+
+    def __init__(self, db: FakeSupabase, name: str, params: Dict[str, Any]):
+        self.db = db
+        self.name = name
+        self.params = params
+
+    async def execute(self) -> FakeResponse:
+        self.db.calls.append(Call("rpc", self.name))
+        handler = self.db.rpc_handlers.get(self.name)
+        if handler is None:
+            raise APIError({
+                "code": "PGRST202",
+                "message": f"Could not find the function public.{self.name}"
+            })
+        return FakeResponse(data=copy.deepcopy(handler(self.db, self.params)))
+
+
+class FakeQuery:
+    """A postgrest request builder: filter methods mutate it and return it."""
+
+    def __init__(self, db: FakeSupabase, table: str):
+        self.db = db
+        self.table = table
+        self._kind = "select"
+        self._columns = "*"
+        self._payload: Any = None
+        self._count: Optional[str] = None
+        self._head = False
+        self._returning = ReturnMethod.representation
+        self._on_conflict = ""
+        self._ignore_duplicates = False
+        self._filters: List[Callable[[Dict[str, Any]], bool]] = []
+        self._order: List[Tuple[str, bool]] = []
+        self._offset = 0
+        self._limit: Optional[int] = None
+
+    # Operations
+
+    def select(self, *columns: str, count: Optional[str] = None, head: Optional[bool] = None) -> "FakeQuery":
+        self._kind = "select"
+        self._columns = ",".join(columns) or "*"
+        self._count = count
+        self._head = bool(head)
+        return self
+
+    def insert(self, json: Any, *, count: Optional[str] = None, returning: ReturnMethod = ReturnMethod.representation,
+               upsert: bool = False, default_to_null: bool = True) -> "FakeQuery":
+        self._kind = "upsert" if upsert else "insert"
+        self._payload = json
+        self._count = count
+        self._returning = returning
+        return self
+
+    def upsert(self, json: Any, *, count: Optional[str] = None, returning: ReturnMethod = ReturnMethod.representation,
+               ignore_duplicates: bool = False, on_conflict: str = "", default_to_null: bool = True) -> "FakeQuery":
+        self.insert(json, count=count, returning=returning, upsert=True)
+        self._ignore_duplicates = ignore_duplicates
+        self._on_conflict = on_conflict
+        return self
+
+    def update(self, json: Dict[str, Any], *, count: Optional[str] = None,
+               returning: ReturnMethod = ReturnMethod.representation) -> "FakeQuery":
+        self._kind = "update"
+        self._payload = json
+        self._count = count
+        self._returning = returning
+        return self
+
+    def delete(self, *, count: Optional[str] = None, returning: ReturnMethod = ReturnMethod.representation) -> "FakeQuery":
+        self._kind = "delete"
+        self._count = count
+        self._returning = returning
+        return self
+
+    # Filters and modifiers
+
+    def eq(self, column: str, value: Any) -> "FakeQuery":
+        return self._filter(column, "eq", value)
+
+    def neq(self, column: str, value: Any) -> "FakeQuery":
+        return self._filter(column, "neq", value)
+
+    def gt(self, column: str, value: Any) -> "FakeQuery":
+        return self._filter(column, "gt", value)
+
+    def gte(self, column: str, value: Any) -> "FakeQuery":
+        return self._filter(column, "gte", value)
+
+    def lt(self, column: str, value: Any) -> "FakeQuery":
+        return self._filter(column, "lt", value)
+
+    def lte(self, column: str, value: Any) -> "FakeQuery":
+        return self._filter(column, "lte", value)
+
+    def in_(self, column: str, values: Sequence[Any]) -> "FakeQuery":
+        return self._filter(column, "in", list(values))
+
+    def is_(self, column: str, value: Any) -> "FakeQuery":
+        return self._filter(column, "is", value)
+
+    def or_(self, filters: str) -> "FakeQuery":
+        conditions = [_parse_condition(term) for term in _split_top_level(filters)]
+        self._filters.append(lambda row: any(condition(row) for condition in conditions))
+        return self
+
+    def order(self, column: str, *, desc: bool = False, nullsfirst: bool = False) -> "FakeQuery":
+        self._order.append((column, desc))
+        return self
+
+    def limit(self, size: int) -> "FakeQuery":
+        self._limit = size
+        return self
+
+    def range(self, start: int, end: int) -> "FakeQuery":
+        self._offset = start
+        self._limit = end - start + 1
+        return self
+
+    async def execute(self) -> FakeResponse:
+        self.db.calls.append(Call(self._kind, self.table))
+        return getattr(self, f"_execute_{self._kind}")()
+
+    # Execution
+
+    def _filter(self, column: str, op: str, value: Any) -> "FakeQuery":
+        self._filters.append(lambda row: _compare(row.get(column), op, value))
+        return self
+
+    def _matching(self) -> List[Dict[str, Any]]:
+        return [row for row in self.db.rows(self.table) if all(f(row) for f in self._filters)]
+
+    def _execute_select(self) -> FakeResponse:
+        rows = self._matching()
+        for column, desc in reversed(self._order):
+            # NULLs last in ascending order, first in descending (Postgres default)
+            rows.sort(key=lambda row: (row.get(column) is None, _sort_key(row.get(column))), reverse=desc)
+        count = len(rows) if self._count else None
+        end = None if self._limit is None else self._offset + self._limit
+        rows = rows[self._offset:end]
+
+        if self._head:
+            return FakeResponse(data=[], count=count)
+        columns = _parse_columns(self._columns)
+        return FakeResponse(data=[self._project(self.table, row, columns) for row in rows], count=count)
+
+    def _execute_insert(self) -> FakeResponse:
+        payload = self._payload if isinstance(self._payload, list) else [self._payload]
+        rows = [self.db._new_row(self.table, values) for values in payload]
+        self.db.rows(self.table).extend(rows)
+        return self._written(rows)
+
+    def _execute_upsert(self) -> FakeResponse:
+        keys = tuple(k.strip() for k in self._on_conflict.split(",") if k.strip()) \
+            or PRIMARY_KEYS.get(self.table, ("id",))
+        payload = self._payload if isinstance(self._payload, list) else [self._payload]
+        written = []
+        for values in payload:
+            existing = None
+            if all(key in values for key in keys):
+                existing = self.db.get(self.table, **{key: values[key] for key in keys})
+            if existing is None:
+                row = self.db._new_row(self.table, values)
+                self.db.rows(self.table).append(row)
+                written.append(row)
+            elif not self._ignore_duplicates:
+                existing.update(copy.deepcopy(values))
+                written.append(existing)
+        return self._written(written)
+
+    def _execute_update(self) -> FakeResponse:
+        rows = self._matching()
+        for row in rows:
+            row.update(copy.deepcopy(self._payload))
+        return self._written(rows)
+
+    def _execute_delete(self) -> FakeResponse:
+        rows = self._matching()
+        self.db.tables[self.table] = [row for row in self.db.rows(self.table) if row not in rows]
+        return self._written(rows)
+
+    def _written(self, rows: List[Dict[str, Any]]) -> FakeResponse:
+        count = len(rows) if self._count else None
+        if self._returning == ReturnMethod.minimal:
+            return FakeResponse(data=[], count=count)
+        return FakeResponse(data=copy.deepcopy(rows), count=count)
+
+    def _project(self, table: str, row: Dict[str, Any], columns: List[Tuple[str, Optional[str], Any]]) -> Dict[str, Any]:
+        shaped: Dict[str, Any] = {}
+        for name, alias, nested in columns:
+            if nested is None:
+                if name == "*":
+                    shaped.update(copy.deepcopy(row))
+                else:
+                    shaped[alias or name] = copy.deepcopy(row.get(name))
+                continue
+            related = self.db.embed(table, row, name)
+            shaped[alias or name] = self._project(name, related, nested) if related is not None else None
+        return shaped
+
+
+def _split_top_level(text: str) -> List[str]:
+    """Split on commas outside parentheses and double quotes."""
+    parts, depth, quoted, current = [], 0, False, ""
+    for char in text:
+        if char == '"':
+            quoted = not quoted
+        elif not quoted and char == "(":
+            depth += 1
+        elif not quoted and char == ")":
+            depth -= 1
+        elif not quoted and depth == 0 and char == ",":
+            parts.append(current.strip())
+            current = ""
+            continue
+        current += char
+    if current.strip():
+        parts.append(current.strip())
+    return parts
+
+
+def _parse_columns(text: str) -> List[Tuple[str, Optional[str], Any]]:
+    """'*, alias:relation(cols)' -> [(name, alias, nested columns or None)]."""
+    columns = []
+    for item in _split_top_level(text):
+        match = re.fullmatch(r"(?:(\w+):)?(\w+|\*)(?:!\w+)?(?:\((.*)\))?", item, re.S)
+        if match is None:
+            raise APIError({"code": "PGRST100", "message": f"Unsupported select item: {item}"})
+        alias, name, nested = match.groups()
+        columns.append((name, alias, _parse_columns(nested or "*") if match.group(3) is not None else None))
+    return columns
+
+
+def _parse_condition(term: str) -> Callable[[Dict[str, Any]], bool]:
+    """One PostgREST logic-tree term: 'col.op.value', 'and(...)' or 'or(...)'."""
+    for operator, combine in (("and", all), ("or", any)):
+        if term.startswith(f"{operator}(") and term.endswith(")"):
+            conditions = [_parse_condition(inner) for inner in _split_top_level(term[len(operator) + 1:-1])]
+            return lambda row: combine(condition(row) for condition in conditions)
+
+    column, op, value = term.split(".", 2)
+    if value.startswith('"') and value.endswith('"'):
+        value = value[1:-1]
+    elif op == "in":
+        value = [v.strip('"') for v in _split_top_level(value[1:-1])]
+    return lambda row: _compare(row.get(column), op, value)
+
+
+def _compare(stored: Any, op: str, value: Any) -> bool:
+    if op == "is":
+        expected = {"null": None, "true": True, "false": False}.get(str(value).lower(), value)
+        return stored is expected
+    if op == "in":
+        return any(_compare(stored, "eq", item) for item in value)
+    if stored is None or value is None:
+        # SQL: comparisons with NULL are never true
+        return False
+
+    left, right = _sort_key(stored), _sort_key(_coerce(stored, value))
+    if op == "eq":
+        return left == right
+    if op == "neq":
+        return left != right
+    if op == "gt":
+        return left > right
+    if op == "gte":
+        return left >= right
+    if op == "lt":
+        return left < right
+    if op == "lte":
+        return left <= right
+    raise APIError({"code": "PGRST100", "message": f"Unsupported operator: {op}"})
+
+
+def _coerce(stored: Any, value: Any) -> Any:
+    """Filter values arrive as strings (or Python values); compare them as the column type."""
+    if isinstance(value, str):
+        if isinstance(stored, bool):
+            return value.lower() == "true"
+        if isinstance(stored, int):
+            return int(value)
+        if isinstance(stored, float):
+            return float(value)
+    return value
+
+
+def _sort_key(value: Any) -> Any:
+    """Timestamps and dates compare as instants (naive ones as UTC), like Postgres casts."""
+    if isinstance(value, str) and re.match(r"\d{4}-\d{2}-\d{2}", value):
+        try:
+            parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+        except ValueError:
+            return value
+        return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+    if isinstance(value, datetime):
+        return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+    if isinstance(value, date):
+        return datetime(value.year, value.month, value.day, tzinfo=timezone.utc)
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    return value
+
+
+class FakeClientRegistry:
+    """Stands in for SupabaseClientRegistry: every client is the same fake."""
+
+    def __init__(self, db: FakeSupabase):
+        self.db = db
+
+    async def get_client(self) -> FakeSupabase:
+        return self.db
+
+    async def get_admin_client(self) -> FakeSupabase:
+        return self.db
+
+    async def get_http_client(self):
+        raise RuntimeError("No HTTP upstream in tests: use HS256 tokens (SUPABASE_JWT_SECRET)")
+
+    async def open(self) -> None:
+        pass
+
+    async def close(self) -> None:
+        pass
+
+    def pool_stats(self) -> Dict[str, Any]:
+        return {"connections": 0, "active": 0, "idle": 0}
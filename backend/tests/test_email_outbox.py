@@ -0,0 +1,102 @@
+"""
+The email outbox worker: claim due messages, send them in one batch, mark the
+outcome, and retry failures with backoff.
+"""
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List
+
+import pytest
+
+from app.core.config import settings
+from app.services.email import FakeTransport
+from app.services.outbox import EmailOutboxService
+from app.workers.email_outbox import EmailOutboxWorker
+from tests.conftest import assert_round_trips
+from tests.fake_supabase import FakeSupabase
+
+PAYLOAD = {
+    "patient_name": "Mario Rossi",
+    "doctor_name": "Anna Bianchi",
+    "specialization": "Fisioterapia",
+    "date": "07/01/2030",
+    "time": "09:00",
+    "locale": None,
+}
+
+
+def claim_email_outbox(db: FakeSupabase, params: Dict[str, Any]) -> List[Dict[str, Any]]:
+    now = datetime.now(timezone.utc)
+    claimed = []
+    for message in db.rows("email_outbox"):
+        due = message["status"] in ("pending", "sending") and datetime.fromisoformat(message["next_attempt_at"]) <= now
+        if not due:
+            continue
+        if message["attempts"] >= params["p_max_attempts"]:
+            message.update(status="failed", last_error="Lease expired on the last attempt")
+            continue
+        if len(claimed) < params["p_limit"]:
+            message.update(
+                status="sending",
+                attempts=message["attempts"] + 1,
+                next_attempt_at=(now + timedelta(seconds=params["p_lease_seconds"])).isoformat()
+            )
+            claimed.append(dict(message))
+    return claimed
+
+
+@pytest.fixture(autouse=True)
+def rpcs(db):
+    db.rpc_handlers.update(claim_email_outbox=claim_email_outbox)
+
+
+def seed_message(db: FakeSupabase, n: int = 1, **values: Any) -> Dict[str, Any]:
+    return db.seed(
+        "email_outbox",
+        dedupe_key=f"appointment-{n}:confirmation",
+        event="confirmation",
+        to_email=f"paziente{n}@example.com",
+        payload=PAYLOAD,
+        **values
+    )
+
+
+def worker(db: FakeSupabase, transport: FakeTransport) -> EmailOutboxWorker:
+    return EmailOutboxWorker(EmailOutboxService(db), transport)
+
+
+async def test_due_messages_are_sent_in_one_batch(db):
+    messages = [seed_message(db, n) for n in (1, 2)]
+    transport = FakeTransport()
+
+    claimed = await worker(db, transport).run_once()
+
+    assert claimed == 2
+    assert [email.to_email for email in transport.sent] == ["paziente1@example.com", "paziente2@example.com"]
+    assert all(db.get("email_outbox", id=m["id"])["status"] == "sent" for m in messages)
+    assert_round_trips(db, 2)  # claim, mark both sent
+
+
+async def test_failed_send_is_retried_after_backoff(db):
+    message = seed_message(db)
+    email_worker = worker(db, FakeTransport(error="provider down"))
+
+    await email_worker.run_once()
+
+    stored = db.get("email_outbox", id=message["id"])
+    assert (stored["status"], stored["attempts"], stored["last_error"]) == ("pending", 1, "provider down")
+    delay = datetime.fromisoformat(stored["next_attempt_at"]) - datetime.now(timezone.utc)
+    assert timedelta(0) < delay <= timedelta(seconds=settings.email_outbox_backoff_base)
+    assert_round_trips(db, 2)  # claim, reschedule
+
+    db.reset_calls()
+    assert await email_worker.run_once() == 0  # not due yet
+    assert_round_trips(db, 1)  # claim
+
+
+async def test_message_fails_after_the_last_attempt(db):
+    message = seed_message(db, attempts=settings.email_outbox_max_attempts - 1)
+
+    await worker(db, FakeTransport(error="provider down")).run_once()
+
+    stored = db.get("email_outbox", id=message["id"])
+    assert (stored["status"], stored["attempts"]) == ("failed", settings.email_outbox_max_attempts)
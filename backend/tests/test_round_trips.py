@@ -0,0 +1,580 @@
+"""
+Round-trip budgets: the most PostgREST calls each endpoint may make.
+
+The budgets are the current counts. A change that adds a query to an endpoint
+fails here; if the extra round trip is intended, raise the budget in the same
+change. Requests start with cold caches, so authenticated endpoints include
+the lookup of the user's role.
+"""
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Dict
+
+import pytest
+from postgrest.exceptions import APIError
+
+from app.core.config import settings
+from app.services.availability import availability_reads
+from app.services.doctors import doctor_reads
+from tests.conftest import DAY, assert_round_trips, auth_headers, seed_appointment, seed_slot
+from tests.fake_supabase import FakeSupabase
+
+
+# Database functions, reduced to what the endpoints need from them
+
+def enqueue_appointment_email(db: FakeSupabase, params: Dict[str, Any]) -> None:
+    if db.get("email_outbox", dedupe_key=params["p_dedupe_key"]) is not None:
+        return
+    appointment = db.get("appointments", id=params["p_appointment_id"])
+    db.seed(
+        "email_outbox",
+        dedupe_key=params["p_dedupe_key"],
+        appointment_id=appointment["id"],
+        event=params["p_event"],
+        to_email=appointment["patient_email"],
+        payload={"locale": appointment.get("locale"), **(params.get("p_extra") or {})}
+    )
+
+
+def book_appointment(db: FakeSupabase, params: Dict[str, Any]) -> Dict[str, Any]:
+    slot = db.get("availability_slots", id=params["p_slot_id"])
+    if slot is None:
+        raise APIError({"code": "OR404", "message": "Slot non trovato"})
+    if not slot["is_available"]:
+        raise APIError({"code": "OR409", "message": "Slot non disponibile"})
+    slot["is_available"] = False
+    appointment = db.seed(
+        "appointments",
+        doctor_id=slot["doctor_id"],
+        user_id=params["p_user_id"],
+        slot_id=slot["id"],
+        slot_start_time=slot["start_time"],
+        patient_first_name=params["p_patient_first_name"],
+        patient_last_name=params["p_patient_last_name"],
+        patient_phone=params["p_patient_phone"],
+        patient_email=params["p_patient_email"],
+        locale=params.get("p_locale")
+    )
+    enqueue_appointment_email(db, {
+        "p_appointment_id": appointment["id"],
+        "p_event": "confirmation",
+        "p_dedupe_key": f"{appointment['id']}:confirmation",
+    })
+    return {
+        **appointment,
+        "availability_slots": db.embed("appointments", appointment, "availability_slots"),
+        "doctors": db.embed("appointments", appointment, "doctors"),
+    }
+
+
+def reschedule_appointment(db: FakeSupabase, params: Dict[str, Any]) -> Dict[str, Any]:
+    appointment = db.get("appointments", id=params["p_appointment_id"])
+    previous = db.get("availability_slots", id=appointment["slot_id"])
+    slot = db.get("availability_slots", id=params["p_new_slot_id"])
+    previous["is_available"], slot["is_available"] = True, False
+    appointment.update(
+        slot_id=slot["id"],
+        doctor_id=slot["doctor_id"],
+        slot_start_time=slot["start_time"],
+        updated_at=datetime.now(timezone.utc).isoformat()
+    )
+    enqueue_appointment_email(db, {
+        "p_appointment_id": appointment["id"],
+        "p_event": "rescheduled",
+        "p_dedupe_key": f"{appointment['id']}:rescheduled:{appointment['updated_at']}",
+    })
+    return {
+        **appointment,
+        "availability_slots": dict(slot),
+        "doctors": db.embed("appointments", appointment, "doctors"),
+        "previous_slot": dict(previous),
+    }
+
+
+def cancel_appointment(db: FakeSupabase, params: Dict[str, Any]) -> Dict[str, Any]:
+    appointment = db.get("appointments", id=params["p_appointment_id"])
+    if appointment["status"] == "cancelled":
+        raise APIError({"code": "OR400", "message": "Appuntamento già cancellato"})
+    appointment["status"] = "cancelled"
+    slot = db.get("availability_slots", id=appointment["slot_id"])
+    slot["is_available"] = True
+    event = "cancellation_by_clinic" if params["p_is_admin"] else "cancellation_by_patient"
+    enqueue_appointment_email(db, {
+        "p_appointment_id": appointment["id"],
+        "p_event": event,
+        "p_dedupe_key": f"{appointment['id']}:{event}",
+    })
+    return {
+        **appointment,
+        "availability_slots": dict(slot),
+        "doctors": db.embed("appointments", appointment, "doctors"),
+    }
+
+
+def book_appointment_series(db: FakeSupabase, params: Dict[str, Any]) -> list:
+    slots = sorted(
+        (db.get("availability_slots", id=slot_id) for slot_id in params["p_slot_ids"]),
+        key=lambda slot: slot["start_time"]
+    )
+    if any(not slot["is_available"] for slot in slots):
+        raise APIError({"code": "OR409", "message": "Slot non disponibili"})
+    appointments = []
+    for slot in slots:
+        slot["is_available"] = False
+        appointments.append(db.seed(
+            "appointments",
+            doctor_id=slot["doctor_id"],
+            user_id=params["p_user_id"],
+            slot_id=slot["id"],
+            slot_start_time=slot["start_time"],
+            patient_first_name=params["p_patient_first_name"],
+            patient_last_name=params["p_patient_last_name"],
+            patient_phone=params["p_patient_phone"],
+            patient_email=params["p_patient_email"]
+        ))
+    enqueue_appointment_email(db, {
+        "p_appointment_id": appointments[0]["id"],
+        "p_event": "series_confirmation",
+        "p_dedupe_key": f"{appointments[0]['id']}:series_confirmation",
+        "p_extra": {"count": len(appointments)},
+    })
+    return [
+        {
+            **appointment,
+            "availability_slots": db.embed("appointments", appointment, "availability_slots"),
+            "doctors": db.embed("appointments", appointment, "doctors"),
+        }
+        for appointment in appointments
+    ]
+
+
+def bulk_update_slots(db: FakeSupabase, params: Dict[str, Any]) -> Dict[str, Any]:
+    changed, conflicts = [], []
+    for slot_id in params["p_slot_ids"]:
+        slot = db.get("availability_slots", id=slot_id)
+        booked = db.get("appointments", slot_id=slot_id, status="confirmed")
+        if booked is not None and params["p_action"] != "disable":
+            conflicts.append({"slot_id": slot_id, "start_time": slot["start_time"], "appointment_id": booked["id"]})
+            continue
+        if params["p_action"] == "delete":
+            db.rows("availability_slots").remove(slot)
+        else:
+            slot["is_available"] = params["p_action"] == "enable"
+        changed.append(dict(slot))
+    return {"slots": changed, "conflicts": conflicts}
+
+
+def hold_slot(db: FakeSupabase, params: Dict[str, Any]) -> Dict[str, Any]:
+    slot = db.get("availability_slots", id=params["p_slot_id"])
+    slot.update(held_by=params["p_user_id"], held_until=f"{DAY}T23:59:59+00:00")
+    return dict(slot)
+
+
+def search_available_slots(db: FakeSupabase, params: Dict[str, Any]) -> list:
+    return [
+        {**slot, "doctors": db.embed("availability_slots", slot, "doctors")}
+        for slot in db.rows("availability_slots")
+        if slot["is_available"]
+    ][:params["p_limit"]]
+
+
+@pytest.fixture(autouse=True)
+def rpcs(db):
+    db.rpc_handlers.update(
+        enqueue_appointment_email=enqueue_appointment_email,
+        book_appointment=book_appointment,
+        reschedule_appointment=reschedule_appointment,
+        cancel_appointment=cancel_appointment,
+        book_appointment_series=book_appointment_series,
+        bulk_update_slots=bulk_update_slots,
+        hold_slot=hold_slot,
+        search_available_slots=search_available_slots,
+    )
+
+
+# Public reads
+
+async def test_list_doctors(client, db, doctor):
+    response = await client.get("/api/doctors")
+
+    assert response.status_code == 200
+    assert [d["id"] for d in response.json()] == [doctor["id"]]
+    assert_round_trips(db, 1)  # doctor catalog
+
+
+async def test_get_doctor(client, db, doctor):
+    response = await client.get(f"/api/doctors/{doctor['id']}")
+
+    assert response.status_code == 200
+    assert_round_trips(db, 1)  # doctor catalog
+
+
+async def test_list_doctors_larger_than_the_cache(client, db, doctor, monkeypatch):
+    monkeypatch.setattr(settings, "doctor_cache_max_size", 0)
+
+    response = await client.get("/api/doctors")
+
+    assert response.status_code == 200
+    assert [d["id"] for d in response.json()] == [doctor["id"]]
+    assert_round_trips(db, 2)  # doctor catalog (too large), doctors
+
+    # The too-large verdict is cached: no catalog query until it expires
+    db.reset_calls()
+    doctor_reads.clear()
+    assert (await client.get("/api/doctors")).status_code == 200
+    assert_round_trips(db, 1)  # doctors
+
+
+async def test_doctor_slots_of_a_day(client, db, doctor):
+    seed_slot(db, doctor, f"{DAY}T09:00:00")
+    seed_slot(db, doctor, f"{DAY}T09:30:00", is_available=False)
+    seed_slot(db, doctor, "2030-01-08T09:00:00")
+
+    response = await client.get(f"/api/doctors/{doctor['id']}/slots", params={"date": DAY, "available_only": True})
+
+    assert response.status_code == 200
+    assert [slot["start_time"] for slot in response.json()] == [f"{DAY}T09:00:00"]
+    assert_round_trips(db, 2)  # availability version, slots
+
+
+async def test_available_dates(client, db, doctor):
+    db.seed("availability_calendar", doctor_id=doctor["id"], day=DAY, free_slots=1)
+    db.seed("availability_calendar", doctor_id=doctor["id"], day="2030-01-08", free_slots=0)
+
+    response = await client.get(f"/api/doctors/{doctor['id']}/available-dates")
+
+    assert response.status_code == 200
+    assert response.json() == [DAY]
+    assert_round_trips(db, 3)  # availability version, calendar, held slots
+
+
+async def test_doctor_detail(client, db, doctor):
+    seed_slot(db, doctor, f"{DAY}T09:00:00")
+    db.seed("availability_calendar", doctor_id=doctor["id"], day=DAY, free_slots=1)
+
+    response = await client.get(f"/api/doctors/{doctor['id']}/detail")
+
+    assert response.status_code == 200
+    detail = response.json()
+    assert detail["selected_date"] == DAY
+    assert [slot["start_time"] for slot in detail["slots"]] == [f"{DAY}T09:00:00"]
+    assert_round_trips(db, 5)  # doctor catalog, availability version, calendar, held slots, slots
+
+
+async def test_calendar(client, db, doctor):
+    db.seed("availability_calendar", doctor_id=doctor["id"], day=DAY, free_slots=2)
+
+    response = await client.get(f"/api/doctors/{doctor['id']}/calendar")
+
+    assert response.status_code == 200
+    assert response.json() == [{"date": DAY, "free_slots": 2}]
+    assert_round_trips(db, 3)  # availability version, calendar, held slots
+
+
+async def test_not_modified_availability_skips_the_slots_query(client, db, doctor):
+    seed_slot(db, doctor, f"{DAY}T09:00:00")
+    path = f"/api/doctors/{doctor['id']}/slots"
+    etag = (await client.get(path, params={"date": DAY})).headers["etag"]
+    availability_reads.clear()
+    db.reset_calls()
+
+    response = await client.get(path, params={"date": DAY}, headers={"If-None-Match": etag})
+
+    assert response.status_code == 304
+    assert_round_trips(db, 1)  # availability version only
+
+
+async def test_first_available(client, db, doctor):
+    seed_slot(db, doctor, f"{DAY}T09:00:00")
+
+    response = await client.get("/api/slots/first-available", params={"specialization": "Fisioterapia"})
+
+    assert response.status_code == 200
+    assert response.json()[0]["doctor"]["id"] == doctor["id"]
+    assert_round_trips(db, 1)  # search_available_slots
+
+
+# Patient
+
+async def test_my_appointments(client, db, patient, doctor):
+    for hour in ("09", "10"):
+        seed_appointment(db, seed_slot(db, doctor, f"{DAY}T{hour}:00:00"), patient)
+
+    response = await client.get("/api/appointments/me", headers=auth_headers(patient))
+
+    assert response.status_code == 200
+    page = response.json()
+    assert len(page["appointments"]) == 2
+    assert page["appointments"][0]["doctor"]["id"] == doctor["id"]
+    assert_round_trips(db, 2)  # role, appointments with slots and doctors
+
+
+async def test_book_appointment(client, db, patient, doctor):
+    slot = seed_slot(db, doctor, f"{DAY}T09:00:00")
+
+    headers = {**auth_headers(patient), "Accept-Language": "en-GB,en;q=0.9,it;q=0.8"}
+
+    response = await client.post("/api/appointments", headers=headers, json={
+        "slot_id": slot["id"],
+        "patient_first_name": "Mario",
+        "patient_last_name": "Rossi",
+        "patient_phone": "+39 333 1234567",
+        "patient_email": patient["email"],
+    })
+
+    assert response.status_code == 200, response.text
+    assert [(m["event"], m["payload"]["locale"]) for m in db.rows("email_outbox")] == [("confirmation", "en")]
+    assert_round_trips(db, 2)  # role, book_appointment (queues the email)
+
+
+async def test_idempotent_booking_replay(client, db, patient, doctor):
+    slot = seed_slot(db, doctor, f"{DAY}T09:00:00")
+    headers = {**auth_headers(patient), "Idempotency-Key": str(uuid.uuid4())}
+    booking = {
+        "slot_id": slot["id"],
+        "patient_first_name": "Mario",
+        "patient_last_name": "Rossi",
+        "patient_phone": "+39 333 1234567",
+        "patient_email": patient["email"],
+    }
+    first = await client.post("/api/appointments", headers=headers, json=booking)
+    db.reset_calls()
+
+    replay = await client.post("/api/appointments", headers=headers, json=booking)
+
+    assert replay.status_code == first.status_code == 200
+    assert replay.headers["idempotency-replayed"] == "true"
+    assert replay.json() == first.json()
+    assert len(db.rows("appointments")) == 1
+    assert_round_trips(db, 0)  # role and response both cached
+
+
+async def test_hold_slot(client, db, patient, doctor):
+    slot = seed_slot(db, doctor, f"{DAY}T09:00:00")
+
+    response = await client.post(f"/api/slots/{slot['id']}/hold", headers=auth_headers(patient))
+
+    assert response.status_code == 200, response.text
+    assert_round_trips(db, 2)  # role, hold_slot
+
+
+async def test_release_hold(client, db, patient, doctor):
+    slot = seed_slot(db, doctor, f"{DAY}T09:00:00", held_by=patient["id"], held_until=f"{DAY}T23:59:59+00:00")
+
+    response = await client.delete(f"/api/slots/{slot['id']}/hold", headers=auth_headers(patient))
+
+    assert response.status_code == 200, response.text
+    assert db.get("availability_slots", id=slot["id"])["held_by"] is None
+    assert_round_trips(db, 2)  # role, release
+
+
+async def test_update_appointment(client, db, patient, doctor):
+    appointment = seed_appointment(db, seed_slot(db, doctor, f"{DAY}T09:00:00"), patient)
+
+    response = await client.patch(
+        f"/api/appointments/{appointment['id']}",
+        headers=auth_headers(patient),
+        json={"patient_phone": "+39 333 7654321"}
+    )
+
+    assert response.status_code == 200, response.text
+    assert db.get("appointments", id=appointment["id"])["patient_phone"] == "+39 333 7654321"
+    assert_round_trips(db, 3)  # role, appointment, update
+
+
+async def test_cancel_appointment(client, db, patient, doctor):
+    slot = seed_slot(db, doctor, f"{DAY}T09:00:00")
+    appointment = seed_appointment(db, slot, patient)
+
+    response = await client.delete(f"/api/appointments/{appointment['id']}", headers=auth_headers(patient))
+
+    assert response.status_code == 200, response.text
+    assert db.get("appointments", id=appointment["id"])["status"] == "cancelled"
+    assert db.get("availability_slots", id=slot["id"])["is_available"] is True
+    assert [m["event"] for m in db.rows("email_outbox")] == ["cancellation_by_patient"]
+    assert_round_trips(db, 2)  # role, cancel_appointment
+
+
+async def test_reschedule_appointment(client, db, patient, doctor):
+    appointment = seed_appointment(db, seed_slot(db, doctor, f"{DAY}T09:00:00"), patient)
+    new_slot = seed_slot(db, doctor, f"{DAY}T11:00:00")
+
+    response = await client.post(
+        f"/api/appointments/{appointment['id']}/reschedule",
+        headers=auth_headers(patient),
+        json={"slot_id": new_slot["id"]}
+    )
+
+    assert response.status_code == 200, response.text
+    assert response.json()["slot"]["id"] == new_slot["id"]
+    assert [m["event"] for m in db.rows("email_outbox")] == ["rescheduled"]
+    assert_round_trips(db, 2)  # role, reschedule_appointment (queues the email)
+
+
+async def test_resend_email(client, db, patient, doctor):
+    appointment = seed_appointment(db, seed_slot(db, doctor, f"{DAY}T09:00:00"), patient)
+
+    response = await client.post(f"/api/appointments/{appointment['id']}/resend-email", headers=auth_headers(patient))
+
+    assert response.status_code == 200, response.text
+    assert [m["event"] for m in db.rows("email_outbox")] == ["confirmation"]
+    assert_round_trips(db, 3)  # role, appointment, email
+
+
+# Admin
+
+async def test_admin_appointment_pages(client, db, admin, patient, doctor):
+    for hour in ("09", "10", "11"):
+        seed_appointment(db, seed_slot(db, doctor, f"{DAY}T{hour}:00:00"), patient)
+    headers = auth_headers(admin)
+
+    first = await client.get("/api/appointments/admin/all", headers=headers, params={"limit": 2, "date": DAY})
+    second = await client.get(
+        "/api/appointments/admin/all",
+        headers=headers,
+        params={"limit": 2, "date": DAY, "cursor": first.json()["next_cursor"]}
+    )
+
+    assert first.status_code == second.status_code == 200
+    times = [a["slot"]["start_time"] for page in (first, second) for a in page.json()["appointments"]]
+    assert times == [f"{DAY}T09:00:00", f"{DAY}T10:00:00", f"{DAY}T11:00:00"]
+    assert second.json()["next_cursor"] is None
+    assert_round_trips(db, 3)  # role (then cached), one query per page
+
+
+async def test_create_slots(client, db, admin, doctor):
+    seed_slot(db, doctor, f"{DAY}T09:00:00")
+
+    response = await client.post("/api/admin/availability", headers=auth_headers(admin), json={
+        "doctor_id": doctor["id"],
+        "date": DAY,
+        "start_time": "09:00",
+        "end_time": "10:00",
+    })
+
+    assert response.status_code == 200, response.text
+    assert len(db.rows("availability_slots")) == 2
+    assert_round_trips(db, 3)  # role, existing slots of the day, insert
+
+
+async def test_toggle_slot(client, db, admin, doctor):
+    slot = seed_slot(db, doctor, f"{DAY}T09:00:00", is_available=False)
+
+    response = await client.patch(
+        f"/api/admin/availability/{slot['id']}",
+        headers=auth_headers(admin),
+        params={"is_available": True}
+    )
+
+    assert response.status_code == 200, response.text
+    assert db.get("availability_slots", id=slot["id"])["is_available"] is True
+    assert_round_trips(db, 4)  # role, slot, confirmed appointments, update
+
+
+async def test_delete_slot(client, db, admin, doctor):
+    slot = seed_slot(db, doctor, f"{DAY}T09:00:00")
+
+    response = await client.delete(f"/api/admin/availability/{slot['id']}", headers=auth_headers(admin))
+
+    assert response.status_code == 200, response.text
+    assert db.rows("availability_slots") == []
+    assert_round_trips(db, 4)  # role, slot, confirmed appointments, delete
+
+
+async def test_delete_booked_slot_is_refused(client, db, admin, patient, doctor):
+    slot = seed_slot(db, doctor, f"{DAY}T09:00:00")
+    seed_appointment(db, slot, patient)
+
+    response = await client.delete(f"/api/admin/availability/{slot['id']}", headers=auth_headers(admin))
+
+    assert response.status_code == 400
+    assert len(db.rows("availability_slots")) == 1
+
+
+async def test_manual_booking(client, db, admin, patient, doctor):
+    slot = seed_slot(db, doctor, f"{DAY}T09:00:00")
+
+    response = await client.post("/api/appointments/admin/manual", headers=auth_headers(admin), json={
+        "slot_id": slot["id"],
+        "patient_id": patient["id"],
+        "patient_first_name": "Mario",
+        "patient_last_name": "Rossi",
+        "patient_phone": "+39 333 1234567",
+        "patient_email": patient["email"],
+    })
+
+    assert response.status_code == 200, response.text
+    assert [m["event"] for m in db.rows("email_outbox")] == ["confirmation"]
+    assert_round_trips(db, 2)  # role, book_appointment (queues the email)
+
+
+async def test_series_booking(client, db, admin, patient, doctor):
+    slots = [seed_slot(db, doctor, f"2030-01-{day}T09:00:00") for day in ("07", "14", "21")]
+
+    response = await client.post("/api/appointments/admin/series", headers=auth_headers(admin), json={
+        "slot_ids": [slot["id"] for slot in slots],
+        "patient_first_name": "Mario",
+        "patient_last_name": "Rossi",
+        "patient_phone": "+39 333 1234567",
+        "patient_email": patient["email"],
+    })
+
+    assert response.status_code == 200, response.text
+    assert len(response.json()["appointments"]) == 3
+    assert [m["event"] for m in db.rows("email_outbox")] == ["series_confirmation"]
+    assert_round_trips(db, 2)  # role, book_appointment_series (queues the email)
+
+
+async def test_export_appointments(client, db, admin, patient, doctor):
+    for hour in ("09", "10", "11"):
+        seed_appointment(db, seed_slot(db, doctor, f"{DAY}T{hour}:00:00"), patient)
+
+    response = await client.get("/api/appointments/admin/export", headers=auth_headers(admin), params={"date": DAY})
+
+    assert response.status_code == 200
+    assert len(response.text.strip().splitlines()) == 4  # header and three rows
+    assert_round_trips(db, 2)  # role, one page of appointments
+
+
+async def test_create_schedule(client, db, admin, doctor):
+    seed_slot(db, doctor, f"{DAY}T09:00:00")
+
+    response = await client.post("/api/admin/availability/schedule", headers=auth_headers(admin), json={
+        "doctor_id": doctor["id"],
+        "start_date": DAY,
+        "end_date": "2030-01-13",
+        "weekdays": [0, 2],
+        "windows": [{"start_time": "9:00", "end_time": "10:00"}],
+    })
+
+    assert response.status_code == 200, response.text
+    assert (response.json()["slots_created"], response.json()["slots_skipped"]) == (3, 1)
+    assert_round_trips(db, 3)  # role, existing slots of the range, one insert batch
+
+
+async def test_bulk_update_slots(client, db, admin, patient, doctor):
+    free = seed_slot(db, doctor, f"{DAY}T09:00:00")
+    booked = seed_slot(db, doctor, f"{DAY}T09:30:00")
+    seed_appointment(db, booked, patient)
+
+    response = await client.post("/api/admin/availability/bulk", headers=auth_headers(admin), json={
+        "action": "delete",
+        "slot_ids": [free["id"], booked["id"]],
+    })
+
+    assert response.status_code == 200, response.text
+    assert [c["slot_id"] for c in response.json()["conflicts"]] == [booked["id"]]
+    assert db.rows("availability_slots") == [db.get("availability_slots", id=booked["id"])]
+    assert_round_trips(db, 2)  # role, bulk_update_slots
+
+
+async def test_bulk_update_slots_with_mixed_timezones(client, db, admin, doctor):
+    response = await client.post("/api/admin/availability/bulk", headers=auth_headers(admin), json={
+        "action": "disable",
+        "doctor_id": doctor["id"],
+        "range_start": f"{DAY}T00:00:00",
+        "range_end": f"{DAY}T23:00:00+01:00",
+    })
+
+    assert response.status_code == 422, response.text
+    assert_round_trips(db, 1)  # role
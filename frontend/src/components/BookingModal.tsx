@@ -1,7 +1,8 @@
-import { useState } from 'react';
+import { useState, useEffect, useRef } from 'react';
 import { useTranslation } from 'react-i18next';
 import { AvailabilitySlot, Doctor } from '@/types';
 import { appointmentsApi } from '@/services/appointments';
+import { availabilityApi } from '@/services/availability';
 import { Button } from '@/components/ui/button';
 import { Input } from '@/components/ui/input';
 import { Label } from '@/components/ui/label';
@@ -21,8 +22,26 @@ export function BookingModal({ slot, doctor, onClose, onSuccess }: BookingModalP
   const [phone, setPhone] = useState('');
   const [email, setEmail] = useState('');
   const [loading, setLoading] = useState(false);
+  const booked = useRef(false);
+  // One key per opened form: resubmits after a lost response replay the booking
+  const idempotencyKey = useRef(crypto.randomUUID());
   const { t } = useTranslation();
 
+  // Hold the slot while the form is open, release it if closed without booking
+  useEffect(() => {
+    availabilityApi.holdSlot(slot.id).catch((error: any) => {
+      if (error.response?.status === 409) {
+        toast.error(error.response.data?.detail || t('errors.booking'));
+        onClose();
+      }
+    });
+    return () => {
+      if (!booked.current) {
+        availabilityApi.releaseHold(slot.id).catch(() => undefined);
+      }
+    };
+  }, [slot.id]);
+
   const formatTime = (dateString: string) => {
     const timePart = dateString.split('T')[1];
     return timePart ? timePart.substring(0, 5) : '';
@@ -67,7 +86,8 @@ export function BookingModal({ slot, doctor, onClose, onSuccess }: BookingModalP
         patient_last_name: lastName,
         patient_phone: phone,
         patient_email: email,
-      });
+      }, idempotencyKey.current);
+      booked.current = true;
       toast.success(t('booking.success'));
       onSuccess();
     } catch (error: any) {
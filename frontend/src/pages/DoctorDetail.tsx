@@ -1,9 +1,10 @@
-import { useState, useEffect } from 'react';
+import { useState, useEffect, useRef } from 'react';
 import { useParams, Link } from 'react-router-dom';
 import { useTranslation } from 'react-i18next';
-import { Doctor, AvailabilitySlot } from '@/types';
+import { Doctor, AvailabilitySlot, LiveEvent } from '@/types';
 import { doctorsApi } from '@/services/doctors';
 import { availabilityApi } from '@/services/availability';
+import { eventsApi } from '@/services/events';
 import { Card, CardContent, CardHeader, CardTitle } from '@/components/ui/card';
 import { Button } from '@/components/ui/button';
 import { BookingModal } from '@/components/BookingModal';
@@ -15,6 +16,7 @@ export function DoctorDetail() {
   const [availableDates, setAvailableDates] = useState<string[]>([]);
   const [selectedDate, setSelectedDate] = useState<string>('');
   const [slots, setSlots] = useState<AvailabilitySlot[]>([]);
+  const [slotsDate, setSlotsDate] = useState<string>('');
   const [loading, setLoading] = useState(true);
   const [loadingSlots, setLoadingSlots] = useState(false);
   const [selectedSlot, setSelectedSlot] = useState<AvailabilitySlot | null>(null);
@@ -22,23 +24,32 @@ export function DoctorDetail() {
 
   useEffect(() => {
     if (id) {
-      fetchDoctor();
-      fetchAvailableDates();
+      fetchDetail();
     }
   }, [id]);
 
+  // Live slot updates for this doctor
   useEffect(() => {
-    if (selectedDate && id) {
+    if (!id) return;
+    return eventsApi.subscribeDoctor(id, (event) => liveEventHandler.current(event));
+  }, [id]);
+
+  useEffect(() => {
+    // Slots of the date picked by fetchDetail are already loaded
+    if (selectedDate && id && selectedDate !== slotsDate) {
       fetchSlots();
-    } else {
-      setSlots([]);
     }
   }, [selectedDate, id]);
 
-  const fetchDoctor = async () => {
+  // Doctor, available dates and slots in a single request
+  const fetchDetail = async (date?: string) => {
     try {
-      const data = await doctorsApi.getById(id!);
-      setDoctor(data);
+      const data = await doctorsApi.getDetail(id!, date);
+      setDoctor(data.doctor);
+      setAvailableDates(data.available_dates);
+      setSlots(data.slots);
+      setSlotsDate(data.selected_date || '');
+      setSelectedDate(data.selected_date || '');
     } catch (error) {
       console.error('Error fetching doctor:', error);
       toast.error(t('errors.loadingDoctor'));
@@ -47,24 +58,24 @@ export function DoctorDetail() {
     }
   };
 
-  const fetchAvailableDates = async () => {
-    try {
-      const dates = await availabilityApi.getAvailableDates(id!);
-      setAvailableDates(dates);
-      // Auto-select first available date
-      if (dates.length > 0) {
-        setSelectedDate(dates[0]);
-      }
-    } catch (error) {
-      console.error('Error fetching available dates:', error);
+  const handleLiveEvent = (event: LiveEvent) => {
+    if (event.event === 'slot' && event.data.is_available === false) {
+      // Booked or disabled elsewhere: drop it before someone tries to book it
+      setSlots((current) => current.filter((slot) => slot.id !== event.data.slot_id));
+      return;
     }
+    // Slots freed, added or deleted (or events were missed): reload
+    fetchDetail(selectedDate || undefined);
   };
+  const liveEventHandler = useRef(handleLiveEvent);
+  liveEventHandler.current = handleLiveEvent;
 
   const fetchSlots = async () => {
     setLoadingSlots(true);
     try {
       const data = await availabilityApi.getByDoctor(id!, selectedDate, true);
       setSlots(data);
+      setSlotsDate(selectedDate);
     } catch (error) {
       console.error('Error fetching slots:', error);
       toast.error(t('errors.loadingSlots'));
@@ -90,8 +101,7 @@ export function DoctorDetail() {
 
   const handleBookingSuccess = () => {
     setSelectedSlot(null);
-    fetchSlots();
-    fetchAvailableDates();
+    fetchDetail(selectedDate);
   };
 
   if (loading) {
@@ -19,7 +19,9 @@ import toast from 'react-hot-toast';
 
 export function MyAppointments() {
   const [appointments, setAppointments] = useState<Appointment[]>([]);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
   const [loading, setLoading] = useState(true);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [appointmentToCancel, setAppointmentToCancel] = useState<Appointment | null>(null);
   const [appointmentToEdit, setAppointmentToEdit] = useState<Appointment | null>(null);
   const { t } = useTranslation();
@@ -30,8 +32,9 @@ export function MyAppointments() {
 
   const fetchAppointments = async () => {
     try {
-      const data = await appointmentsApi.getMyAppointments();
-      setAppointments(data);
+      const page = await appointmentsApi.getMyAppointments();
+      setAppointments(page.appointments);
+      setNextCursor(page.next_cursor);
     } catch (error) {
       console.error('Error fetching appointments:', error);
       toast.error(t('errors.loadingAppointments'));
@@ -40,6 +43,21 @@ export function MyAppointments() {
     }
   };
 
+  const loadMore = async () => {
+    if (!nextCursor) return;
+    setLoadingMore(true);
+    try {
+      const page = await appointmentsApi.getMyAppointments(nextCursor);
+      setAppointments((current) => [...current, ...page.appointments]);
+      setNextCursor(page.next_cursor);
+    } catch (error) {
+      console.error('Error fetching appointments:', error);
+      toast.error(t('errors.loadingAppointments'));
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   const handleCancelConfirm = async () => {
     if (!appointmentToCancel) return;
 
@@ -231,6 +249,14 @@ export function MyAppointments() {
               </div>
             </div>
           )}
+
+          {nextCursor && (
+            <div className="flex justify-center">
+              <Button variant="outline" onClick={loadMore} disabled={loadingMore}>
+                {loadingMore ? t('common.loading') : t('common.loadMore')}
+              </Button>
+            </div>
+          )}
         </div>
       )}
 
@@ -2,6 +2,7 @@ import { useState, useEffect, useRef } from 'react';
 import { useTranslation } from 'react-i18next';
 import { Appointment, Doctor } from '@/types';
 import { appointmentsApi } from '@/services/appointments';
+import { eventsApi } from '@/services/events';
 import { doctorsApi } from '@/services/doctors';
 import { Card, CardContent, CardHeader, CardTitle } from '@/components/ui/card';
 import { Button } from '@/components/ui/button';
@@ -42,7 +43,10 @@ const getWeekEnd = () => {
 export function AppointmentsManagement() {
   const [appointments, setAppointments] = useState<Appointment[]>([]);
   const [doctors, setDoctors] = useState<Doctor[]>([]);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
+  const [total, setTotal] = useState<number | null>(null);
   const [loading, setLoading] = useState(true);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [appointmentToCancel, setAppointmentToCancel] = useState<Appointment | null>(null);
   const [appointmentToEdit, setAppointmentToEdit] = useState<Appointment | null>(null);
   const printRef = useRef<HTMLDivElement>(null);
@@ -65,6 +69,30 @@ export function AppointmentsManagement() {
     fetchAppointments();
   }, [selectedDoctorId, selectedDate, selectedDateEnd, selectedStatus]);
 
+  // Live updates: reload (quietly, debounced) when appointments change anywhere
+  useEffect(() => {
+    let closed = false;
+    let unsubscribe: (() => void) | undefined;
+    let timer: ReturnType<typeof setTimeout> | undefined;
+
+    eventsApi
+      .subscribeAdmin((event) => {
+        if (event.event !== 'appointment' && event.event !== 'resync') return;
+        clearTimeout(timer);
+        timer = setTimeout(() => refreshAppointments.current(true), 500);
+      })
+      .then((close) => {
+        if (closed) close();
+        else unsubscribe = close;
+      });
+
+    return () => {
+      closed = true;
+      clearTimeout(timer);
+      unsubscribe?.();
+    };
+  }, []);
+
   const handleQuickDateFilter = (filter: QuickDateFilter) => {
     setQuickDateFilter(filter);
     switch (filter) {
@@ -98,17 +126,23 @@ export function AppointmentsManagement() {
     }
   };
 
-  const fetchAppointments = async () => {
-    setLoading(true);
+  const getFilters = () => {
+    const params: { doctor_id?: string; date?: string; date_end?: string; status?: string } = {};
+    if (selectedDoctorId) params.doctor_id = selectedDoctorId;
+    if (selectedDate) params.date = selectedDate;
+    if (selectedDateEnd) params.date_end = selectedDateEnd;
+    if (selectedStatus) params.status = selectedStatus;
+    return params;
+  };
+
+  // First page only: further pages are loaded on demand
+  const fetchAppointments = async (silent: boolean = false) => {
+    if (!silent) setLoading(true);
     try {
-      const params: { doctor_id?: string; date?: string; date_end?: string; status?: string } = {};
-      if (selectedDoctorId) params.doctor_id = selectedDoctorId;
-      if (selectedDate) params.date = selectedDate;
-      if (selectedDateEnd) params.date_end = selectedDateEnd;
-      if (selectedStatus) params.status = selectedStatus;
-
-      const data = await appointmentsApi.getAll(params);
-      setAppointments(data);
+      const page = await appointmentsApi.getAll(getFilters());
+      setAppointments(page.appointments);
+      setNextCursor(page.next_cursor);
+      setTotal(page.total ?? null);
     } catch (error) {
       console.error('Error fetching appointments:', error);
       toast.error(t('errors.loadingAppointments'));
@@ -117,6 +151,24 @@ export function AppointmentsManagement() {
     }
   };
 
+  const loadMore = async () => {
+    if (!nextCursor) return;
+    setLoadingMore(true);
+    try {
+      const page = await appointmentsApi.getAll(getFilters(), nextCursor);
+      setAppointments((current) => [...current, ...page.appointments]);
+      setNextCursor(page.next_cursor);
+    } catch (error) {
+      console.error('Error fetching appointments:', error);
+      toast.error(t('errors.loadingAppointments'));
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
+  const refreshAppointments = useRef(fetchAppointments);
+  refreshAppointments.current = fetchAppointments;
+
   const handleCancelConfirm = async () => {
     if (!appointmentToCancel) return;
 
@@ -307,7 +359,7 @@ export function AppointmentsManagement() {
         <CardHeader className="flex flex-row items-center justify-between">
           <div>
             <CardTitle className="text-lg">
-              {t('appointmentsAdmin.appointmentsCount', { count: appointments.length })}
+              {t('appointmentsAdmin.appointmentsCount', { count: total ?? appointments.length })}
             </CardTitle>
             <p className="text-sm text-muted-foreground mt-1">{getFilterLabel()}</p>
           </div>
@@ -413,6 +465,14 @@ export function AppointmentsManagement() {
                   </div>
                 );
               })}
+
+              {nextCursor && (
+                <div className="flex justify-center pt-2 print:hidden">
+                  <Button variant="outline" onClick={loadMore} disabled={loadingMore}>
+                    {loadingMore ? t('common.loading') : t('common.loadMore')}
+                  </Button>
+                </div>
+              )}
             </div>
           )}
         </CardContent>
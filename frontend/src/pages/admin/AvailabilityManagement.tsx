@@ -17,6 +17,7 @@ import {
   AlertDialogHeader,
   AlertDialogTitle,
 } from '@/components/ui/alert-dialog';
+import { format } from 'date-fns';
 import toast from 'react-hot-toast';
 
 export function AvailabilityManagement() {
@@ -112,6 +113,28 @@ export function AvailabilityManagement() {
     }
   };
 
+  const handleDisableDay = async () => {
+    if (!selectedDoctorId || !date) return;
+
+    const nextDay = new Date(`${date}T00:00:00`);
+    nextDay.setDate(nextDay.getDate() + 1);
+
+    try {
+      const result = await availabilityApi.bulkUpdate({
+        action: 'disable',
+        doctor_id: selectedDoctorId,
+        range_start: `${date}T00:00:00`,
+        range_end: `${format(nextDay, 'yyyy-MM-dd')}T00:00:00`,
+      });
+      toast.success(t('availabilityAdmin.dayDisabled', { count: result.slots.length }));
+      fetchSlots();
+    } catch (error: any) {
+      console.error('Error disabling day:', error);
+      const message = error.response?.data?.detail || t('errors.updatingSlot');
+      toast.error(message);
+    }
+  };
+
   const handleDeleteConfirm = async () => {
     if (!slotToDelete) return;
 
@@ -215,10 +238,17 @@ export function AvailabilityManagement() {
 
         <Card>
           <CardHeader>
-            <CardTitle>
-              {t('availabilityAdmin.existingSlots')}
-              {date && ` - ${new Date(date).toLocaleDateString('it-IT')}`}
-            </CardTitle>
+            <div className="flex items-center justify-between gap-2">
+              <CardTitle>
+                {t('availabilityAdmin.existingSlots')}
+                {date && ` - ${new Date(date).toLocaleDateString('it-IT')}`}
+              </CardTitle>
+              {slots.some((slot) => slot.is_available) && (
+                <Button variant="outline" size="sm" onClick={handleDisableDay}>
+                  {t('availabilityAdmin.disableDay')}
+                </Button>
+              )}
+            </div>
           </CardHeader>
           <CardContent>
             {!selectedDoctorId || !date ? (
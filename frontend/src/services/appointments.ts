@@ -1,5 +1,5 @@
 import { apiClient } from './api';
-import { Appointment } from '@/types';
+import { Appointment, AppointmentPage } from '@/types';
 
 interface AppointmentCreate {
   slot_id: string;
@@ -13,6 +13,19 @@ interface AppointmentManualCreate extends AppointmentCreate {
   patient_id?: string;
 }
 
+// Either slot_ids, or first_slot_id repeated `count` times every interval_days
+interface AppointmentSeriesCreate extends Omit<AppointmentManualCreate, 'slot_id'> {
+  slot_ids?: string[];
+  first_slot_id?: string;
+  count?: number;
+  interval_days?: number;
+}
+
+interface AppointmentSeriesResponse {
+  message: string;
+  appointments: Appointment[];
+}
+
 interface AppointmentUpdate {
   patient_first_name?: string;
   patient_last_name?: string;
@@ -20,17 +33,29 @@ interface AppointmentUpdate {
   patient_email?: string;
 }
 
+interface AppointmentFilters {
+  doctor_id?: string;
+  date?: string;
+  date_end?: string;
+  status?: string;
+}
+
 export const appointmentsApi = {
 
   // Patient: book appointment
-  create: async (data: AppointmentCreate): Promise<Appointment> => {
-    const response = await apiClient.post<Appointment>('/appointments', data);
+  // Retries with the same idempotencyKey get the first booking back instead of a 409
+  create: async (data: AppointmentCreate, idempotencyKey?: string): Promise<Appointment> => {
+    const response = await apiClient.post<Appointment>('/appointments', data, {
+      headers: idempotencyKey ? { 'Idempotency-Key': idempotencyKey } : undefined,
+    });
     return response.data;
   },
 
-  // Patient: get their appointments
-  getMyAppointments: async (): Promise<Appointment[]> => {
-    const response = await apiClient.get<Appointment[]>('/appointments/me');
+  // Patient: one page of their appointments, newest first; pass next_cursor for the next one
+  getMyAppointments: async (cursor?: string | null): Promise<AppointmentPage> => {
+    const response = await apiClient.get<AppointmentPage>('/appointments/me', {
+      params: cursor ? { cursor } : undefined,
+    });
     return response.data;
   },
 
@@ -40,26 +65,39 @@ export const appointmentsApi = {
     return response.data;
   },
 
+  // Patient/Admin: move appointment to another slot (same appointment id)
+  reschedule: async (appointmentId: string, slotId: string): Promise<Appointment> => {
+    const response = await apiClient.post<Appointment>(`/appointments/${appointmentId}/reschedule`, {
+      slot_id: slotId,
+    });
+    return response.data;
+  },
+
   // Patient/Admin: cancel appointment
   cancel: async (appointmentId: string): Promise<Appointment> => {
     const response = await apiClient.delete<Appointment>(`/appointments/${appointmentId}`);
     return response.data;
   },
 
-  // Admin: get all appointments
-  getAll: async (params?: {
-    doctor_id?: string;
-    date?: string;
-    date_end?: string;
-    status?: string;
-  }): Promise<Appointment[]> => {
-    const response = await apiClient.get<Appointment[]>('/appointments/admin/all', { params });
+  // Admin: one page of all appointments, by slot time; the first page also carries the total
+  getAll: async (params: AppointmentFilters = {}, cursor?: string | null): Promise<AppointmentPage> => {
+    const response = await apiClient.get<AppointmentPage>('/appointments/admin/all', {
+      params: cursor ? { ...params, cursor } : { ...params, count: 'exact' },
+    });
     return response.data;
   },
 
   // Admin: manual booking
-  createManual: async (data: AppointmentManualCreate): Promise<Appointment> => {
-    const response = await apiClient.post<Appointment>('/appointments/admin/manual', data);
+  createManual: async (data: AppointmentManualCreate, idempotencyKey?: string): Promise<Appointment> => {
+    const response = await apiClient.post<Appointment>('/appointments/admin/manual', data, {
+      headers: idempotencyKey ? { 'Idempotency-Key': idempotencyKey } : undefined,
+    });
+    return response.data;
+  },
+
+  // Admin: book a treatment series, all or nothing
+  createSeries: async (data: AppointmentSeriesCreate): Promise<AppointmentSeriesResponse> => {
+    const response = await apiClient.post<AppointmentSeriesResponse>('/appointments/admin/series', data);
     return response.data;
   },
 
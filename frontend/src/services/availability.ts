@@ -1,6 +1,11 @@
 import { apiClient } from './api';
 import { AvailabilitySlot } from '@/types';
 
+interface SlotHold {
+  slot_id: string;
+  held_until: string;
+}
+
 interface CreateSlotsRequest {
   doctor_id: string;
   date: string;      // YYYY-MM-DD
@@ -8,6 +13,20 @@ interface CreateSlotsRequest {
   end_time: string;   // HH:MM
 }
 
+interface BulkSlotsRequest {
+  action: 'enable' | 'disable' | 'delete';
+  slot_ids?: string[];
+  doctor_id?: string;
+  range_start?: string; // slots starting at or after (YYYY-MM-DDTHH:MM)
+  range_end?: string;   // slots starting before
+}
+
+interface BulkSlotsResponse {
+  message: string;
+  slots: AvailabilitySlot[];
+  conflicts: { slot_id: string; start_time: string; appointment_id: string }[];
+}
+
 interface CreateSlotsResponse {
   message: string;
   slots_created: number;
@@ -39,6 +58,17 @@ export const availabilityApi = {
     return response.data;
   },
 
+  // Hold a slot while the booking form is open (hidden from other users)
+  holdSlot: async (slotId: string): Promise<SlotHold> => {
+    const response = await apiClient.post<SlotHold>(`/slots/${slotId}/hold`);
+    return response.data;
+  },
+
+  // Release the hold when the booking form is closed without booking
+  releaseHold: async (slotId: string): Promise<void> => {
+    await apiClient.delete(`/slots/${slotId}/hold`);
+  },
+
   // Create slots (admin only)
   createSlots: async (data: CreateSlotsRequest): Promise<CreateSlotsResponse> => {
     const response = await apiClient.post<CreateSlotsResponse>(
@@ -61,6 +91,15 @@ export const availabilityApi = {
     return response.data;
   },
 
+  // Enable/disable/delete many slots in one call; booked slots come back as conflicts (admin only)
+  bulkUpdate: async (data: BulkSlotsRequest): Promise<BulkSlotsResponse> => {
+    const response = await apiClient.post<BulkSlotsResponse>(
+      '/admin/availability/bulk',
+      data
+    );
+    return response.data;
+  },
+
   // Delete slot (admin only)
   deleteSlot: async (slotId: string): Promise<void> => {
     await apiClient.delete(`/admin/availability/${slotId}`);
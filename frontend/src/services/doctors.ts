@@ -1,5 +1,5 @@
 import { apiClient } from './api';
-import { Doctor, DoctorCreate, DoctorUpdate } from '@/types';
+import { Doctor, DoctorCreate, DoctorDetail, DoctorUpdate } from '@/types';
 
 export const doctorsApi = {
   // Get all doctors, optionally filtered by specialization
@@ -15,6 +15,13 @@ export const doctorsApi = {
     return response.data;
   },
 
+  // Get a doctor with available dates and the slots of one date (default: first available)
+  getDetail: async (id: string, date?: string): Promise<DoctorDetail> => {
+    const params = date ? { date } : {};
+    const response = await apiClient.get<DoctorDetail>(`/doctors/${id}/detail`, { params });
+    return response.data;
+  },
+
   // Get all unique specializations
   getSpecializations: async (): Promise<string[]> => {
     const response = await apiClient.get<string[]>('/doctors/specializations');
@@ -0,0 +1,38 @@
+import { apiBaseUrl } from './api';
+import { supabase } from './supabase';
+import { LiveEvent } from '@/types';
+
+const EVENT_NAMES: LiveEvent['event'][] = ['slot', 'slots_changed', 'appointment', 'resync'];
+
+// Open a Server-Sent Events stream; returns a function that closes it
+const openStream = (
+  path: string,
+  onEvent: (event: LiveEvent) => void,
+  params: Record<string, string> = {}
+): (() => void) => {
+  const url = new URL(`${apiBaseUrl}${path}`);
+  Object.entries(params).forEach(([key, value]) => url.searchParams.set(key, value));
+
+  const source = new EventSource(url.toString());
+  EVENT_NAMES.forEach((name) => {
+    source.addEventListener(name, (message) => {
+      onEvent({ event: name, data: JSON.parse((message as MessageEvent).data) } as LiveEvent);
+    });
+  });
+  return () => source.close();
+};
+
+export const eventsApi = {
+  // Slot changes of one doctor (public)
+  subscribeDoctor: (doctorId: string, onEvent: (event: LiveEvent) => void): (() => void) =>
+    openStream(`/doctors/${doctorId}/events`, onEvent),
+
+  // Bookings, cancellations and slot changes clinic-wide (admin only).
+  // EventSource cannot send headers, so the access token goes in the query string.
+  subscribeAdmin: async (onEvent: (event: LiveEvent) => void): Promise<() => void> => {
+    const { data: { session } } = await supabase.auth.getSession();
+    return openStream('/appointments/admin/events', onEvent, {
+      access_token: session?.access_token ?? '',
+    });
+  },
+};
@@ -55,6 +55,37 @@ export interface AvailabilitySlot {
   created_at: string;
 }
 
+// Doctor page bundle: doctor, available dates and the slots of one date
+export interface DoctorDetail {
+  doctor: Doctor;
+  available_dates: string[];
+  selected_date: string | null;
+  slots: AvailabilitySlot[];
+}
+
+// Live updates (Server-Sent Events)
+export interface SlotEventData {
+  slot_id: string;
+  doctor_id: string;
+  start_time: string;
+  is_available: boolean | null; // null: slot deleted
+}
+
+export type LiveEvent =
+  | { event: 'slot'; data: SlotEventData }
+  | { event: 'slots_changed'; data: { doctor_id: string } }
+  | {
+      event: 'appointment';
+      data: {
+        action: 'created' | 'cancelled';
+        appointment_id: string;
+        doctor_id: string;
+        slot_id: string;
+        start_time: string | null;
+      };
+    }
+  | { event: 'resync'; data: Record<string, never> };
+
 export interface AvailabilitySlotCreate {
   doctor_id: string;
   date: string; // YYYY-MM-DD
@@ -97,6 +128,13 @@ export interface ApiResponse<T> {
   message?: string;
 }
 
+export interface AppointmentPage {
+  appointments: Appointment[];
+  next_cursor: string | null;
+  page_size: number;
+  total?: number | null;
+}
+
 export interface PaginatedResponse<T> {
   items: T[];
   total: number;
@@ -0,0 +1,875 @@
+-- Clinica Orchidea - Upgrade of databases created from an older schema-setup.sql
+--
+-- schema-setup.sql creates a new database; this brings an existing one up to
+-- date. Every step is idempotent, so the whole file can be re-run safely.
+
+BEGIN;
+
+-- appointments.slot_start_time: copy of availability_slots.start_time (kept by
+-- trigger) for keyset pagination
+
+ALTER TABLE public.appointments ADD COLUMN IF NOT EXISTS slot_start_time TIMESTAMP;
+
+CREATE OR REPLACE FUNCTION set_appointment_slot_start_time()
+RETURNS TRIGGER AS $$
+BEGIN
+    SELECT start_time INTO NEW.slot_start_time
+    FROM public.availability_slots
+    WHERE id = NEW.slot_id;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE TRIGGER appointment_set_slot_start_time
+    BEFORE INSERT OR UPDATE OF slot_id ON public.appointments
+    FOR EACH ROW EXECUTE FUNCTION set_appointment_slot_start_time();
+
+-- Only rows without a value, so a re-run does not touch updated_at again
+UPDATE public.appointments a
+SET slot_start_time = s.start_time
+FROM public.availability_slots s
+WHERE s.id = a.slot_id AND a.slot_start_time IS NULL;
+
+ALTER TABLE public.appointments ALTER COLUMN slot_start_time SET NOT NULL;
+
+CREATE INDEX IF NOT EXISTS idx_appointments_slot_time ON public.appointments(slot_start_time, id);
+CREATE INDEX IF NOT EXISTS idx_appointments_user_slot_time ON public.appointments(user_id, slot_start_time, id);
+CREATE INDEX IF NOT EXISTS idx_appointments_doctor_slot_time ON public.appointments(doctor_id, slot_start_time, id);
+
+-- availability_slots.held_by/held_until: temporary hold while a user fills the
+-- booking form (only active while held_until is in the future)
+
+ALTER TABLE public.availability_slots
+    ADD COLUMN IF NOT EXISTS held_by UUID REFERENCES public.users(id) ON DELETE SET NULL;
+ALTER TABLE public.availability_slots ADD COLUMN IF NOT EXISTS held_until TIMESTAMPTZ;
+
+CREATE INDEX IF NOT EXISTS idx_slots_doctor_held_until ON public.availability_slots(doctor_id, held_until)
+    WHERE held_until IS NOT NULL;
+CREATE INDEX IF NOT EXISTS idx_slots_held_by ON public.availability_slots(held_by)
+    WHERE held_by IS NOT NULL;
+
+-- Mark slot as unavailable when appointment is created (and drop its hold)
+CREATE OR REPLACE FUNCTION mark_slot_unavailable()
+RETURNS TRIGGER AS $$
+BEGIN
+    UPDATE public.availability_slots
+    SET is_available = FALSE, held_by = NULL, held_until = NULL
+    WHERE id = NEW.slot_id;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Hold a free slot for p_user_id for p_seconds (booking form open). A user holds
+-- at most one slot: holding another one releases the previous hold. Holding again
+-- a slot you already hold extends it. Errors as in book_appointment.
+CREATE OR REPLACE FUNCTION public.hold_slot(p_slot_id UUID, p_user_id UUID, p_seconds INTEGER)
+RETURNS JSONB AS $$
+DECLARE
+    v_slot public.availability_slots;
+BEGIN
+    SELECT * INTO v_slot
+    FROM public.availability_slots
+    WHERE id = p_slot_id
+    FOR UPDATE;
+
+    IF NOT FOUND THEN
+        RAISE EXCEPTION 'Slot non trovato' USING ERRCODE = 'OR404';
+    END IF;
+
+    IF NOT v_slot.is_available THEN
+        RAISE EXCEPTION 'Slot non disponibile' USING ERRCODE = 'OR409';
+    END IF;
+
+    IF v_slot.start_time <= LOCALTIMESTAMP THEN
+        RAISE EXCEPTION 'Non puoi prenotare slot nel passato' USING ERRCODE = 'OR400';
+    END IF;
+
+    IF v_slot.held_until > NOW() AND v_slot.held_by IS DISTINCT FROM p_user_id THEN
+        RAISE EXCEPTION 'Slot temporaneamente riservato da un altro utente' USING ERRCODE = 'OR423';
+    END IF;
+
+    UPDATE public.availability_slots
+    SET held_by = NULL, held_until = NULL
+    WHERE held_by = p_user_id AND id <> p_slot_id;
+
+    UPDATE public.availability_slots
+    SET held_by = p_user_id, held_until = NOW() + make_interval(secs => p_seconds)
+    WHERE id = p_slot_id
+    RETURNING * INTO v_slot;
+
+    RETURN to_jsonb(v_slot);
+END;
+$$ LANGUAGE plpgsql;
+
+REVOKE EXECUTE ON FUNCTION public.hold_slot(UUID, UUID, INTEGER)
+    FROM PUBLIC, anon, authenticated;
+
+-- availability_versions: availability version per doctor, bumped by triggers on
+-- every slot change (used to build ETags for the public slot endpoints)
+
+CREATE TABLE IF NOT EXISTS public.availability_versions (
+    doctor_id UUID PRIMARY KEY REFERENCES public.doctors(id) ON DELETE CASCADE,
+    version BIGINT NOT NULL DEFAULT 0
+);
+
+-- Bump the availability version of every doctor touched by a slot statement.
+-- Statement-level, so a bulk insert of a whole schedule bumps each doctor once.
+-- Doctors deleted in the same statement (cascade) are skipped.
+CREATE OR REPLACE FUNCTION bump_availability_version()
+RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO public.availability_versions (doctor_id, version)
+    SELECT DISTINCT c.doctor_id, 1
+    FROM changed_slots c
+    JOIN public.doctors d ON d.id = c.doctor_id
+    ON CONFLICT (doctor_id) DO UPDATE
+        SET version = public.availability_versions.version + 1;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE TRIGGER slots_inserted_bump_version
+    AFTER INSERT ON public.availability_slots
+    REFERENCING NEW TABLE AS changed_slots
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_availability_version();
+
+CREATE OR REPLACE TRIGGER slots_updated_bump_version
+    AFTER UPDATE ON public.availability_slots
+    REFERENCING NEW TABLE AS changed_slots
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_availability_version();
+
+CREATE OR REPLACE TRIGGER slots_deleted_bump_version
+    AFTER DELETE ON public.availability_slots
+    REFERENCING OLD TABLE AS changed_slots
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_availability_version();
+
+-- One row per doctor, so every doctor has a version before its first slot change
+INSERT INTO public.availability_versions (doctor_id)
+SELECT id FROM public.doctors
+ON CONFLICT (doctor_id) DO NOTHING;
+
+-- First-available slot search
+
+-- free slots of a doctor in time order
+CREATE INDEX IF NOT EXISTS idx_slots_doctor_free_time ON public.availability_slots(doctor_id, start_time)
+    WHERE is_available = TRUE;
+
+-- Earliest free slots for a specialization, optionally within a date range
+-- (p_from/p_to) and a time-of-day window (p_time_from/p_time_to).
+-- Each doctor of the specialization contributes at most p_limit slots read in
+-- order from idx_slots_doctor_free_time, so the cost depends on the number of
+-- doctors and p_limit, not on how many slots are scheduled.
+CREATE OR REPLACE FUNCTION public.search_available_slots(
+    p_specialization TEXT,
+    p_from TIMESTAMP DEFAULT NULL,
+    p_to TIMESTAMP DEFAULT NULL,
+    p_time_from TIME DEFAULT NULL,
+    p_time_to TIME DEFAULT NULL,
+    p_limit INTEGER DEFAULT 10
+)
+RETURNS SETOF JSONB AS $$
+    SELECT to_jsonb(s) || jsonb_build_object('doctors', to_jsonb(d))
+    FROM public.doctors d
+    CROSS JOIN LATERAL (
+        SELECT *
+        FROM public.availability_slots slot
+        WHERE slot.doctor_id = d.id
+          AND slot.is_available
+          AND (slot.held_until IS NULL OR slot.held_until <= NOW())
+          AND slot.start_time >= GREATEST(COALESCE(p_from, LOCALTIMESTAMP), LOCALTIMESTAMP)
+          AND (p_to IS NULL OR slot.start_time < p_to)
+          AND (p_time_from IS NULL OR slot.start_time::time >= p_time_from)
+          AND (p_time_to IS NULL OR slot.end_time::time <= p_time_to)
+        ORDER BY slot.start_time
+        LIMIT p_limit
+    ) s
+    WHERE d.specialization = p_specialization
+    ORDER BY s.start_time, d.last_name
+    LIMIT p_limit;
+$$ LANGUAGE sql STABLE;
+
+REVOKE EXECUTE ON FUNCTION public.search_available_slots(TEXT, TIMESTAMP, TIMESTAMP, TIME, TIME, INTEGER)
+    FROM PUBLIC, anon, authenticated;
+
+-- appointments.locale: language of the patient's emails (from the booking
+-- request); NULL = EMAIL_DEFAULT_LOCALE
+
+ALTER TABLE public.appointments ADD COLUMN IF NOT EXISTS locale TEXT;
+
+-- email_outbox: persistent email queue, filled by the appointment functions in
+-- their transaction and drained by the email worker
+
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_type WHERE typname = 'email_status') THEN
+        CREATE TYPE email_status AS ENUM ('pending', 'sending', 'sent', 'failed');
+    END IF;
+END;
+$$;
+
+CREATE TABLE IF NOT EXISTS public.email_outbox (
+    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    -- one message per appointment event, e.g. '<appointment_id>:confirmation'
+    dedupe_key TEXT NOT NULL UNIQUE,
+    appointment_id UUID REFERENCES public.appointments(id) ON DELETE SET NULL,
+    event TEXT NOT NULL,
+    to_email TEXT NOT NULL,
+    payload JSONB NOT NULL DEFAULT '{}'::jsonb,
+    status email_status NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    last_error TEXT,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    sent_at TIMESTAMPTZ
+);
+
+CREATE INDEX IF NOT EXISTS idx_email_outbox_due ON public.email_outbox(next_attempt_at)
+    WHERE status IN ('pending', 'sending');
+
+-- Queue an email about an appointment in email_outbox, in the caller's transaction,
+-- so the message is committed together with the change it reports. The payload
+-- holds what the templates need (names, date, time, specialization, the locale to
+-- render in) plus p_extra.
+-- A message whose dedupe_key is already queued is skipped.
+CREATE OR REPLACE FUNCTION public.enqueue_appointment_email(
+    p_appointment_id UUID,
+    p_event TEXT,
+    p_dedupe_key TEXT,
+    p_extra JSONB DEFAULT '{}'::jsonb
+)
+RETURNS VOID AS $$
+    INSERT INTO public.email_outbox (dedupe_key, appointment_id, event, to_email, payload)
+    SELECT
+        p_dedupe_key, a.id, p_event, a.patient_email,
+        jsonb_build_object(
+            'patient_name', a.patient_first_name || ' ' || a.patient_last_name,
+            'doctor_name', d.first_name || ' ' || d.last_name,
+            'specialization', d.specialization,
+            'date', to_char(s.start_time, 'DD/MM/YYYY'),
+            'time', to_char(s.start_time, 'HH24:MI'),
+            'locale', a.locale
+        ) || p_extra
+    FROM public.appointments a
+    JOIN public.availability_slots s ON s.id = a.slot_id
+    JOIN public.doctors d ON d.id = a.doctor_id
+    WHERE a.id = p_appointment_id
+    ON CONFLICT (dedupe_key) DO NOTHING;
+$$ LANGUAGE sql;
+
+REVOKE EXECUTE ON FUNCTION public.enqueue_appointment_email(UUID, TEXT, TEXT, JSONB)
+    FROM PUBLIC, anon, authenticated;
+
+-- Replaced by the version with p_max_attempts
+DROP FUNCTION IF EXISTS public.claim_email_outbox(INTEGER, INTEGER);
+
+-- Claim due outbox messages for sending. Claimed rows are leased: if the worker dies
+-- before marking them sent or failed they become due again after p_lease_seconds.
+-- A message whose lease expired on its last attempt (it keeps killing the worker)
+-- is marked failed instead of being claimed forever.
+-- SKIP LOCKED lets several workers drain the outbox without sending twice.
+CREATE OR REPLACE FUNCTION public.claim_email_outbox(
+    p_limit INTEGER,
+    p_lease_seconds INTEGER,
+    p_max_attempts INTEGER
+)
+RETURNS SETOF public.email_outbox AS $$
+BEGIN
+    UPDATE public.email_outbox
+    SET status = 'failed',
+        last_error = 'Lease expired on the last attempt'
+    WHERE status = 'sending'
+      AND next_attempt_at <= NOW()
+      AND attempts >= p_max_attempts;
+
+    RETURN QUERY
+    UPDATE public.email_outbox o
+    SET status = 'sending',
+        attempts = o.attempts + 1,
+        next_attempt_at = NOW() + make_interval(secs => p_lease_seconds)
+    WHERE o.id IN (
+        SELECT id
+        FROM public.email_outbox
+        WHERE status IN ('pending', 'sending')
+          AND next_attempt_at <= NOW()
+          AND attempts < p_max_attempts
+        ORDER BY next_attempt_at
+        LIMIT p_limit
+        FOR UPDATE SKIP LOCKED
+    )
+    RETURNING o.*;
+END;
+$$ LANGUAGE plpgsql;
+
+REVOKE EXECUTE ON FUNCTION public.claim_email_outbox(INTEGER, INTEGER, INTEGER)
+    FROM PUBLIC, anon, authenticated;
+
+-- Cancel an appointment in one transaction: mark it cancelled
+-- (appointment_cancelled_mark_slot frees the slot) and queue the cancellation
+-- email. Patients can only cancel their own future appointments. Returns the
+-- appointment with its slot and doctor embedded. Errors as in book_appointment.
+CREATE OR REPLACE FUNCTION public.cancel_appointment(
+    p_appointment_id UUID,
+    p_user_id UUID,
+    p_is_admin BOOLEAN DEFAULT FALSE
+)
+RETURNS JSONB AS $$
+DECLARE
+    v_appointment public.appointments;
+    v_event TEXT := CASE WHEN p_is_admin THEN 'cancellation_by_clinic' ELSE 'cancellation_by_patient' END;
+BEGIN
+    SELECT * INTO v_appointment
+    FROM public.appointments
+    WHERE id = p_appointment_id
+    FOR UPDATE;
+
+    IF NOT FOUND THEN
+        RAISE EXCEPTION 'Appuntamento non trovato' USING ERRCODE = 'OR404';
+    END IF;
+
+    IF NOT p_is_admin AND v_appointment.user_id IS DISTINCT FROM p_user_id THEN
+        RAISE EXCEPTION 'Non puoi cancellare appuntamenti di altri utenti' USING ERRCODE = 'OR403';
+    END IF;
+
+    IF NOT p_is_admin AND v_appointment.slot_start_time <= LOCALTIMESTAMP THEN
+        RAISE EXCEPTION 'Non puoi cancellare appuntamenti passati' USING ERRCODE = 'OR400';
+    END IF;
+
+    IF v_appointment.status = 'cancelled' THEN
+        RAISE EXCEPTION 'Appuntamento già cancellato' USING ERRCODE = 'OR400';
+    END IF;
+
+    UPDATE public.appointments
+    SET status = 'cancelled'
+    WHERE id = p_appointment_id
+    RETURNING * INTO v_appointment;
+
+    PERFORM public.enqueue_appointment_email(
+        v_appointment.id, v_event, v_appointment.id || ':' || v_event
+    );
+
+    RETURN to_jsonb(v_appointment) || jsonb_build_object(
+        'availability_slots', (SELECT to_jsonb(s) FROM public.availability_slots s WHERE s.id = v_appointment.slot_id),
+        'doctors', (SELECT to_jsonb(d) FROM public.doctors d WHERE d.id = v_appointment.doctor_id)
+    );
+END;
+$$ LANGUAGE plpgsql;
+
+REVOKE EXECUTE ON FUNCTION public.cancel_appointment(UUID, UUID, BOOLEAN)
+    FROM PUBLIC, anon, authenticated;
+
+-- Replaced by the version with p_locale
+DROP FUNCTION IF EXISTS public.book_appointment(UUID, UUID, TEXT, TEXT, TEXT, TEXT, BOOLEAN);
+
+-- Book a slot in a single transaction: lock the slot, check it, insert the appointment
+-- (appointment_created_mark_slot marks the slot unavailable), queue the confirmation
+-- email and return the appointment with its slot and doctor embedded.
+-- Errors use custom SQLSTATEs, mapped to HTTP errors by AppointmentService:
+--   OR404 slot not found, OR409 slot not available, OR400 slot in the past,
+--   OR423 slot held by another user, OR403 not the owner (reschedule)
+CREATE OR REPLACE FUNCTION public.book_appointment(
+    p_slot_id UUID,
+    p_user_id UUID,
+    p_patient_first_name TEXT,
+    p_patient_last_name TEXT,
+    p_patient_phone TEXT,
+    p_patient_email TEXT,
+    p_require_future BOOLEAN DEFAULT TRUE,
+    p_locale TEXT DEFAULT NULL
+)
+RETURNS JSONB AS $$
+DECLARE
+    v_slot public.availability_slots;
+    v_appointment public.appointments;
+BEGIN
+    SELECT * INTO v_slot
+    FROM public.availability_slots
+    WHERE id = p_slot_id
+    FOR UPDATE;
+
+    IF NOT FOUND THEN
+        RAISE EXCEPTION 'Slot non trovato' USING ERRCODE = 'OR404';
+    END IF;
+
+    IF NOT v_slot.is_available THEN
+        RAISE EXCEPTION 'Slot non disponibile' USING ERRCODE = 'OR409';
+    END IF;
+
+    IF p_require_future AND v_slot.start_time <= LOCALTIMESTAMP THEN
+        RAISE EXCEPTION 'Non puoi prenotare slot nel passato' USING ERRCODE = 'OR400';
+    END IF;
+
+    IF v_slot.held_until > NOW() AND v_slot.held_by IS DISTINCT FROM p_user_id THEN
+        RAISE EXCEPTION 'Slot temporaneamente riservato da un altro utente' USING ERRCODE = 'OR423';
+    END IF;
+
+    INSERT INTO public.appointments (
+        slot_id, doctor_id, user_id,
+        patient_first_name, patient_last_name, patient_phone, patient_email,
+        status, locale
+    )
+    VALUES (
+        v_slot.id, v_slot.doctor_id, p_user_id,
+        p_patient_first_name, p_patient_last_name, p_patient_phone, p_patient_email,
+        'confirmed', p_locale
+    )
+    RETURNING * INTO v_appointment;
+
+    PERFORM public.enqueue_appointment_email(
+        v_appointment.id, 'confirmation', v_appointment.id || ':confirmation'
+    );
+
+    v_slot.is_available := FALSE;
+    v_slot.held_by := NULL;
+    v_slot.held_until := NULL;
+
+    RETURN to_jsonb(v_appointment) || jsonb_build_object(
+        'availability_slots', to_jsonb(v_slot),
+        'doctors', (SELECT to_jsonb(d) FROM public.doctors d WHERE d.id = v_slot.doctor_id)
+    );
+END;
+$$ LANGUAGE plpgsql;
+
+-- Server-side only (service_role)
+REVOKE EXECUTE ON FUNCTION public.book_appointment(UUID, UUID, TEXT, TEXT, TEXT, TEXT, BOOLEAN, TEXT)
+    FROM PUBLIC, anon, authenticated;
+
+-- Move an appointment to another slot in one transaction: the appointment keeps
+-- its id, the new slot is claimed and the old one freed. Patients can only move
+-- their own future appointments to future slots. Queues the rescheduled email and
+-- returns the appointment with its new slot and doctor embedded, plus the previous
+-- slot. Errors as in book_appointment.
+CREATE OR REPLACE FUNCTION public.reschedule_appointment(
+    p_appointment_id UUID,
+    p_new_slot_id UUID,
+    p_user_id UUID,
+    p_is_admin BOOLEAN DEFAULT FALSE
+)
+RETURNS JSONB AS $$
+DECLARE
+    v_appointment public.appointments;
+    v_old_slot public.availability_slots;
+    v_slot public.availability_slots;
+BEGIN
+    SELECT * INTO v_appointment
+    FROM public.appointments
+    WHERE id = p_appointment_id
+    FOR UPDATE;
+
+    IF NOT FOUND THEN
+        RAISE EXCEPTION 'Appuntamento non trovato' USING ERRCODE = 'OR404';
+    END IF;
+
+    IF NOT p_is_admin AND v_appointment.user_id IS DISTINCT FROM p_user_id THEN
+        RAISE EXCEPTION 'Non puoi modificare appuntamenti di altri utenti' USING ERRCODE = 'OR403';
+    END IF;
+
+    IF v_appointment.status = 'cancelled' THEN
+        RAISE EXCEPTION 'Non puoi spostare un appuntamento cancellato' USING ERRCODE = 'OR400';
+    END IF;
+
+    IF v_appointment.slot_id = p_new_slot_id THEN
+        RAISE EXCEPTION 'L''appuntamento è già in questo slot' USING ERRCODE = 'OR400';
+    END IF;
+
+    SELECT * INTO v_old_slot
+    FROM public.availability_slots
+    WHERE id = v_appointment.slot_id
+    FOR UPDATE;
+
+    IF NOT p_is_admin AND v_old_slot.start_time <= LOCALTIMESTAMP THEN
+        RAISE EXCEPTION 'Non puoi spostare appuntamenti passati' USING ERRCODE = 'OR400';
+    END IF;
+
+    SELECT * INTO v_slot
+    FROM public.availability_slots
+    WHERE id = p_new_slot_id
+    FOR UPDATE;
+
+    IF NOT FOUND THEN
+        RAISE EXCEPTION 'Slot non trovato' USING ERRCODE = 'OR404';
+    END IF;
+
+    IF NOT v_slot.is_available THEN
+        RAISE EXCEPTION 'Slot non disponibile' USING ERRCODE = 'OR409';
+    END IF;
+
+    IF NOT p_is_admin AND v_slot.start_time <= LOCALTIMESTAMP THEN
+        RAISE EXCEPTION 'Non puoi prenotare slot nel passato' USING ERRCODE = 'OR400';
+    END IF;
+
+    IF v_slot.held_until > NOW() AND v_slot.held_by IS DISTINCT FROM v_appointment.user_id THEN
+        RAISE EXCEPTION 'Slot temporaneamente riservato da un altro utente' USING ERRCODE = 'OR423';
+    END IF;
+
+    -- appointment_set_slot_start_time copies the new start time
+    UPDATE public.appointments
+    SET slot_id = v_slot.id, doctor_id = v_slot.doctor_id
+    WHERE id = v_appointment.id
+    RETURNING * INTO v_appointment;
+
+    UPDATE public.availability_slots
+    SET is_available = FALSE, held_by = NULL, held_until = NULL
+    WHERE id = v_slot.id
+    RETURNING * INTO v_slot;
+
+    UPDATE public.availability_slots
+    SET is_available = TRUE
+    WHERE id = v_old_slot.id
+    RETURNING * INTO v_old_slot;
+
+    -- One email per move: updated_at is set by every reschedule, so moving back and
+    -- forth between the same slots still notifies each time
+    PERFORM public.enqueue_appointment_email(
+        v_appointment.id,
+        'rescheduled',
+        v_appointment.id || ':rescheduled:' || (extract(epoch FROM v_appointment.updated_at) * 1000000)::BIGINT,
+        jsonb_build_object(
+            'previous_date', to_char(v_old_slot.start_time, 'DD/MM/YYYY'),
+            'previous_time', to_char(v_old_slot.start_time, 'HH24:MI')
+        )
+    );
+
+    RETURN to_jsonb(v_appointment) || jsonb_build_object(
+        'availability_slots', to_jsonb(v_slot),
+        'doctors', (SELECT to_jsonb(d) FROM public.doctors d WHERE d.id = v_slot.doctor_id),
+        'previous_slot', to_jsonb(v_old_slot)
+    );
+END;
+$$ LANGUAGE plpgsql;
+
+REVOKE EXECUTE ON FUNCTION public.reschedule_appointment(UUID, UUID, UUID, BOOLEAN)
+    FROM PUBLIC, anon, authenticated;
+
+-- Enable, disable or delete many slots at once, selected by id and/or by doctor
+-- and start time range [p_from, p_to). Slots with a confirmed appointment are
+-- never re-enabled or deleted: they are reported as conflicts and the others
+-- are changed with a single statement. Returns
+--   {"slots": [changed slots (deleted ones as they were)],
+--    "conflicts": [{"slot_id", "start_time", "appointment_id"}]}
+CREATE OR REPLACE FUNCTION public.bulk_update_slots(
+    p_action TEXT,
+    p_slot_ids UUID[] DEFAULT NULL,
+    p_doctor_id UUID DEFAULT NULL,
+    p_from TIMESTAMP DEFAULT NULL,
+    p_to TIMESTAMP DEFAULT NULL
+)
+RETURNS JSONB AS $$
+DECLARE
+    v_ids UUID[];
+    v_conflicts JSONB := '[]'::jsonb;
+    v_slots JSONB;
+BEGIN
+    IF p_action NOT IN ('enable', 'disable', 'delete') THEN
+        RAISE EXCEPTION 'Azione non valida: %', p_action USING ERRCODE = 'OR400';
+    END IF;
+
+    IF p_slot_ids IS NULL AND (p_doctor_id IS NULL OR p_from IS NULL OR p_to IS NULL) THEN
+        RAISE EXCEPTION 'Indica gli slot o un dottore con un intervallo' USING ERRCODE = 'OR400';
+    END IF;
+
+    v_ids := ARRAY(
+        SELECT id
+        FROM public.availability_slots
+        WHERE (p_slot_ids IS NULL OR id = ANY(p_slot_ids))
+          AND (p_doctor_id IS NULL OR doctor_id = p_doctor_id)
+          AND (p_from IS NULL OR start_time >= p_from)
+          AND (p_to IS NULL OR start_time < p_to)
+        ORDER BY id
+        FOR UPDATE
+    );
+
+    -- Disabling never conflicts: booked slots are already unavailable
+    IF p_action <> 'disable' THEN
+        SELECT COALESCE(jsonb_agg(jsonb_build_object(
+                   'slot_id', s.id,
+                   'start_time', s.start_time,
+                   'appointment_id', a.id
+               ) ORDER BY s.start_time), '[]'::jsonb)
+        INTO v_conflicts
+        FROM public.availability_slots s
+        JOIN public.appointments a ON a.slot_id = s.id AND a.status = 'confirmed'
+        WHERE s.id = ANY(v_ids);
+
+        v_ids := ARRAY(
+            SELECT id FROM unnest(v_ids) AS id
+            EXCEPT
+            SELECT (conflict->>'slot_id')::uuid FROM jsonb_array_elements(v_conflicts) AS conflict
+        );
+    END IF;
+
+    IF p_action = 'delete' THEN
+        WITH changed AS (
+            DELETE FROM public.availability_slots
+            WHERE id = ANY(v_ids)
+            RETURNING *
+        )
+        SELECT COALESCE(jsonb_agg(to_jsonb(changed) ORDER BY start_time), '[]'::jsonb)
+        INTO v_slots
+        FROM changed;
+    ELSE
+        WITH changed AS (
+            UPDATE public.availability_slots
+            SET is_available = (p_action = 'enable')
+            WHERE id = ANY(v_ids)
+              AND is_available IS DISTINCT FROM (p_action = 'enable')
+            RETURNING *
+        )
+        SELECT COALESCE(jsonb_agg(to_jsonb(changed) ORDER BY start_time), '[]'::jsonb)
+        INTO v_slots
+        FROM changed;
+    END IF;
+
+    RETURN jsonb_build_object('slots', v_slots, 'conflicts', v_conflicts);
+END;
+$$ LANGUAGE plpgsql;
+
+REVOKE EXECUTE ON FUNCTION public.bulk_update_slots(TEXT, UUID[], UUID, TIMESTAMP, TIMESTAMP)
+    FROM PUBLIC, anon, authenticated;
+
+-- Book a series of slots for one patient (treatment cycles), all or nothing.
+-- The slots are either p_slot_ids, or p_count slots of the doctor of p_first_slot_id
+-- at the same time every p_interval_days days. All slots must belong to the same
+-- doctor. Checks and errors are those of book_appointment, run over the whole set
+-- with one query each; the appointments are inserted with a single statement.
+-- Queues one summary email, listing every date, and returns the appointments in
+-- slot order, each with its slot and doctor embedded.
+CREATE OR REPLACE FUNCTION public.book_appointment_series(
+    p_user_id UUID,
+    p_patient_first_name TEXT,
+    p_patient_last_name TEXT,
+    p_patient_phone TEXT,
+    p_patient_email TEXT,
+    p_slot_ids UUID[] DEFAULT NULL,
+    p_first_slot_id UUID DEFAULT NULL,
+    p_count INTEGER DEFAULT NULL,
+    p_interval_days INTEGER DEFAULT 7,
+    p_require_future BOOLEAN DEFAULT TRUE
+)
+RETURNS JSONB AS $$
+DECLARE
+    v_first public.availability_slots;
+    v_ids UUID[];
+    v_expected INTEGER;
+    v_locked INTEGER;
+    v_bad TEXT;
+    v_result JSONB;
+BEGIN
+    IF p_slot_ids IS NOT NULL THEN
+        v_ids := ARRAY(SELECT DISTINCT unnest(p_slot_ids));
+        v_expected := cardinality(v_ids);
+    ELSE
+        SELECT * INTO v_first FROM public.availability_slots WHERE id = p_first_slot_id;
+        IF NOT FOUND THEN
+            RAISE EXCEPTION 'Slot non trovato' USING ERRCODE = 'OR404';
+        END IF;
+
+        v_ids := ARRAY(
+            SELECT s.id
+            FROM public.availability_slots s
+            WHERE s.doctor_id = v_first.doctor_id
+              AND s.start_time IN (
+                  SELECT v_first.start_time + k * make_interval(days => p_interval_days)
+                  FROM generate_series(0, p_count - 1) AS k
+              )
+        );
+        v_expected := p_count;
+    END IF;
+
+    -- Lock in a fixed order so concurrent series cannot deadlock
+    PERFORM 1
+    FROM public.availability_slots
+    WHERE id = ANY(v_ids)
+    ORDER BY id
+    FOR UPDATE;
+    GET DIAGNOSTICS v_locked = ROW_COUNT;
+
+    IF v_locked < v_expected THEN
+        RAISE EXCEPTION 'Slot non trovato: % su % slot della serie esistono', v_locked, v_expected
+            USING ERRCODE = 'OR404';
+    END IF;
+
+    IF (SELECT count(DISTINCT doctor_id) FROM public.availability_slots WHERE id = ANY(v_ids)) > 1 THEN
+        RAISE EXCEPTION 'Gli slot della serie devono essere dello stesso dottore' USING ERRCODE = 'OR400';
+    END IF;
+
+    SELECT string_agg(to_char(start_time, 'DD/MM/YYYY HH24:MI'), ', ' ORDER BY start_time)
+    INTO v_bad
+    FROM public.availability_slots
+    WHERE id = ANY(v_ids) AND NOT is_available;
+    IF v_bad IS NOT NULL THEN
+        RAISE EXCEPTION 'Slot non disponibili: %', v_bad USING ERRCODE = 'OR409';
+    END IF;
+
+    IF p_require_future AND EXISTS (
+        SELECT 1 FROM public.availability_slots
+        WHERE id = ANY(v_ids) AND start_time <= LOCALTIMESTAMP
+    ) THEN
+        RAISE EXCEPTION 'Non puoi prenotare slot nel passato' USING ERRCODE = 'OR400';
+    END IF;
+
+    SELECT string_agg(to_char(start_time, 'DD/MM/YYYY HH24:MI'), ', ' ORDER BY start_time)
+    INTO v_bad
+    FROM public.availability_slots
+    WHERE id = ANY(v_ids) AND held_until > NOW() AND held_by IS DISTINCT FROM p_user_id;
+    IF v_bad IS NOT NULL THEN
+        RAISE EXCEPTION 'Slot temporaneamente riservati da un altro utente: %', v_bad
+            USING ERRCODE = 'OR423';
+    END IF;
+
+    -- appointment_created_mark_slot marks every slot unavailable
+    WITH created AS (
+        INSERT INTO public.appointments (
+            slot_id, doctor_id, user_id,
+            patient_first_name, patient_last_name, patient_phone, patient_email,
+            status
+        )
+        SELECT
+            s.id, s.doctor_id, p_user_id,
+            p_patient_first_name, p_patient_last_name, p_patient_phone, p_patient_email,
+            'confirmed'
+        FROM public.availability_slots s
+        WHERE s.id = ANY(v_ids)
+        RETURNING *
+    )
+    SELECT jsonb_agg(
+        to_jsonb(a) || jsonb_build_object(
+            'availability_slots', to_jsonb(s) || jsonb_build_object(
+                'is_available', FALSE, 'held_by', NULL, 'held_until', NULL
+            ),
+            'doctors', to_jsonb(d)
+        )
+        ORDER BY s.start_time
+    )
+    INTO v_result
+    FROM created a
+    JOIN public.availability_slots s ON s.id = a.slot_id
+    JOIN public.doctors d ON d.id = a.doctor_id;
+
+    PERFORM public.enqueue_appointment_email(
+        (v_result -> 0 ->> 'id')::UUID,
+        'series_confirmation',
+        (v_result -> 0 ->> 'id') || ':series_confirmation',
+        jsonb_build_object(
+            'count', jsonb_array_length(v_result),
+            'dates', (
+                SELECT string_agg(to_char(start_time, 'DD/MM/YYYY HH24:MI'), E'\n' ORDER BY start_time)
+                FROM public.availability_slots
+                WHERE id = ANY(v_ids)
+            )
+        )
+    );
+
+    RETURN v_result;
+END;
+$$ LANGUAGE plpgsql;
+
+REVOKE EXECUTE ON FUNCTION public.book_appointment_series(
+    UUID, TEXT, TEXT, TEXT, TEXT, UUID[], UUID, INTEGER, INTEGER, BOOLEAN
+) FROM PUBLIC, anon, authenticated;
+
+-- idempotency_keys: stored responses of Idempotency-Key requests
+-- (IDEMPOTENCY_BACKEND=supabase). Expired rows are ignored; see schema-setup.sql
+-- for a periodic purge.
+
+CREATE TABLE IF NOT EXISTS public.idempotency_keys (
+    -- '<endpoint>:<user_id>:<Idempotency-Key>'
+    key TEXT PRIMARY KEY,
+    fingerprint TEXT NOT NULL,
+    status_code INTEGER NOT NULL,
+    body JSONB NOT NULL,
+    expires_at TIMESTAMPTZ NOT NULL,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_idempotency_keys_expires_at ON public.idempotency_keys(expires_at);
+
+-- availability_calendar: free slots per doctor and day, kept by triggers on
+-- availability_slots
+
+CREATE TABLE IF NOT EXISTS public.availability_calendar (
+    doctor_id UUID NOT NULL REFERENCES public.doctors(id) ON DELETE CASCADE,
+    day DATE NOT NULL,
+    free_slots INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (doctor_id, day)
+);
+
+-- Apply slot changes to availability_calendar, once per statement.
+-- (Each branch only references the transition tables its trigger defines.)
+CREATE OR REPLACE FUNCTION update_availability_calendar()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO public.availability_calendar (doctor_id, day, free_slots)
+        SELECT doctor_id, start_time::date, COUNT(*) FILTER (WHERE is_available)
+        FROM new_slots
+        GROUP BY doctor_id, start_time::date
+        ON CONFLICT (doctor_id, day) DO UPDATE
+            SET free_slots = public.availability_calendar.free_slots + EXCLUDED.free_slots;
+
+    ELSIF TG_OP = 'UPDATE' THEN
+        INSERT INTO public.availability_calendar (doctor_id, day, free_slots)
+        SELECT doctor_id, day, SUM(delta)
+        FROM (
+            SELECT doctor_id, start_time::date AS day, CASE WHEN is_available THEN 1 ELSE 0 END AS delta
+            FROM new_slots
+            UNION ALL
+            SELECT doctor_id, start_time::date, CASE WHEN is_available THEN -1 ELSE 0 END
+            FROM old_slots
+        ) changes
+        GROUP BY doctor_id, day
+        HAVING SUM(delta) <> 0
+        ON CONFLICT (doctor_id, day) DO UPDATE
+            SET free_slots = public.availability_calendar.free_slots + EXCLUDED.free_slots;
+
+    ELSE
+        UPDATE public.availability_calendar c
+        SET free_slots = c.free_slots - d.free_slots
+        FROM (
+            SELECT doctor_id, start_time::date AS day, COUNT(*) AS free_slots
+            FROM old_slots
+            WHERE is_available
+            GROUP BY doctor_id, start_time::date
+        ) d
+        WHERE c.doctor_id = d.doctor_id AND c.day = d.day;
+    END IF;
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE TRIGGER slots_inserted_update_calendar
+    AFTER INSERT ON public.availability_slots
+    REFERENCING NEW TABLE AS new_slots
+    FOR EACH STATEMENT EXECUTE FUNCTION update_availability_calendar();
+
+CREATE OR REPLACE TRIGGER slots_updated_update_calendar
+    AFTER UPDATE ON public.availability_slots
+    REFERENCING OLD TABLE AS old_slots NEW TABLE AS new_slots
+    FOR EACH STATEMENT EXECUTE FUNCTION update_availability_calendar();
+
+CREATE OR REPLACE TRIGGER slots_deleted_update_calendar
+    AFTER DELETE ON public.availability_slots
+    REFERENCING OLD TABLE AS old_slots
+    FOR EACH STATEMENT EXECUTE FUNCTION update_availability_calendar();
+
+-- Rebuild the counts from the slots. Slot writes wait for the lock, so none is
+-- lost between the rebuild and the triggers taking over.
+LOCK TABLE public.availability_slots IN SHARE MODE;
+
+INSERT INTO public.availability_calendar (doctor_id, day, free_slots)
+SELECT doctor_id, start_time::date, COUNT(*) FILTER (WHERE is_available)
+FROM public.availability_slots
+GROUP BY doctor_id, start_time::date
+ON CONFLICT (doctor_id, day) DO UPDATE SET free_slots = EXCLUDED.free_slots;
+
+-- Days whose slots have all been deleted
+UPDATE public.availability_calendar c
+SET free_slots = 0
+WHERE c.free_slots <> 0
+  AND NOT EXISTS (
+      SELECT 1
+      FROM public.availability_slots s
+      WHERE s.doctor_id = c.doctor_id AND s.start_time::date = c.day
+  );
+
+COMMIT;